@@ -0,0 +1,184 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    'lnk_analysis_files_total': ('counter', 'Shortcut files analyzed'),
+    'lnk_analysis_bytes_total': ('counter', 'Bytes of shortcut data analyzed'),
+    'lnk_analysis_errors_total': ('counter', 'Analyses that failed'),
+    'lnk_analysis_stage_seconds': ('histogram', 'Time spent per analysis stage'),
+    'lnk_cache_hits_total': ('counter', 'Cache lookups answered from cache'),
+    'lnk_cache_misses_total': ('counter', 'Cache lookups that had to compute'),
+    'lnk_vt_request_seconds': ('histogram', 'VirusTotal HTTP request latency'),
+    'lnk_watch_events_total': ('counter', 'Filesystem events seen by the shortcut watcher'),
+    'lnk_watch_analyzed_total': ('counter', 'Shortcuts pre-scanned by the watcher'),
+    'lnk_watch_errors_total': ('counter', 'Watcher pre-scans that failed'),
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    # Process-wide counters and latency histograms. Hooks are called with
+    # (kind, name, value, labels) for every update, kind being 'counter' or
+    # 'observation', so other sinks (statsd, logs, tests) can subscribe.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.hooks = []
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def _notify(self, kind, name, value, labels):
+        for hook in self.hooks:
+            try:
+                hook(kind, name, value, labels)
+            except Exception:
+                # A broken sink must not fail the analysis it is observing.
+                pass
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        if self.hooks:
+            self._notify('counter', name, amount, labels)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+        if self.hooks:
+            self._notify('observation', name, seconds, labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def stage(self, stage):
+        return self.timer('lnk_analysis_stage_seconds', stage=stage)
+
+    def stage_clock(self):
+        return StageClock(self)
+
+    def cache_lookup(self, cache, hit):
+        self.count('lnk_cache_hits_total' if hit else 'lnk_cache_misses_total', cache=cache)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        text = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                        for key, value in pairs)
+        return '{' + text + '}'
+
+    def prometheus_text(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, help_text = METRIC_HELP.get(name, ('untyped', name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name)
+            lines.append(f"{name}{self._labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # Written to a temporary file and renamed so the node_exporter textfile
+        # collector never reads a partial file.
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+
+class StageClock:
+    # Lap timer for a linear pipeline: each lap(stage) records the time since
+    # the previous lap under that stage name.
+    def __init__(self, registry):
+        self.registry = registry
+        self.started = self.last = time.perf_counter()
+        self.timings = {}
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self.last
+        self.registry.observe('lnk_analysis_stage_seconds', now - self.last, stage=stage)
+        self.last = now
+
+    def finish(self):
+        self.timings['total'] = time.perf_counter() - self.started
+        self.registry.observe('lnk_analysis_stage_seconds', self.timings['total'], stage='total')
+
+
+metrics = MetricsRegistry()
+
+
+def run_profiled(profile_path, func, *args, **kwargs):
+    # Runs func under cProfile and dumps pstats data to profile_path; the file
+    # loads in snakeviz/tuna or converts to a flame graph with flameprof.
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(profile_path)
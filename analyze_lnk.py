@@ -1,171 +1,134 @@
+import mmap
 import struct
-import os
-from datetime import datetime
-import win32com.client
-import hashlib
-import requests
-import matplotlib.pyplot as plt
-import numpy as np
-import io
-import base64
-from jinja2 import Template
-from generate_report import generate_report
-import re
-import win32con
-import win32gui
+import ntpath
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from file_digest import digest_file
+from lnk_blocks import BLOCK_DECODERS, read_cstring, describe_itemid, walk_idlist
+from lnk_model import LinkFlags, STRING_FLAGS, ShellLinkHeader, Section, StringValue, ExtraBlock, LNKResult
+from command_rules import default_rules
+from risk_gauge import render_risk_gauge
+from vt_lookup import get_client, vt_score
+from analysis_metrics import metrics
+
+HEADER_LAYOUT = struct.Struct('<I16xIIQQQIIIHHII')
+LINK_INFO_LAYOUT = struct.Struct('<IIIIIII')
+BLOCK_HEADER_LAYOUT = struct.Struct('<II')
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+
+# Bytes of an overlay (data after the terminal block) kept for the report.
+OVERLAY_HEAD_BYTES = 256
+
+# Seconds from the start of analyze() after which the local verdict is
+# returned without waiting any longer for VirusTotal.
+VT_DEADLINE = 2.0
+
+_vt_executor = None
+_vt_executor_lock = threading.Lock()
+
+
+def vt_executor():
+    global _vt_executor
+    with _vt_executor_lock:
+        if _vt_executor is None:
+            _vt_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='vt-lookup')
+        return _vt_executor
+
+
+def comparable_path(path):
+    # A shortcut path the way Windows resolves it, or None when it cannot be
+    # compared here: empty, relative, or using variables this host lacks.
+    path = ntpath.expandvars(path.strip().strip('"'))
+    if not path or '%' in path or not ntpath.isabs(path):
+        return None
+    return ntpath.normcase(ntpath.normpath(path))
+
 
 class LNKAnalyzer:
-    def __init__(self, lnk_path, vt_api_key=None):
+    # ExtraData signature -> decoder (lnk_blocks.BlockDecoder); extend with lnk_blocks.register_decoder
+    block_decoders = BLOCK_DECODERS
+
+    def __init__(self, lnk_path, vt_api_key=None, native=False, digest=None, rules=None, vt_deadline=VT_DEADLINE):
         self.lnk_path = lnk_path
-        self.vt_api_key = vt_api_key
+        # main.py passes " " when no key is configured.
+        self.vt_api_key = (vt_api_key or '').strip() or None
+        # native: derive ShellLinkInfo from the parsed structure only (no COM, no win32)
+        self.native = native
+        # digest: (data, hashes) from file_digest.digest_file, shared with the whitelist check
+        self.digest = digest
+        # rules: command_rules.CommandRuleSet, loaded from command_rules.json by default
+        self.rules = rules if rules is not None else default_rules()
+        self.vt_deadline = vt_deadline
+        self.vt_results = None
+        self.late_vt_results = None
+        self.report_path = None
+        # Seconds per analyze() stage (com, hashing, parsing, ...), also exported via analysis_metrics
+        self.timings = {}
         self.risk_score = 0
         self.findings = []
         self.suspicious = []
         self.malicious = []
-        self.structure_info = {}
-        
-        self.KNOWN_BLOCKS = {
-            0xA0000002: ('ConsoleDataBlock', 0x0C),
-            0xA0000004: ('ConsoleFEDataBlock', 0x0C),
-            0xA0000006: ('DarwinDataBlock', 0x314),
-            0xA0000001: ('EnvironmentVariableDataBlock', 0x314),
-            0xA0000007: ('IconEnvironmentDataBlock', 0x314),
-            0xA000000B: ('KnownFolderDataBlock', 0x1C),
-            0xA0000009: ('PropertyStoreDataBlock', None),
-            0xA0000008: ('ShimDataBlock', None),
-            0xA0000005: ('SpecialFolderDataBlock', 0x10),
-            0xA0000003: ('TrackerDataBlock', 0x58),
-            0xA000000C: ('VistaAndAboveIDListDataBlock', None),
-        }
+        # lnk_model.LNKResult of the last analyze(); structure_info is its dict view
+        self.result = None
+        # Offset just past the terminal extra block; anything after it is overlay
+        self.structure_end = None
+
+    @property
+    def structure_info(self):
+        return self.result.as_dict() if self.result is not None else {}
 
     def read_lnk_header(self, data):
-        header = {
-            'HeaderSize': struct.unpack('<I', data[0:4])[0],
-            'LinkCLSID': data[4:20].hex(),
-            'LinkFlags': struct.unpack('<I', data[20:24])[0],
-            'FileAttributes': struct.unpack('<I', data[24:28])[0],
-            'CreationTime': self._filetime_to_datetime(struct.unpack('<Q', data[28:36])[0]),
-            'AccessTime': self._filetime_to_datetime(struct.unpack('<Q', data[36:44])[0]),
-            'WriteTime': self._filetime_to_datetime(struct.unpack('<Q', data[44:52])[0]),
-            'FileSize': struct.unpack('<I', data[52:56])[0],
-            'IconIndex': struct.unpack('<I', data[56:60])[0],
-            'ShowCommand': struct.unpack('<I', data[60:64])[0],
-            'HotKey': struct.unpack('<H', data[64:66])[0],
-            'Reserved1': struct.unpack('<H', data[66:68])[0],
-            'Reserved2': struct.unpack('<I', data[68:72])[0],
-            'Reserved3': struct.unpack('<I', data[72:76])[0],
-        }
-        return header
+        return ShellLinkHeader(data, *HEADER_LAYOUT.unpack_from(data))
 
     def analyze_flags(self, flags):
-        flag_descriptions = {
-            'HasLinkTargetIDList': (flags & 0x1, "Contains Link Target ID List"),
-            'HasLinkInfo': (flags & 0x2, "Contains Link Info Structure"),
-            'HasName': (flags & 0x4, "Contains String Data: NAME"),
-            'HasRelativePath': (flags & 0x8, "Contains String Data: RELATIVE_PATH"),
-            'HasWorkingDir': (flags & 0x10, "Contains String Data: WORKING_DIR"),
-            'HasArguments': (flags & 0x20, "Contains String Data: COMMAND_LINE_ARGUMENTS"),
-            'HasIconLocation': (flags & 0x40, "Contains String Data: ICON_LOCATION"),
-            'IsUnicode': (flags & 0x80, "String data is Unicode encoded"),
-            'ForceNoLinkInfo': (flags & 0x100, "Shell Link should not use Link Info"),
-            'HasExpString': (flags & 0x200, "Contains EnvironmentVariableDataBlock"),
-            'RunInSeparateProcess': (flags & 0x400, "Target should run in separate process"),
-            'HasDarwinID': (flags & 0x1000, "Contains DarwinDataBlock"),
-            'RunAsUser': (flags & 0x2000, "Target should run as user"),
-            'HasExpIcon': (flags & 0x4000, "Contains IconEnvironmentDataBlock"),
-            'NoPidlAlias': (flags & 0x8000, "Shell Link is saved without a PIDL"),
-            'RunWithShimLayer': (flags & 0x20000, "Contains ShimDataBlock"),
-            'ForceNoLinkTrack': (flags & 0x40000, "Should not be tracked"),
-            'EnableTargetMetadata': (flags & 0x80000, "Shell Link can collect target properties"),
-            'DisableLinkPathTracking': (flags & 0x100000, "Link path should not be tracked"),
-            'DisableKnownFolderTracking': (flags & 0x200000, "Known folder should not be tracked"),
-            'DisableKnownFolderAlias': (flags & 0x400000, "Should not use known folder alias"),
-            'AllowLinkToLink': (flags & 0x800000, "Can link to another Shell Link"),
-            'UnaliasOnSave': (flags & 0x1000000, "Should be unaliased when saved"),
-            'PreferEnvironmentPath': (flags & 0x2000000, "Prefer system env path"),
-            'KeepLocalIDListForUNCTarget': (flags & 0x4000000, "Keep local ID list for UNC target"),
-        }
-        return {name: (value, desc) for name, (value, desc) in flag_descriptions.items()}
+        return LinkFlags(flags)
 
     def parse_link_target_idlist(self, data, offset, size):
         try:
-            idlist_data = data[offset:offset+size]
-            parsed_data = {
-                'ItemIDList': []
+            return {
+                'ItemIDList': walk_idlist(data, offset + 2, min(offset + size, len(data)))
             }
-            
-            current_offset = 2 
-            while current_offset < size:
-                item_size = struct.unpack('<H', idlist_data[current_offset:current_offset+2])[0]
-                if item_size == 0:
-                    break
-                    
-                item_data = idlist_data[current_offset+2:current_offset+item_size]
-                parsed_item = self.parse_itemid(item_data)
-                parsed_data['ItemIDList'].append({
-                    'Size': item_size,
-                    'Data': item_data.hex(),
-                    'Parsed': parsed_item
-                })
-                
-                current_offset += item_size
-                
-            return parsed_data
         except Exception as e:
             return {'error': f"Failed to parse LinkTargetIDList: {str(e)}"}
 
-    def parse_itemid(self, data):
-        try:
-            if len(data) < 2:
-                return None
-                
-            if data[0] == 0x1F:
-                return "Drive or Folder"
-            elif data[0] == 0x2E:
-                return "Directory"
-            elif data[0] == 0x2F:
-                return "Root Directory"
-            elif data[0] == 0x31:
-                try:
-                    name_data = data[4:]
-                    end = name_data.find(b'\x00')
-                    if end != -1:
-                        return f"File/Folder: {name_data[:end].decode('utf-8', errors='ignore')}"
-                except:
-                    pass
-            return f"Unknown Item Type: {hex(data[0])}"
-        except Exception as e:
-            return f"Error parsing ItemID: {str(e)}"
+    def parse_itemid(self, data, start, end):
+        return describe_itemid(data, start, end)
 
     def parse_link_info(self, data, offset, size):
         try:
             link_info_data = data[offset:offset+size]
-            header_size = struct.unpack('<I', link_info_data[0:4])[0]
-            flags = struct.unpack('<I', link_info_data[8:12])[0]
+            end = offset + len(link_info_data)
+            (header_size, _, flags, volume_id_offset, local_base_path_offset,
+             network_offset, common_path_suffix_offset) = LINK_INFO_LAYOUT.unpack_from(link_info_data)
             
             parsed_data = {
                 'HeaderSize': header_size,
                 'Flags': hex(flags),
-                'VolumeIDOffset': struct.unpack('<I', link_info_data[12:16])[0],
-                'LocalBasePathOffset': struct.unpack('<I', link_info_data[16:20])[0],
-                'CommonNetworkRelativeLinkOffset': struct.unpack('<I', link_info_data[20:24])[0],
-                'CommonPathSuffixOffset': struct.unpack('<I', link_info_data[24:28])[0]
+                'VolumeIDOffset': volume_id_offset,
+                'LocalBasePathOffset': local_base_path_offset,
+                'CommonNetworkRelativeLinkOffset': network_offset,
+                'CommonPathSuffixOffset': common_path_suffix_offset
             }
 
             if flags & 0x1:
-                local_base_path_offset = parsed_data['LocalBasePathOffset']
                 if local_base_path_offset < size:
-                    path_data = link_info_data[local_base_path_offset:]
-                    end = path_data.find(b'\x00')
-                    if end != -1:
-                        parsed_data['LocalBasePath'] = path_data[:end].decode('ascii', errors='ignore')
+                    local_base_path = read_cstring(data, offset + local_base_path_offset, end, 'ascii')
+                    if local_base_path is not None:
+                        parsed_data['LocalBasePath'] = local_base_path
+
+            if flags & 0x2:
+                if network_offset + 12 <= size:
+                    net_name_offset = UINT32.unpack_from(link_info_data, network_offset + 8)[0]
+                    net_name = read_cstring(data, offset + network_offset + net_name_offset, end, 'ascii')
+                    if net_name is not None:
+                        parsed_data['NetName'] = net_name
 
-            common_path_suffix_offset = parsed_data['CommonPathSuffixOffset']
             if common_path_suffix_offset < size:
-                suffix_data = link_info_data[common_path_suffix_offset:]
-                end = suffix_data.find(b'\x00')
-                if end != -1:
-                    parsed_data['CommonPathSuffix'] = suffix_data[:end].decode('ascii', errors='ignore')
+                common_path_suffix = read_cstring(data, offset + common_path_suffix_offset, end, 'ascii')
+                if common_path_suffix is not None:
+                    parsed_data['CommonPathSuffix'] = common_path_suffix
 
             return parsed_data
         except Exception as e:
@@ -174,14 +137,14 @@ class LNKAnalyzer:
 
     def parse_string_data(self, data, offset, is_unicode):
         try:
-            string_size = struct.unpack('<H', data[offset:offset+2])[0]
+            string_size = UINT16.unpack_from(data, offset)[0]
             offset += 2
         
             if is_unicode:
-                string_data = data[offset:offset+string_size*2].decode('utf-16le', errors='ignore')
+                string_data = str(data[offset:offset+string_size*2], 'utf-16le', 'ignore')
                 return string_data, 2 + (string_size * 2)
             else:
-                string_data = data[offset:offset+string_size].decode('ascii', errors='ignore')
+                string_data = str(data[offset:offset+string_size], 'ascii', 'ignore')
                 return string_data, 2 + string_size
         except Exception as e:
             return f"Error parsing string: {str(e)}", 2
@@ -189,166 +152,47 @@ class LNKAnalyzer:
     def analyze_string_data(self, data, offset, flags):
         string_data = {}
         current_offset = offset
-        is_unicode = flags['IsUnicode'][0]
+        is_unicode = flags & LinkFlags.IsUnicode
+        encoding = 'utf-16le' if is_unicode else 'ascii'
 
         string_order = [
-            ('HasName', 'NAME'),
-            ('HasRelativePath', 'RELATIVE_PATH'),
-            ('HasWorkingDir', 'WORKING_DIR'),
-            ('HasArguments', 'COMMAND_LINE_ARGUMENTS'),
-            ('HasIconLocation', 'ICON_LOCATION')
+            (LinkFlags.HasName, 'NAME'),
+            (LinkFlags.HasRelativePath, 'RELATIVE_PATH'),
+            (LinkFlags.HasWorkingDir, 'WORKING_DIR'),
+            (LinkFlags.HasArguments, 'COMMAND_LINE_ARGUMENTS'),
+            (LinkFlags.HasIconLocation, 'ICON_LOCATION')
         ]
 
-        for flag_name, string_type in string_order:
-            if flags[flag_name][0]:
-                string_size = struct.unpack('<H', data[current_offset:current_offset+2])[0]
-                size_hex = data[current_offset:current_offset+2].hex()
-                
-                string_size = struct.unpack('<H', data[current_offset:current_offset+2])[0]
-                size_hex = data[current_offset:current_offset+2].hex()
-
-                if is_unicode:
-                    string_data_size = string_size * 2
-                    string_value = data[current_offset+2:current_offset+2+string_data_size].decode('utf-16le', errors='ignore')
-                else:
-                    string_data_size = string_size
-                    string_value = data[current_offset+2:current_offset+2+string_data_size].decode('ascii', errors='ignore')
-
-                string_data[string_type] = {
-                    'value': string_value,
-                    'offset': hex(current_offset),
-                    'size': string_data_size,
-                    'size_hex': f"Size: {size_hex} ({string_size})",
-                    'raw_hex': data[current_offset+2:current_offset+2+string_data_size].hex(),
-                    'total_size': 2 + string_data_size
-                }
-
-                current_offset += 2 + string_data_size
-
-                if string_type == 'COMMAND_LINE_ARGUMENTS':
-                    self.check_suspicious_commands(string_value)
+        for flag, string_type in string_order:
+            if flags & flag:
+                string_size = UINT16.unpack_from(data, current_offset)[0]
+                string_data_size = string_size * 2 if is_unicode else string_size
+                value_start = current_offset + 2
+                value_end = value_start + string_data_size
+                string_value = str(data[value_start:value_end], encoding, 'ignore')
+
+                string_data[string_type] = StringValue(data, current_offset, string_size, string_data_size, string_value)
+
+                current_offset = value_end
+
+                if string_type in ('COMMAND_LINE_ARGUMENTS', 'ICON_LOCATION', 'RELATIVE_PATH'):
+                    self.check_suspicious_commands(string_value, string_type)
 
         return string_data, current_offset
 
-    def check_suspicious_commands(self, command_string):
+    def check_suspicious_commands(self, command_string, field='COMMAND_LINE_ARGUMENTS'):
         if not command_string:
             return
 
-        suspicious_patterns = [
-            (r'powershell.*-enc.*', 'Encoded PowerShell command'),
-            (r'powershell.*', 'PowerShell command'),
-            (r'cmd.*/c.*', 'Command prompt execution'),
-            (r'rundll32.*,', 'RunDLL32 usage'),
-            (r'%.*%.*%', 'Multiple environment variables'),
-            (r'\\\\.*\\.*\$', 'Hidden share access'),
-            (r'certutil.*-decode', 'Certificate utility decode'),
-            (r'mshta.*http', 'MSHTA with URL'),
-        ]
-
-        for pattern, description in suspicious_patterns:
-            if re.search(pattern, command_string, re.IGNORECASE):
-                self.suspicious.append(f"Suspicious command pattern: {description}")
-                self.risk_score += 3
-
-    def parse_extra_block_data(self, signature, data):
-        try:
-            if signature == 0xA0000002: 
-                return {
-                    'type': 'ConsoleDataBlock',
-                    'fill_attributes': struct.unpack('<H', data[0:2])[0],
-                    'popup_fill_attributes': struct.unpack('<H', data[2:4])[0],
-                    'screen_buffer_size_x': struct.unpack('<H', data[4:6])[0],
-                    'screen_buffer_size_y': struct.unpack('<H', data[6:8])[0],
-                    'window_size_x': struct.unpack('<H', data[8:10])[0],
-                    'window_size_y': struct.unpack('<H', data[10:12])[0]
-                }
-            
-            elif signature == 0xA0000004:
-                return {
-                    'type': 'ConsoleFEDataBlock',
-                    'code_page': struct.unpack('<I', data[0:4])[0]
-                }
-                
-            elif signature == 0xA0000006:
-                app_name = data[0:260].split(b'\x00')[0].decode('ascii', errors='ignore')
-                return {
-                    'type': 'DarwinDataBlock',
-                    'darwin_data_ansi': app_name
-                }
-                
-            elif signature == 0xA0000001:
-                target_ansi = data[0:260].split(b'\x00')[0].decode('ascii', errors='ignore')
-                target_unicode = data[260:520].split(b'\x00\x00')[0].decode('utf-16le', errors='ignore')
-                return {
-                    'type': 'EnvironmentVariableDataBlock',
-                    'target_ansi': target_ansi,
-                    'target_unicode': target_unicode
-                }
-                
-            elif signature == 0xA0000007:
-                target_ansi = data[0:260].split(b'\x00')[0].decode('ascii', errors='ignore')
-                target_unicode = data[260:520].split(b'\x00\x00')[0].decode('utf-16le', errors='ignore')
-                return {
-                    'type': 'IconEnvironmentDataBlock',
-                    'target_ansi': target_ansi,
-                    'target_unicode': target_unicode
-                }
-                
-            elif signature == 0xA000000B: 
-                return {
-                    'type': 'KnownFolderDataBlock',
-                    'known_folder_id': data[0:16].hex(),
-                    'offset': struct.unpack('<I', data[16:20])[0]
-                }
-                
-            elif signature == 0xA0000008: 
-                return {
-                    'type': 'ShimDataBlock',
-                    'layer_name': data.split(b'\x00\x00')[0].decode('utf-16le', errors='ignore')
-                }
-                
-            elif signature == 0xA0000005: 
-                return {
-                    'type': 'SpecialFolderDataBlock',
-                    'special_folder_id': struct.unpack('<I', data[0:4])[0],
-                    'offset': struct.unpack('<I', data[4:8])[0]
-                }
-                
-            elif signature == 0xA0000003:  
-                return {
-                    'type': 'TrackerDataBlock',
-                    'length': struct.unpack('<I', data[0:4])[0],
-                    'version': struct.unpack('<I', data[4:8])[0],
-                    'machine_id': data[8:16].hex(),
-                    'droid_volume_id': data[16:32].hex(),
-                    'droid_file_id': data[32:48].hex(),
-                    'birth_droid_volume_id': data[48:64].hex(),
-                    'birth_droid_file_id': data[64:80].hex(),
-                }
-                
-            elif signature == 0xA000000C:
-                return {
-                    'type': 'VistaAndAboveIDListDataBlock',
-                    'data': data.hex()
-                }
-            
-            elif signature == 0xA0000009:
-                return {
-                    'type': 'PropertyStoreDataBlock',
-                    'data': data.hex()
-                }
-                
+        for rule in self.rules.match(command_string, field):
+            if field == 'COMMAND_LINE_ARGUMENTS':
+                self.suspicious.append(f"Suspicious command pattern: {rule['description']}")
             else:
-                return {
-                    'type': 'Unknown',
-                    'note': f'Unknown signature: {hex(signature)}'
-                }
-                
-        except Exception as e:
-            return {
-                'type': 'Error',
-                'error': f'Failed to parse block data: {str(e)}'
-            }
+                self.suspicious.append(f"Suspicious pattern in {field}: {rule['description']}")
+            self.risk_score += rule.get('score', 3)
+
+    def parse_extra_block_data(self, signature, data, start, end):
+        return self.block_decoders.parse(signature, data, start, end)
 
     def analyze_extra_blocks(self, data, offset):
         blocks = []
@@ -358,50 +202,119 @@ class LNKAnalyzer:
             if current_offset + 8 > len(data):
                 break
 
-            block_size_bytes = data[current_offset:current_offset+4]
-            block_size = struct.unpack('<I', block_size_bytes)[0]
+            block_size, signature = BLOCK_HEADER_LAYOUT.unpack_from(data, current_offset)
             if block_size == 0:
+                self.structure_end = current_offset + 4
                 break
 
-            signature_bytes = data[current_offset+4:current_offset+8]
-            signature = struct.unpack('<I', signature_bytes)[0]
-            
-            block_info = {
-                'offset': hex(current_offset),
-                'size': block_size,
-                'size_hex': f"Size: {block_size_bytes.hex()} ({block_size})",
-                'signature': hex(signature), 
-                'signature_hex': signature_bytes.hex(),
-                'name': self.KNOWN_BLOCKS.get(signature, ('Unknown', None))[0],
-                'expected_size': self.KNOWN_BLOCKS.get(signature, ('Unknown', None))[1],
-                'data_hex': (data[current_offset+8:current_offset+block_size].hex())[0:1000],
-                'parsed_data': self.parse_extra_block_data(signature, data[current_offset+8:current_offset+block_size])
-            }
+            decoder = self.block_decoders.get(signature)
+            block_name = decoder.name if decoder is not None else 'Unknown'
+            expected_size = decoder.expected_size if decoder is not None else None
+            block_end = min(current_offset + block_size, len(data))
+            parsed = self.parse_extra_block_data(signature, data, current_offset+8, block_end)
+            block = ExtraBlock(data, current_offset, block_size, block_end, signature, block_name, expected_size, parsed)
 
-            if signature not in self.KNOWN_BLOCKS:
+            if decoder is None:
                 self.suspicious.append(f"Unknown Extra Data Block signature: {hex(signature)}")
                 self.risk_score += 4
-            elif (self.KNOWN_BLOCKS[signature][1] and 
-                block_size != self.KNOWN_BLOCKS[signature][1]):
+            elif expected_size and block_size != expected_size:
                 self.suspicious.append(
-                    f"Invalid block size for {block_info['name']}: "
-                    f"Expected {self.KNOWN_BLOCKS[signature][1]}, Got {block_size}")
+                    f"Invalid block size for {block_name}: "
+                    f"Expected {expected_size}, Got {block_size}")
                 self.risk_score += 0.2
 
-            blocks.append(block_info)
+            if parsed['type'] == 'EnvironmentVariableDataBlock':
+                for target in dict.fromkeys([parsed['target_ansi'], parsed['target_unicode']]):
+                    self.check_suspicious_commands(target, 'EnvironmentVariableDataBlock')
+
+            blocks.append(block)
             current_offset += block_size
 
+        if self.structure_end is None:
+            if current_offset + 4 <= len(data) and UINT32.unpack_from(data, current_offset)[0] == 0:
+                self.structure_end = current_offset + 4
+            else:
+                # No terminal block: nothing can be told apart as appended data.
+                self.structure_end = len(data)
         return blocks
 
-    def analyze_icon_mismatch(self, shell_link):
+    def open_shell_link(self):
+        import win32com.client
+
+        shell = win32com.client.Dispatch("WScript.Shell")
+        return shell.CreateShortCut(self.lnk_path)
+
+    def com_shell_link_info(self, shell_link):
+        return {
+            'TargetPath': shell_link.TargetPath,
+            'Arguments': shell_link.Arguments,
+            'WorkingDirectory': shell_link.WorkingDirectory,
+            'IconLocation': shell_link.IconLocation,
+        }
+
+    def native_shell_link_info(self, header, flags):
+        strings = self.result.strings or {}
+        link_info = self.result.link_info.parsed if self.result.link_info else {}
+        blocks = {block.parsed.get('type'): block.parsed for block in self.result.extra_blocks}
+
+        def string_value(name):
+            return strings[name].value if name in strings else ''
+
+        def environment_target(block_type):
+            block = blocks.get(block_type)
+            if block:
+                return block.get('target_unicode') or block.get('target_ansi') or ''
+            return ''
+
+        target_path = ''
+        if flags & LinkFlags.HasExpString:
+            target_path = environment_target('EnvironmentVariableDataBlock')
+        if not target_path and 'LocalBasePath' in link_info:
+            target_path = link_info['LocalBasePath'] + link_info.get('CommonPathSuffix', '')
+        if not target_path and 'NetName' in link_info:
+            suffix = link_info.get('CommonPathSuffix', '')
+            target_path = link_info['NetName'] + ('\\' + suffix if suffix else '')
+        if not target_path:
+            target_path = string_value('RELATIVE_PATH')
+
+        icon_path = ''
+        if flags & LinkFlags.HasExpIcon:
+            icon_path = environment_target('IconEnvironmentDataBlock')
+        if not icon_path:
+            icon_path = string_value('ICON_LOCATION')
+        icon_index = header.icon_index
+        if icon_index & 0x80000000:
+            icon_index -= 1 << 32
+
+        return {
+            'TargetPath': target_path,
+            'Arguments': string_value('COMMAND_LINE_ARGUMENTS'),
+            'WorkingDirectory': string_value('WORKING_DIR'),
+            'IconLocation': f"{icon_path},{icon_index}" if icon_path else '',
+        }
+
+    def analyze_icon_mismatch(self, shell_link_info):
         try:
-            target_path = shell_link.TargetPath
-            icon_location = shell_link.IconLocation
-            if icon_location:
-                real_icon = win32gui.ExtractIconEx(target_path, 0)[0]
-            if real_icon:
-                win32gui.DestroyIcon(real_icon)
+            target_path = shell_link_info['TargetPath']
+            icon_location = shell_link_info['IconLocation']
+            if self.native:
+                # Without win32gui the target's icon cannot be extracted, so only
+                # the configured icon file is compared against the target path.
+                icon_location = icon_location.rsplit(',', 1)[0]
                 real_icon_path = target_path
+                icon_key, target_key = comparable_path(icon_location), comparable_path(target_path)
+                if icon_key is None or target_key is None:
+                    return False
+                if icon_key == target_key:
+                    return False
+            else:
+                import win32gui
+
+                if icon_location:
+                    real_icon = win32gui.ExtractIconEx(target_path, 0)[0]
+                if real_icon:
+                    win32gui.DestroyIcon(real_icon)
+                    real_icon_path = target_path
 
             if icon_location.lower() != real_icon_path.lower():
                 self.suspicious.append(
@@ -421,166 +334,159 @@ class LNKAnalyzer:
         if not self.vt_api_key:
             return {"error": "No VirusTotal API key provided"}
 
-        url = "https://www.virustotal.com/vtapi/v2/file/report"
-        params = {
-            'apikey': self.vt_api_key,
-            'resource': file_hash
-        }
+        try:
+            result = get_client(self.vt_api_key).lookup(file_hash)
+        except Exception as e:
+            return {'error': f'VirusTotal lookup failed: {e}'}
+        self.risk_score += vt_score(result)
+        return result
+
+    def start_virustotal(self, file_hash):
+        if not self.vt_api_key:
+            return None
+        try:
+            return vt_executor().submit(get_client(self.vt_api_key).lookup, file_hash)
+        except Exception as e:
+            # Client or cache setup failed (unwritable cache dir, locked database);
+            # collect_virustotal reports it without losing the local analysis.
+            failed = Future()
+            failed.set_exception(e)
+            return failed
+
+    def collect_virustotal(self, future, started):
+        if future is None:
+            return {"error": "No VirusTotal API key provided"}
 
         try:
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('response_code') == 1:
-                    if result.get('positives', 0) > 0:
-                        self.risk_score += min(5, result.get('positives') / 2)
-                    return {
-                        'found': True,
-                        'positives': result.get('positives', 0),
-                        'total': result.get('total', 0),
-                        'scan_date': result.get('scan_date', ''),
-                        'permalink': result.get('permalink', '')
-                    }
-                return {'found': False, 'message': 'File not found in VirusTotal'}
-            return {'error': f'API request failed with status code {response.status_code}'}
+            result = future.result(timeout=max(0, self.vt_deadline - (time.monotonic() - started)))
+        except FutureTimeoutError:
+            # The lookup keeps running; the client caches its answer for the next
+            # launch and the callback keeps it on this analyzer.
+            future.add_done_callback(self._record_late_virustotal)
+            return {'pending': True, 'message': f'VirusTotal lookup exceeded the {self.vt_deadline}s deadline'}
         except Exception as e:
-            return {'error': f'API request failed: {str(e)}'}
+            print(f"VirusTotal lookup failed: {e}")
+            return {'error': f'VirusTotal lookup failed: {e}'}
 
-    def _filetime_to_datetime(self, filetime):
-        if filetime == 0:
-            return "Not set"
-        return datetime.fromtimestamp((filetime - 116444736000000000) // 10000000)
+        self.risk_score += vt_score(result)
+        return result
+
+    def _record_late_virustotal(self, future):
+        if future.exception() is None:
+            self.late_vt_results = future.result()
 
     def generate_risk_gauge(self):
-        plt.figure(figsize=(10, 2))
-        plt.axis('off')
-        
-        gradient = np.linspace(0, 1, 100)
-        plt.imshow([gradient], extent=[0, 10, 0, 1], aspect='auto', cmap='RdYlGn_r')
-        
-        plt.plot([self.risk_score, self.risk_score], [0, 1], 'k-', linewidth=2)
-        
-        plt.text(self.risk_score, 1.2, f'Risk Score: {self.risk_score}/10', 
-                ha='center', va='bottom')
-        
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', transparent=True)
-        plt.close()
-        return base64.b64encode(buf.getvalue()).decode('utf-8')
+        return render_risk_gauge(self.risk_score)
 
-    def analyze(self):
+    def analyze(self, report=True):
+        started = time.monotonic()
+        clock = metrics.stage_clock()
+        self.timings = clock.timings
+        mapping = None
         try:
-            shell = win32com.client.Dispatch("WScript.Shell")
-            shell_link = shell.CreateShortCut(self.lnk_path)
-
-            with open(self.lnk_path, 'rb') as f:
-                data = f.read()
-                
-            self.file_hashes = {
-                'md5': hashlib.md5(data).hexdigest(),
-                'sha1': hashlib.sha1(data).hexdigest(),
-                'sha256': hashlib.sha256(data).hexdigest()
-            }
-
-            self.vt_results = self.check_virustotal(self.file_hashes['sha256'])
+            if not self.native:
+                shell_link = self.open_shell_link()
+                clock.lap('com')
+
+            if self.digest is None:
+                self.digest = digest_file(self.lnk_path)
+            data, self.file_hashes = self.digest
+            if isinstance(data, mmap.mmap):
+                mapping = data
+            data = memoryview(data)
+            file_size = len(data)
+            metrics.count('lnk_analysis_files_total')
+            metrics.count('lnk_analysis_bytes_total', file_size)
+            clock.lap('hashing')
+
+            vt_future = self.start_virustotal(self.file_hashes['sha256'])
 
             header = self.read_lnk_header(data)
-            flags = self.analyze_flags(header['LinkFlags'])
+            flags = header.link_flags
 
-            if header['ShowCommand'] == 7:
+            if header.show_command == 7:
                 self.suspicious.append("Suspicious ShowCommand value (7) - Minimized execution")
                 self.risk_score += 4
 
-            self.structure_info = {
-                'Header': {
-                    'Size': header['HeaderSize'],
-                    'Data': header,
-                    'Description': 'Shell Link Header',
-                    'Flags': flags
-                },
-                'LinkTargetIDList': {
-                    'Size': 0,
-                    'Hex': None,
-                    'Data': None,
-                    'Description': 'Contains ID list of target'
-                },
-                'LinkInfo': {
-                    'Size': 0,
-                    'Hex': None,
-                    'Data': None,
-                    'Description': 'Contains information about linked file'
-                },
-                'StringData': {
-                    'Size': 0,
-                    'Data': None,
-                    'Description': 'Contains various string properties'
-                },
-                'ExtraData': {
-                    'Size': 0,
-                    'Data': [],
-                    'Description': 'Contains additional data blocks'
-                },
-                'ShellLinkInfo': {
-                    'TargetPath': shell_link.TargetPath,
-                    'Arguments': shell_link.Arguments,
-                    'WorkingDirectory': shell_link.WorkingDirectory,
-                    'IconLocation': shell_link.IconLocation,
-                    'WindowStyle': header['ShowCommand'],
-                    'FileSize': os.path.getsize(self.lnk_path),
-                }
-            }
-
+            result = self.result = LNKResult(data, header)
             offset = 76
 
-            if flags['HasLinkTargetIDList'][0]:
-                idlist_size = struct.unpack('<H', data[offset:offset+2])[0]
+            if flags & LinkFlags.HasLinkTargetIDList:
+                idlist_size = UINT16.unpack_from(data, offset)[0]
                 parsed_idlist = self.parse_link_target_idlist(data, offset, idlist_size + 2)
-                self.structure_info['LinkTargetIDList'].update({
-                    'Size': idlist_size + 2,
-                    'Data': data[offset:offset+idlist_size+2].hex(),
-                    'ParsedData': parsed_idlist
-                })
+                result.id_list = Section(data, offset, idlist_size + 2, parsed_idlist)
                 offset += 2 + idlist_size
 
-            if flags['HasLinkInfo'][0]:
-                linkinfo_size = struct.unpack('<I', data[offset:offset+4])[0]
+            if flags & LinkFlags.HasLinkInfo:
+                linkinfo_size = UINT32.unpack_from(data, offset)[0]
                 parsed_linkinfo = self.parse_link_info(data, offset, linkinfo_size)
-                self.structure_info['LinkInfo'].update({
-                    'Size': linkinfo_size,
-                    'Data': data[offset:offset+linkinfo_size].hex(),
-                    'ParsedData': parsed_linkinfo
-                })
+                result.link_info = Section(data, offset, linkinfo_size, parsed_linkinfo)
                 offset += linkinfo_size
 
-            has_string_data = any([
-                flags['HasName'][0],
-                flags['HasRelativePath'][0],
-                flags['HasWorkingDir'][0],
-                flags['HasArguments'][0],
-                flags['HasIconLocation'][0]
-            ])
-
-            if has_string_data:
-                string_data, new_offset = self.analyze_string_data(data, offset, flags)
-                self.structure_info['StringData']['Data'] = string_data
-                self.structure_info['StringData']['Size'] = new_offset - offset
+            if flags & STRING_FLAGS:
+                result.strings, new_offset = self.analyze_string_data(data, offset, flags)
+                result.string_size = new_offset - offset
                 offset = new_offset
 
-            extra_blocks = self.analyze_extra_blocks(data, offset)
-            self.structure_info['ExtraData']['Data'] = extra_blocks
-            if extra_blocks:
-                total_extra_size = sum(block['size'] for block in extra_blocks)
-                self.structure_info['ExtraData']['Size'] = total_extra_size
+            result.extra_blocks = self.analyze_extra_blocks(data, offset)
+
+            overlay_size = len(data) - self.structure_end
+            if overlay_size > 0:
+                result.overlay_offset = self.structure_end
+                result.overlay_size = overlay_size
+                result.overlay_head = min(overlay_size, OVERLAY_HEAD_BYTES)
+                self.suspicious.append(f"Overlay detected: {overlay_size} bytes appended after the terminal block")
+                self.risk_score += 2
+
+            # A kept analyzer holds the compacted structure, not the file data.
+            result.compact()
+            self.digest = None
+            if result.buffer is not data:
+                data.release()
+            clock.lap('parsing')
 
-            self.analyze_icon_mismatch(shell_link)
+            if self.native:
+                shell_link_info = self.native_shell_link_info(header, flags)
+            else:
+                shell_link_info = self.com_shell_link_info(shell_link)
+            shell_link_info.update({
+                'WindowStyle': header.show_command,
+                # The digested buffer is the whole file, on disk or read from a container.
+                'FileSize': file_size,
+            })
+            result.shell_link_info = shell_link_info
+            clock.lap('shell_link_info')
+
+            self.analyze_icon_mismatch(shell_link_info)
+            clock.lap('icon_check')
+
+            self.vt_results = self.collect_virustotal(vt_future, started)
+            if vt_future is not None:
+                clock.lap('virustotal')
 
             if (self.risk_score > 10):
                 self.risk_score = 10
 
-            if self.risk_score > 4:
-                generate_report(self)
-                
+            if report and self.risk_score > 4:
+                from generate_report import generate_report
+
+                self.report_path = generate_report(self)
+                clock.lap('report')
+
+            clock.finish()
             return self.risk_score
 
         except Exception as e:
-            print(f"Error analyzing LNK file: {str(e)}")
\ No newline at end of file
+            metrics.count('lnk_analysis_errors_total')
+            print(f"Error analyzing LNK file: {str(e)}")
+        finally:
+            if mapping is not None:
+                # Unmap as soon as the result is built instead of whenever the
+                # analyzer is collected (never, in a long-running daemon).
+                self.digest = None
+                try:
+                    mapping.close()
+                except BufferError:
+                    # A failed parse can leave views on the mapping in the result;
+                    # it is unmapped once those are gone.
+                    pass
\ No newline at end of file
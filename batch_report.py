@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import functools
+import threading
+import http.server
+from datetime import datetime
+from generate_report import env, TEMPLATE_DIR, write_report
+from exporters import dumps
+from risk_gauge import render_risk_gauge
+
+INDEX_FILE = "index.html"
+RECORDS_FILE = "records.jsonl"
+OFFSETS_FILE = "offsets.json"
+DETAIL_DIR = "detail"
+STATIC_DIR = "static"
+STATIC_FILES = ("report.css", "batch.js")
+# Indicators shown per row in the index; the detail page has all of them.
+MAX_INDICATORS = 3
+# Without --min-score only files main.py would alert on (score above this) are listed.
+ALERT_THRESHOLD = 4
+
+SHA256_PATTERN = re.compile(r'[0-9a-f]{64}')
+_render_lock = threading.Lock()
+
+
+def copy_static(output_dir):
+    static_dir = os.path.join(output_dir, STATIC_DIR)
+    os.makedirs(static_dir, exist_ok=True)
+    for name in STATIC_FILES:
+        shutil.copyfile(os.path.join(TEMPLATE_DIR, STATIC_DIR, name), os.path.join(static_dir, name))
+
+
+class BatchReport:
+    # Exporter (see exporters.py) that turns a whole sweep into one directory:
+    # an index.html row per file, CSS/JS written once under static/, and the full
+    # record of each unique file in records.jsonl for detail pages rendered later.
+    def __init__(self, output_dir, min_score=None, backend=None):
+        self.output_dir = output_dir
+        # min_score: list files at or above it; None lists files above ALERT_THRESHOLD.
+        # Files below it are only counted, so output grows with findings, not corpus size.
+        self.min_score = min_score
+        self.backend = backend
+        self.entries = []
+        self.offsets = {}
+        self.total = 0
+        self.failed = 0
+        self.unlisted = 0
+
+        detail_dir = os.path.join(output_dir, DETAIL_DIR)
+        # Detail pages of an earlier sweep would not match the new records.
+        shutil.rmtree(detail_dir, ignore_errors=True)
+        os.makedirs(detail_dir)
+        copy_static(output_dir)
+        self.records = open(os.path.join(output_dir, RECORDS_FILE), 'wb')
+
+    def write(self, record):
+        self.total += 1
+        risk_score = record.get('risk_score')
+        if risk_score is None:
+            self.failed += 1
+            return
+        if not self.listed(risk_score):
+            self.unlisted += 1
+            return
+
+        sha256 = record['file_hashes']['sha256']
+        if sha256 not in self.offsets:
+            self.offsets[sha256] = self.records.tell()
+            self.records.write(dumps(record, self.backend).encode('utf-8') + b'\n')
+
+        indicators = record['malicious'] + record['suspicious']
+        self.entries.append({
+            'path': record['path'],
+            'sha256': sha256,
+            'risk_score': risk_score,
+            'malicious': len(record['malicious']),
+            'suspicious': len(record['suspicious']),
+            'indicators': [indicator.split('\n', 1)[0] for indicator in indicators[:MAX_INDICATORS]],
+        })
+
+    def listed(self, risk_score):
+        if self.min_score is None:
+            return risk_score > ALERT_THRESHOLD
+        return risk_score >= self.min_score
+
+    def close(self):
+        self.records.close()
+        with open(os.path.join(self.output_dir, OFFSETS_FILE), 'w', encoding='utf-8') as f:
+            json.dump(self.offsets, f)
+
+        self.entries.sort(key=lambda entry: (-entry['risk_score'], entry['path']))
+        index_path = os.path.join(self.output_dir, INDEX_FILE)
+        with open(index_path, 'w', encoding='utf-8') as f:
+            f.writelines(env.get_template("batch_index.html").generate(
+                datetime=datetime,
+                entries=self.entries,
+                total=self.total,
+                failed=self.failed,
+                unlisted=self.unlisted,
+                unique=len(self.offsets),
+                min_score=self.min_score,
+                alert_threshold=ALERT_THRESHOLD
+            ))
+        return index_path
+
+
+def load_record(output_dir, sha256):
+    with open(os.path.join(output_dir, OFFSETS_FILE), 'r', encoding='utf-8') as f:
+        offset = json.load(f).get(sha256)
+    if offset is None:
+        return None
+    with open(os.path.join(output_dir, RECORDS_FILE), 'rb') as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+
+def render_detail(output_dir, sha256, raw_limits=None):
+    if not SHA256_PATTERN.fullmatch(sha256):
+        return None
+    detail_path = os.path.join(output_dir, DETAIL_DIR, f"{sha256}.html")
+    with _render_lock:
+        if os.path.exists(detail_path):
+            return detail_path
+        record = load_record(output_dir, sha256)
+        if record is None:
+            return None
+        context = {
+            'lnk_path': record['path'],
+            'structure_info': record['structure_info'],
+            'file_hashes': record['file_hashes'],
+            'malicious': record['malicious'],
+            'suspicious': record['suspicious'],
+            'risk_gauge': render_risk_gauge(record['risk_score']),
+            'risk_score': record['risk_score'],
+            'vt_results': record['vt_results']
+        }
+        return write_report(detail_path, context, raw_limits, stylesheet=f"../{STATIC_DIR}/report.css")
+
+
+class DetailRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Serves the batch directory and renders a detail page the first time it is asked for.
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        prefix = f"/{DETAIL_DIR}/"
+        if path.startswith(prefix) and path.endswith('.html'):
+            render_detail(self.directory, path[len(prefix):-len('.html')])
+        super().do_GET()
+
+
+def serve(output_dir, port=8000):
+    handler = functools.partial(DetailRequestHandler, directory=output_dir)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), handler)
+    print(f"Serving {output_dir} on http://127.0.0.1:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch LNK analysis report (one index, detail pages on demand)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Scan files and write the index')
+    build.add_argument('output_dir', help='Report directory')
+    build.add_argument('paths', nargs='+', help='Files or directory trees to scan')
+    build.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    build.add_argument('--min-score', type=float, default=None,
+                       help=f'Only list files at or above this risk score (default: above {ALERT_THRESHOLD})')
+    build.add_argument('--progress', action='store_true', help='Show files/sec progress on stderr')
+    build.add_argument('--vt-api-key', default=None, help='VirusTotal API key')
+
+    render = commands.add_parser('render', help='Write detail pages ahead of time')
+    render.add_argument('output_dir', help='Report directory')
+    render.add_argument('sha256', nargs='*', help='Files to render (default: all)')
+
+    serve_parser = commands.add_parser('serve', help='Serve the report, rendering detail pages when opened')
+    serve_parser.add_argument('output_dir', help='Report directory')
+    serve_parser.add_argument('--port', type=int, default=8000, help='Port on 127.0.0.1')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        from scan_lnk import scan, ProgressMeter
+
+        report = BatchReport(args.output_dir, min_score=args.min_score)
+        scan(args.paths, None, workers=args.workers, vt_api_key=args.vt_api_key,
+             progress=ProgressMeter(args.progress), exporter=report, include_structure=True)
+        print(f"Batch report saved to: {os.path.join(args.output_dir, INDEX_FILE)}")
+    elif args.command == 'render':
+        hashes = args.sha256
+        if not hashes:
+            with open(os.path.join(args.output_dir, OFFSETS_FILE), 'r', encoding='utf-8') as f:
+                hashes = list(json.load(f))
+        for sha256 in hashes:
+            if render_detail(args.output_dir, sha256.lower()) is None:
+                print(f"No record for {sha256}", file=sys.stderr)
+    else:
+        serve(args.output_dir, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import tracemalloc
+from analyze_lnk import LNKAnalyzer, UINT16, UINT32
+from file_digest import ANALYSIS_ALGORITHMS, DigestEngine
+from lnk_model import LinkFlags, STRING_FLAGS
+from verdict_cache import ANALYZER_VERSION
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+STAGES = ('read_lnk_header', 'parse_link_target_idlist', 'parse_link_info', 'analyze_string_data',
+          'analyze_extra_blocks', 'check_suspicious_commands', 'generate_report', 'analyze')
+
+
+class Sample:
+    # One corpus file, pre-walked once so every stage can be called in isolation
+    # with the offsets analyze() would pass it.
+    def __init__(self, path, data):
+        self.path = path
+        self.data = memoryview(data)
+        self.analyzer = LNKAnalyzer(path, native=True)
+        self.inputs = {}
+        self.prepare()
+
+    def prepare(self):
+        analyzer = self.analyzer
+        data = self.data
+        try:
+            header = analyzer.read_lnk_header(data)
+        except Exception:
+            return
+        self.inputs['read_lnk_header'] = (data,)
+        flags = header.link_flags
+        offset = 76
+        try:
+            if flags & LinkFlags.HasLinkTargetIDList:
+                size = UINT16.unpack_from(data, offset)[0] + 2
+                self.inputs['parse_link_target_idlist'] = (data, offset, size)
+                offset += size
+            if flags & LinkFlags.HasLinkInfo:
+                size = UINT32.unpack_from(data, offset)[0]
+                self.inputs['parse_link_info'] = (data, offset, size)
+                offset += size
+            if flags & STRING_FLAGS:
+                strings, end = analyzer.analyze_string_data(data, offset, flags)
+                self.inputs['analyze_string_data'] = (data, offset, flags)
+                for field in ('COMMAND_LINE_ARGUMENTS', 'ICON_LOCATION', 'RELATIVE_PATH'):
+                    if field in strings:
+                        self.inputs.setdefault('check_suspicious_commands', (strings[field].value, field))
+                offset = end
+            analyzer.analyze_extra_blocks(data, offset)
+            self.inputs['analyze_extra_blocks'] = (data, offset)
+        except Exception:
+            pass
+        self.reset()
+
+    def reset(self):
+        # Stages append findings; start every call from a clean analyzer.
+        self.analyzer.risk_score = 0
+        self.analyzer.suspicious = []
+        self.analyzer.malicious = []
+
+    def call(self, stage):
+        return getattr(self.analyzer, stage)(*self.inputs[stage])
+
+
+def load_corpus(corpus_dir):
+    samples = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if not name.lower().endswith('.lnk'):
+            continue
+        path = os.path.join(corpus_dir, name)
+        with open(path, 'rb') as f:
+            samples.append(Sample(path, f.read()))
+    return samples
+
+
+def prepare_reports(samples, report_dir):
+    # generate_report writes next to lnk_path, so point each analyzer at a copy
+    # inside the scratch directory and run the full analysis once.
+    ready = []
+    for sample in samples:
+        copy = os.path.join(report_dir, os.path.basename(sample.path))
+        shutil.copyfile(sample.path, copy)
+        analyzer = LNKAnalyzer(copy, native=True)
+        if analyzer.analyze(report=False) is not None:
+            ready.append(analyzer)
+    return ready
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(timings_ns, nbytes, allocated, blocks, skipped):
+    timings_ns.sort()
+    calls = len(timings_ns)
+    total_s = sum(timings_ns) / 1e9
+    return {
+        'calls': calls,
+        'skipped': skipped,
+        'mean_us': total_s / calls * 1e6,
+        'p50_us': percentile(timings_ns, 0.50) / 1000,
+        'p95_us': percentile(timings_ns, 0.95) / 1000,
+        'max_us': timings_ns[-1] / 1000,
+        'ops_per_sec': calls / total_s if total_s else 0,
+        'mb_per_sec': nbytes / total_s / 1e6 if total_s else 0,
+        'alloc_bytes_per_call': allocated / calls,
+        'alloc_blocks_per_call': blocks / calls,
+    }
+
+
+def measure_allocations(func, calls):
+    # Separate pass: tracemalloc distorts timings. Counts what each call
+    # allocates and keeps (the stage results), not transient garbage.
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [func(item) for item in calls]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    del results
+    return (sum(stat.size_diff for stat in stats if stat.size_diff > 0),
+            sum(stat.count_diff for stat in stats if stat.count_diff > 0))
+
+
+def measure_peak(func, calls):
+    # Largest tracemalloc peak of a single call, e.g. the string copies made
+    # while parsing an oversized argument field.
+    peak = 0
+    tracemalloc.start()
+    for item in calls:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        result = func(item)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - start)
+        del result
+    tracemalloc.stop()
+    return peak
+
+
+def bench_stage(stage, samples, rounds):
+    eligible = [sample for sample in samples if stage in sample.inputs]
+    skipped = len(samples) - len(eligible)
+    if not eligible:
+        return None
+
+    def run(sample):
+        sample.reset()
+        return sample.call(stage)
+
+    timings = []
+    nbytes = 0
+    for _ in range(rounds):
+        for sample in eligible:
+            sample.reset()
+            start = time.perf_counter_ns()
+            sample.call(stage)
+            timings.append(time.perf_counter_ns() - start)
+            nbytes += len(sample.data)
+    allocated, blocks = measure_allocations(run, eligible)
+    return summarize(timings, nbytes, allocated * rounds, blocks * rounds, skipped)
+
+
+def bench_report(analyzers, rounds):
+    from generate_report import generate_report
+
+    def run(analyzer):
+        return generate_report(analyzer)
+
+    timings = []
+    nbytes = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(analyzers[0])  # compile the template outside the measurement
+        for _ in range(rounds):
+            for analyzer in analyzers:
+                start = time.perf_counter_ns()
+                run(analyzer)
+                timings.append(time.perf_counter_ns() - start)
+                nbytes += analyzer.result.shell_link_info['FileSize']
+        allocated, blocks = measure_allocations(run, analyzers)
+    return summarize(timings, nbytes, allocated * rounds, blocks * rounds, 0)
+
+
+def bench_analyze(samples, rounds):
+    # Whole-file analyze(report=False) with the digest taken beforehand, so
+    # hashing and report rendering are left out.
+    engine = DigestEngine(ANALYSIS_ALGORITHMS)
+    digests = [(sample.data.obj, engine.digest_buffer(sample.data)) for sample in samples]
+
+    def run(item):
+        sample, digest = item
+        analyzer = LNKAnalyzer(sample.path, native=True, digest=digest)
+        analyzer.analyze(report=False)
+        return analyzer
+
+    calls = list(zip(samples, digests))
+    timings = []
+    nbytes = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            for item in calls:
+                start = time.perf_counter_ns()
+                run(item)
+                timings.append(time.perf_counter_ns() - start)
+                nbytes += len(item[0].data)
+        allocated, blocks = measure_allocations(run, calls)
+        peak = measure_peak(run, calls)
+    summary = summarize(timings, nbytes, allocated * rounds, blocks * rounds, 0)
+    summary['peak_bytes'] = peak
+    return summary
+
+
+def code_version():
+    try:
+        proc = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, timeout=5)
+        if proc.returncode == 0:
+            return proc.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return None
+
+
+def run_benchmarks(corpus_dir, stages=STAGES, rounds=20, report_rounds=2):
+    with contextlib.redirect_stdout(io.StringIO()):
+        samples = load_corpus(corpus_dir)
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'version': code_version(),
+        'analyzer_version': ANALYZER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': {
+            'path': os.path.abspath(corpus_dir),
+            'files': len(samples),
+            'bytes': sum(len(sample.data) for sample in samples),
+        },
+        'rounds': rounds,
+        'stages': {},
+    }
+    for stage in stages:
+        if stage == 'generate_report':
+            with tempfile.TemporaryDirectory() as report_dir:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    analyzers = prepare_reports(samples, report_dir)
+                if analyzers:
+                    results['stages'][stage] = bench_report(analyzers, report_rounds)
+        elif stage == 'analyze':
+            if samples:
+                results['stages'][stage] = bench_analyze(samples, rounds)
+        else:
+            summary = bench_stage(stage, samples, rounds)
+            if summary is not None:
+                results['stages'][stage] = summary
+    return results
+
+
+def load_previous(results_path):
+    previous = None
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                previous = json.loads(line)
+            except ValueError:
+                continue
+    return previous
+
+
+def print_results(results, previous=None):
+    corpus = results['corpus']
+    print(f"Corpus: {corpus['files']} files, {corpus['bytes']} bytes ({corpus['path']})")
+    print(f"Version: {results['version'] or 'unknown'}  Python {results['python']}")
+    if previous:
+        print(f"Compared with {previous.get('version') or 'unknown'} at {previous.get('timestamp')}")
+    print(f"{'stage':<28}{'calls':>8}{'mean us':>10}{'p95 us':>10}{'ops/s':>12}{'MB/s':>9}{'alloc B':>10}{'blocks':>8}")
+    for stage, summary in results['stages'].items():
+        line = (f"{stage:<28}{summary['calls']:>8}{summary['mean_us']:>10.1f}{summary['p95_us']:>10.1f}"
+                f"{summary['ops_per_sec']:>12.0f}{summary['mb_per_sec']:>9.1f}"
+                f"{summary['alloc_bytes_per_call']:>10.0f}{summary['alloc_blocks_per_call']:>8.1f}")
+        if 'peak_bytes' in summary:
+            line += f"  peak {summary['peak_bytes'] / 1024:.0f} KB"
+        before = (previous or {}).get('stages', {}).get(stage)
+        if before and before['mean_us']:
+            line += f"  {(summary['mean_us'] / before['mean_us'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-stage LNK analyzer benchmarks')
+    parser.add_argument('corpus_dir', help='Directory of .lnk files (see lnk_corpus.py)')
+    parser.add_argument('--stage', action='append', choices=STAGES, help='Stage to run (repeatable; default: all)')
+    parser.add_argument('-n', '--rounds', type=int, default=20, help='Passes over the corpus per parsing stage')
+    parser.add_argument('--report-rounds', type=int, default=2, help='Passes over the corpus for generate_report')
+    parser.add_argument('-o', '--output', help='Append the results as one JSON line to this file')
+    parser.add_argument('--compare', help='Results file whose last run is shown alongside (default: --output)')
+    args = parser.parse_args(argv)
+
+    compare_path = args.compare or args.output
+    previous = load_previous(compare_path) if compare_path and os.path.exists(compare_path) else None
+
+    results = run_benchmarks(args.corpus_dir, args.stage or STAGES, args.rounds, args.report_rounds)
+    print_results(results, previous)
+
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(results) + '\n')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
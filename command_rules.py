@@ -0,0 +1,148 @@
+import os
+import json
+import hashlib
+from collections import deque
+
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'command_rules.json')
+DEFAULT_FIELDS = ('COMMAND_LINE_ARGUMENTS',)
+
+
+def parse_pattern(pattern):
+    # Rule patterns are literal tokens separated by ".*": the rule matches when
+    # every token occurs, case-insensitively and without overlapping, in order,
+    # on one line (as with re.search, ".*" does not cross a newline).
+    return [token.lower() for token in pattern.split('.*') if token]
+
+
+class CommandRuleMatcher:
+    # All rule tokens are compiled into one Aho-Corasick automaton, so a string
+    # is matched against every rule in a single left-to-right pass. There is no
+    # backtracking: cost is linear in the input no matter how it is padded.
+    def __init__(self, rules):
+        self.rules = rules
+        self.rule_tokens = [parse_pattern(rule['pattern']) for rule in rules]
+
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        token_ids = {}
+        self.token_lengths = []
+        self.token_users = []
+
+        for rule_index, tokens in enumerate(self.rule_tokens):
+            for position, token in enumerate(tokens):
+                if token not in token_ids:
+                    token_ids[token] = len(self.token_lengths)
+                    self.token_lengths.append(len(token))
+                    self.token_users.append([])
+                    self._add_token(token, token_ids[token])
+                self.token_users[token_ids[token]].append((rule_index, position))
+
+        self._build_failure_links()
+
+    def _add_token(self, token, token_id):
+        state = 0
+        for char in token:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append(token_id)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def match(self, text):
+        if not text or not self.rules:
+            return []
+
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        token_lengths, token_users = self.token_lengths, self.token_users
+        rule_lengths = [len(tokens) for tokens in self.rule_tokens]
+        progress = [0] * len(self.rules)
+        last_end = [-1] * len(self.rules)
+        matched = [length == 0 for length in rule_lengths]
+        remaining = matched.count(False)
+
+        state = 0
+        for index, char in enumerate(text.lower()):
+            if char == '\n':
+                # Rules not yet complete start over on the next line.
+                for rule_index, hit in enumerate(matched):
+                    if not hit:
+                        progress[rule_index] = 0
+                        last_end[rule_index] = -1
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for token_id in outputs[state]:
+                start = index - token_lengths[token_id] + 1
+                for rule_index, position in token_users[token_id]:
+                    if progress[rule_index] == position and start > last_end[rule_index]:
+                        progress[rule_index] += 1
+                        last_end[rule_index] = index
+                        if progress[rule_index] == rule_lengths[rule_index]:
+                            matched[rule_index] = True
+                            remaining -= 1
+            if not remaining:
+                break
+
+        return [rule for rule, hit in zip(self.rules, matched) if hit]
+
+
+class CommandRuleSet:
+    # One matcher per string field, each holding only the rules listed for it.
+    def __init__(self, rules, version=None):
+        self.rules = rules
+        self.version = version
+        fields = {}
+        for rule in rules:
+            for field in rule.get('fields', DEFAULT_FIELDS):
+                fields.setdefault(field, []).append(rule)
+        self.matchers = {field: CommandRuleMatcher(field_rules) for field, field_rules in fields.items()}
+
+    def match(self, text, field='COMMAND_LINE_ARGUMENTS'):
+        matcher = self.matchers.get(field)
+        if matcher is None:
+            return []
+        return matcher.match(text)
+
+
+def rules_version_of(raw):
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def rules_version(path=RULES_FILE):
+    # Version of a rule file without compiling it, for cache keys on the click path.
+    with open(path, 'rb') as f:
+        return rules_version_of(f.read())
+
+
+def load_rules(path=RULES_FILE):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    rules = json.loads(raw.decode('utf-8'))['rules']
+    return CommandRuleSet(rules, version=rules_version_of(raw))
+
+
+_default_rules = None
+
+
+def default_rules():
+    global _default_rules
+    if _default_rules is None:
+        _default_rules = load_rules()
+    return _default_rules
@@ -0,0 +1,317 @@
+import io
+import bz2
+import gzip
+import lzma
+import zlib
+import struct
+import tarfile
+import zipfile
+from file_digest import compute_digests, ANALYSIS_ALGORITHMS
+from scan_lnk import scan_file
+
+# Verdict paths join the chain as outer.zip!inner.iso!dir/a.lnk
+CHAIN_SEPARATOR = '!'
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_MAX_MEMBER_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_TOTAL_SIZE = 1024 * 1024 * 1024
+# Enough of a member to recognize a shortcut or any of the container formats.
+HEAD_SIZE = 0x8006
+# A compressed tar is only recognized by the ustar header inside it, and bzip2
+# emits nothing until its first block (up to 900 kB of input) is complete.
+COMPRESSED_HEAD_SIZE = 1024 * 1024
+TAR_HEADER_SIZE = 512
+
+LNK_MAGIC = bytes.fromhex('4c0000000114020000000000c000000000000046')
+COMPRESSED_TAR_MAGIC = (b'\x1f\x8b', b'BZh', b'\xfd7zXZ\x00')
+ISO_SECTOR = 2048
+ISO_DESCRIPTOR_START = 16
+ISO_MAGIC_OFFSET = ISO_DESCRIPTOR_START * ISO_SECTOR + 1
+JOLIET_ESCAPES = (b'%/@', b'%/C', b'%/E')
+ISO_DIRECTORY_RECORD = struct.Struct('<BBIxxxxIxxxx7sBBBHxxB')
+# Caps on ISO directory walking so a crafted image cannot loop or explode.
+ISO_MAX_ENTRIES = 100000
+ISO_MAX_DIRECTORY_SIZE = 16 * 1024 * 1024
+
+
+class ContainerLimitError(Exception):
+    pass
+
+
+def decompress_head(head):
+    # First tar header of a gzip, bzip2 or xz stream; short if it cannot be decoded.
+    try:
+        if head.startswith(b'\x1f\x8b'):
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head, TAR_HEADER_SIZE)
+        if head.startswith(b'BZh'):
+            return bz2.BZ2Decompressor().decompress(head, TAR_HEADER_SIZE)
+        return lzma.LZMADecompressor().decompress(head, TAR_HEADER_SIZE)
+    except (zlib.error, lzma.LZMAError, OSError, EOFError, ValueError):
+        return b''
+
+
+def container_type(head):
+    if head[:4] in (b'PK\x03\x04', b'PK\x05\x06'):
+        return 'zip'
+    if head[ISO_MAGIC_OFFSET:ISO_MAGIC_OFFSET + 5] == b'CD001':
+        return 'iso'
+    if head[257:262] == b'ustar':
+        return 'tar'
+    # A compressed file that is not a tarball (a .gz log) is not a container.
+    if head.startswith(COMPRESSED_TAR_MAGIC) and decompress_head(head)[257:262] == b'ustar':
+        return 'tar'
+    return None
+
+
+def read_head(stream, size=HEAD_SIZE, compressed_size=COMPRESSED_HEAD_SIZE):
+    head = stream.read(size)
+    if head.startswith(COMPRESSED_TAR_MAGIC) and len(head) == size:
+        head += stream.read(compressed_size - size)
+    return head
+
+
+def sniff(path):
+    # 'lnk', a container type, or None for anything else (or unreadable).
+    try:
+        with open(path, 'rb') as f:
+            head = read_head(f)
+    except OSError:
+        return None
+    if head.startswith(LNK_MAGIC):
+        return 'lnk'
+    return container_type(head)
+
+
+def read_limited(stream, limit, head=b''):
+    # Reads at most limit bytes; one byte more means the member is over the limit.
+    data = head + stream.read(limit + 1 - len(head))
+    if len(data) > limit:
+        raise ContainerLimitError(f"Member exceeds size limit ({limit} bytes)")
+    return data
+
+
+class CountingReader:
+    # Charges every byte read through it, so data a reader skips over still
+    # counts against the container's total size.
+    def __init__(self, stream, charge):
+        self.stream = stream
+        self.charge = charge
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.charge(len(data))
+        return data
+
+
+class ExtentReader:
+    # File-like view of one ISO extent; reads seek into the image on demand.
+    def __init__(self, f, offset, size):
+        self.f = f
+        self.offset = offset
+        self.remaining = size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        self.f.seek(self.offset)
+        data = self.f.read(size)
+        self.offset += len(data)
+        self.remaining -= len(data)
+        return data
+
+
+def zip_members(f, charge):
+    with zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, lambda info=info: CountingReader(archive.open(info), charge)
+
+
+def decompressed(f):
+    magic = f.read(6)
+    f.seek(0)
+    if magic.startswith(b'\x1f\x8b'):
+        return gzip.GzipFile(fileobj=f, mode='rb')
+    if magic.startswith(b'BZh'):
+        return bz2.BZ2File(f)
+    if magic.startswith(b'\xfd7zXZ\x00'):
+        return lzma.LZMAFile(f)
+    return f
+
+
+def tar_members(f, charge):
+    # Stream mode: members are decompressed in order, never seeking back. The
+    # whole decompressed stream is charged, members skipped or over the size
+    # limit included, since tarfile decompresses those to get past them.
+    stream = CountingReader(decompressed(f), charge)
+    with tarfile.open(fileobj=stream, mode='r|') as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, member.size, lambda member=member: archive.extractfile(member)
+
+
+def iso_volume(f):
+    # Root directory of the Joliet volume if present (Unicode names), else the primary one.
+    primary = None
+    sector = ISO_DESCRIPTOR_START
+    while sector < ISO_DESCRIPTOR_START + 64:
+        f.seek(sector * ISO_SECTOR)
+        descriptor = f.read(ISO_SECTOR)
+        if len(descriptor) < ISO_SECTOR or descriptor[1:6] != b'CD001' or descriptor[0] == 255:
+            break
+        block_size = struct.unpack_from('<H', descriptor, 128)[0] or ISO_SECTOR
+        root = ISO_DIRECTORY_RECORD.unpack_from(descriptor, 156)
+        if descriptor[0] == 2 and descriptor[88:91] in JOLIET_ESCAPES:
+            return root[2] * block_size, root[3], block_size, 'utf-16-be'
+        if descriptor[0] == 1 and primary is None:
+            primary = (root[2] * block_size, root[3], block_size, 'ascii')
+        sector += 1
+    if primary is None:
+        raise ValueError("No ISO9660 volume descriptor")
+    return primary
+
+
+def iso_name(raw, encoding):
+    name = raw.decode(encoding, errors='replace')
+    name = name.split(';', 1)[0]
+    return name[:-1] if name.endswith('.') else name
+
+
+def iso_members(f, charge):
+    root_offset, root_size, block_size, encoding = iso_volume(f)
+    pending = [('', root_offset, root_size)]
+    visited = {root_offset}
+    entries = 0
+    while pending:
+        prefix, offset, size = pending.pop()
+        f.seek(offset)
+        directory = f.read(min(size, ISO_MAX_DIRECTORY_SIZE))
+        position = 0
+        while position < len(directory):
+            length = directory[position]
+            if length == 0:
+                # Records never span sectors; the rest of this one is padding.
+                position = (position // block_size + 1) * block_size
+                continue
+            if position + ISO_DIRECTORY_RECORD.size > len(directory):
+                break
+            record = ISO_DIRECTORY_RECORD.unpack_from(directory, position)
+            extent, data_size, flags, name_size = record[2], record[3], record[5], record[9]
+            raw_name = directory[position + 33:position + 33 + name_size]
+            position += length
+            if raw_name in (b'\x00', b'\x01'):
+                continue
+            entries += 1
+            if entries > ISO_MAX_ENTRIES:
+                raise ContainerLimitError(f"ISO image exceeds {ISO_MAX_ENTRIES} directory entries")
+            name = prefix + iso_name(raw_name, encoding)
+            if flags & 0x02:
+                if extent * block_size not in visited:
+                    visited.add(extent * block_size)
+                    pending.append((name + '/', extent * block_size, data_size))
+            else:
+                yield name, data_size, lambda extent=extent, data_size=data_size: CountingReader(
+                    ExtentReader(f, extent * block_size, data_size), charge)
+
+
+MEMBER_READERS = {
+    'zip': zip_members,
+    'tar': tar_members,
+    'iso': iso_members,
+}
+
+
+class ContainerScanner:
+    # Walks a container and every nested container inside it, handing each
+    # shortcut member to the analyzer as an in-memory buffer.
+    def __init__(self, max_depth=DEFAULT_MAX_DEPTH, max_member_size=DEFAULT_MAX_MEMBER_SIZE,
+                 max_total_size=DEFAULT_MAX_TOTAL_SIZE, include_structure=False):
+        self.max_depth = max_depth
+        self.max_member_size = max_member_size
+        self.max_total_size = max_total_size
+        self.include_structure = include_structure
+        self.total_size = 0
+
+    def scan(self, path):
+        self.total_size = 0
+        try:
+            with open(path, 'rb') as f:
+                return list(self.scan_container(f, [path], 0))
+        except OSError as e:
+            return [self.error_record([path], f"Failed to open container: {e}")]
+
+    def charge(self, size):
+        self.total_size += size
+        if self.total_size > self.max_total_size:
+            raise ContainerLimitError(f"Container exceeds total size limit ({self.max_total_size} bytes)")
+
+    def scan_container(self, f, chain, depth):
+        head = read_head(f)
+        f.seek(0)
+        kind = container_type(head)
+        if kind is None:
+            yield self.error_record(chain, "Not a ZIP, tar or ISO9660 container")
+            return
+        try:
+            for name, size, open_member in MEMBER_READERS[kind](f, self.charge):
+                if self.total_size > self.max_total_size:
+                    # Already reported by the nested container that ran out.
+                    return
+                member_chain = chain + [name]
+                try:
+                    verdicts = self.scan_member(name, size, open_member, member_chain, depth)
+                except ContainerLimitError as e:
+                    verdicts = [self.error_record(member_chain, str(e))]
+                except (zipfile.BadZipFile, tarfile.TarError, zlib.error, lzma.LZMAError, NotImplementedError,
+                        RuntimeError, OSError, EOFError, ValueError) as e:
+                    # One unreadable member (encrypted, corrupt) does not stop the rest.
+                    verdicts = [self.error_record(member_chain, f"Failed to read member: {e}")]
+                yield from verdicts
+        except ContainerLimitError as e:
+            yield self.error_record(chain, str(e))
+        except (zipfile.BadZipFile, tarfile.TarError, zlib.error, lzma.LZMAError, OSError, EOFError, ValueError,
+                struct.error) as e:
+            yield self.error_record(chain, f"Failed to read container: {e}")
+
+    def scan_member(self, name, size, open_member, chain, depth):
+        named_lnk = name.lower().endswith('.lnk')
+        if size > self.max_member_size:
+            if named_lnk:
+                raise ContainerLimitError(f"Member exceeds size limit ({self.max_member_size} bytes)")
+            return []
+
+        stream = open_member()
+        head = read_head(stream, min(HEAD_SIZE, self.max_member_size + 1),
+                         min(COMPRESSED_HEAD_SIZE, self.max_member_size + 1))
+        nested = container_type(head)
+        if not (named_lnk or head.startswith(LNK_MAGIC) or nested):
+            return []
+        if nested and not named_lnk and depth >= self.max_depth:
+            return [self.error_record(chain, f"Nested container beyond depth limit ({self.max_depth})")]
+
+        # The declared size can lie; the read itself is bounded and charged
+        # to the total as it goes.
+        data = read_limited(stream, self.max_member_size, head)
+
+        if named_lnk or data.startswith(LNK_MAGIC):
+            return [self.analyze(data, chain)]
+        return list(self.scan_container(io.BytesIO(data), chain, depth + 1))
+
+    def analyze(self, data, chain):
+        digest = (data, compute_digests(data, ANALYSIS_ALGORITHMS))
+        verdict = scan_file(CHAIN_SEPARATOR.join(chain), self.include_structure, digest)
+        verdict['container_chain'] = chain
+        return verdict
+
+    def error_record(self, chain, message):
+        return {
+            'path': CHAIN_SEPARATOR.join(chain),
+            'container_chain': chain,
+            'file_hashes': None,
+            'risk_score': None,
+            'suspicious': [],
+            'malicious': [],
+            'shell_link': {},
+            'vt_results': None,
+            'error': message
+        }
+
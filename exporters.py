@@ -0,0 +1,200 @@
+import os
+import sys
+import csv
+import json
+import argparse
+from datetime import date, datetime
+from hex_view import HexView
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Value encodings shared by every exporter and both JSON backends:
+#   datetime/date              -> ISO 8601 string (FILETIMEs are converted as naive local time)
+#   bytes/memoryview/HexView   -> lowercase hex string of the full range (HexView.fmt applied)
+#   tuple                      -> list, e.g. LinkFlags entries become [enabled, description]
+#   anything else unknown      -> str()
+
+CSV_FIELDS = (
+    'path', 'risk_score', 'md5', 'sha1', 'sha256', 'lnkhash',
+    'target_path', 'arguments', 'working_directory', 'icon_location',
+    'suspicious', 'malicious', 'vt_positives', 'vt_total', 'error',
+)
+# Joins the indicator lists into one CSV cell.
+CSV_LIST_SEPARATOR = ' | '
+
+
+def encode_value(value):
+    if isinstance(value, HexView):
+        # Full range, in the same "Size: ..." form the report shows when fmt is set.
+        text = value.hex(len(value))
+        return value.fmt.format(text) if value.fmt else text
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return memoryview(value).hex()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def to_plain(value):
+    # Same encodings as dumps(), applied eagerly so a record can be pickled to
+    # another process (HexViews hold a view of the analyzed buffer).
+    if isinstance(value, dict):
+        return {str(key): to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return encode_value(value)
+
+
+def default_backend():
+    return 'orjson' if orjson is not None else 'json'
+
+
+def dumps(obj, backend=None):
+    backend = backend or default_backend()
+    if backend == 'orjson':
+        # Datetimes go through encode_value as well so both backends agree.
+        return orjson.dumps(obj, default=encode_value,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, default=encode_value, ensure_ascii=False, separators=(',', ':'))
+
+
+def export_record(analyzer, include_structure=True):
+    # structure_info is a dict view built from analyzer.result on access, so
+    # summary records read the shell link info off the result directly.
+    result = getattr(analyzer, 'result', None)
+    record = {
+        'path': analyzer.lnk_path,
+        'risk_score': analyzer.risk_score,
+        'file_hashes': getattr(analyzer, 'file_hashes', None),
+        'suspicious': analyzer.suspicious,
+        'malicious': analyzer.malicious,
+        'shell_link': (result.shell_link_info if result is not None else None) or {},
+        'vt_results': analyzer.vt_results,
+    }
+    if include_structure:
+        record['structure_info'] = analyzer.structure_info or {}
+    return record
+
+
+def flatten_record(record):
+    hashes = record.get('file_hashes') or {}
+    shell_link = record.get('shell_link') or {}
+    vt_results = record.get('vt_results') or {}
+    return {
+        'path': record.get('path'),
+        'risk_score': record.get('risk_score'),
+        'md5': hashes.get('md5', ''),
+        'sha1': hashes.get('sha1', ''),
+        'sha256': hashes.get('sha256', ''),
+        'lnkhash': hashes.get('lnkhash', ''),
+        'target_path': shell_link.get('TargetPath', ''),
+        'arguments': shell_link.get('Arguments', ''),
+        'working_directory': shell_link.get('WorkingDirectory', ''),
+        'icon_location': shell_link.get('IconLocation', ''),
+        'suspicious': CSV_LIST_SEPARATOR.join(record.get('suspicious') or ()),
+        'malicious': CSV_LIST_SEPARATOR.join(record.get('malicious') or ()),
+        'vt_positives': vt_results.get('positives', ''),
+        'vt_total': vt_results.get('total', ''),
+        'error': record.get('error', ''),
+    }
+
+
+class JSONExporter:
+    # One JSON document holding a list of records.
+    def __init__(self, stream, backend=None):
+        self.stream = stream
+        self.backend = backend
+        self.count = 0
+        self.stream.write('[')
+
+    def write(self, record):
+        if self.count:
+            self.stream.write(',')
+        self.stream.write(dumps(record, self.backend))
+        self.count += 1
+
+    def close(self):
+        self.stream.write(']\n')
+        self.stream.flush()
+
+
+class JSONLExporter:
+    # One compact JSON record per line, flushed per record so readers can tail it.
+    def __init__(self, stream, backend=None):
+        self.stream = stream
+        self.backend = backend
+
+    def write(self, record):
+        self.stream.write(dumps(record, self.backend) + '\n')
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class CSVExporter:
+    # Summary columns only (CSV_FIELDS); structure_info is not flattened.
+    def __init__(self, stream, backend=None, header=True):
+        self.stream = stream
+        self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        if header:
+            self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(flatten_record(record))
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+EXPORTERS = {
+    'json': JSONExporter,
+    'jsonl': JSONLExporter,
+    'csv': CSVExporter,
+}
+
+
+def create_exporter(fmt, stream, **kwargs):
+    return EXPORTERS[fmt](stream, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze LNK files and export the results')
+    parser.add_argument('paths', nargs='+', help='LNK files to analyze')
+    parser.add_argument('-f', '--format', choices=sorted(EXPORTERS), default='json', help='Output format')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('--summary', action='store_true', help='Leave out structure_info')
+    parser.add_argument('--backend', choices=('json', 'orjson'), default=None, help='JSON encoder (default: orjson if installed)')
+    args = parser.parse_args(argv)
+
+    from analyze_lnk import LNKAnalyzer
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    # Keep analyzer diagnostics out of the exported stream.
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        exporter = create_exporter(args.format, out, backend=args.backend)
+        for path in args.paths:
+            analyzer = LNKAnalyzer(os.path.abspath(path), native=True)
+            risk_score = analyzer.analyze(report=False)
+            record = export_record(analyzer, include_structure=not args.summary)
+            if risk_score is None:
+                record['risk_score'] = None
+                record['error'] = 'Analysis failed'
+            exporter.write(record)
+        exporter.close()
+    finally:
+        sys.stdout = stdout
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import os
+import mmap
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from analysis_metrics import metrics
+
+DEFAULT_ALGORITHMS = ('md5', 'sha1', 'sha256')
+# Analysis records also carry the structural hash; the whitelist only needs SHA-256.
+ANALYSIS_ALGORITHMS = DEFAULT_ALGORITHMS + ('lnkhash',)
+WHITELIST_ALGORITHMS = ('sha256',)
+# Files up to this size are read into memory; larger ones (e.g. shortcuts with
+# a payload appended) are memory-mapped so only the pages parsed are resident.
+INLINE_LIMIT = 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+# Below this the thread hand-off costs more than hashing on the calling thread.
+PARALLEL_THRESHOLD = 64 * 1024
+HASH_WORKERS = 4
+
+_hash_executor = None
+_hash_executor_lock = threading.Lock()
+
+LNK_FLAGS = struct.Struct('<I')
+LNK_UINT16 = struct.Struct('<H')
+LNK_BLOCK_HEADER = struct.Struct('<II')
+LNK_HEADER_SIZE = 76
+# HasName, HasRelativePath, HasWorkingDir, HasArguments, HasIconLocation
+LNK_STRING_FLAGS = (0x04, 0x08, 0x10, 0x20, 0x40)
+
+
+class DigestCache:
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path, stat_result):
+        return (os.path.abspath(path), stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        # Mapped files are cached as (None, hashes) so no file handle is kept open.
+        size = len(entry[0]) if entry[0] is not None else 0
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                previous = self.entries.pop(key)[0]
+                self.total_bytes -= len(previous) if previous is not None else 0
+            self.entries[key] = entry
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted[0]) if evicted[0] is not None else 0
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+_default_cache = DigestCache()
+
+
+def hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            _hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='digest')
+        return _hash_executor
+
+
+def structure_hash(data):
+    # imphash-style: MD5 over the layout of the shortcut rather than its bytes,
+    # i.e. the LinkFlags, the IDList item types, the LinkInfo flags and the
+    # ExtraData block signatures. Shortcuts made by the same builder share it
+    # even when their paths and arguments differ.
+    if len(data) < LNK_HEADER_SIZE or LNK_FLAGS.unpack_from(data, 0)[0] != LNK_HEADER_SIZE:
+        return ''
+    link_flags = LNK_FLAGS.unpack_from(data, 20)[0]
+    tokens = ['flags=%08x' % link_flags]
+    offset = LNK_HEADER_SIZE
+    try:
+        if link_flags & 0x01:
+            end = offset + 2 + LNK_UINT16.unpack_from(data, offset)[0]
+            item = offset + 2
+            types = []
+            while item + 2 < end:
+                item_size = LNK_UINT16.unpack_from(data, item)[0]
+                if item_size < 3:
+                    break
+                types.append('%02x' % data[item + 2])
+                item += item_size
+            tokens.append('ids=' + '.'.join(types))
+            offset = end
+        if link_flags & 0x02:
+            size = LNK_FLAGS.unpack_from(data, offset)[0]
+            tokens.append('linkinfo=%x' % LNK_FLAGS.unpack_from(data, offset + 8)[0])
+            offset += size
+        char_size = 2 if link_flags & 0x80 else 1
+        for flag in LNK_STRING_FLAGS:
+            if link_flags & flag:
+                offset += 2 + LNK_UINT16.unpack_from(data, offset)[0] * char_size
+        signatures = []
+        while True:
+            size = LNK_FLAGS.unpack_from(data, offset)[0]
+            if size < 8:
+                break
+            signatures.append('%08x' % LNK_BLOCK_HEADER.unpack_from(data, offset)[1])
+            offset += size
+        tokens.append('blocks=' + '.'.join(signatures))
+    except (struct.error, IndexError):
+        # Truncated structure: hash whatever layout was readable.
+        tokens.append('truncated')
+    return hashlib.md5(','.join(tokens).encode('ascii')).hexdigest()
+
+
+# Digests computed from the parsed structure instead of a byte stream.
+STRUCTURAL_ALGORITHMS = {
+    'lnkhash': structure_hash,
+}
+
+
+class DigestEngine:
+    # Computes several digests in one pass. Every chunk is handed to all the
+    # configured hashlib algorithms at once on worker threads; hashlib drops the
+    # GIL for large updates, so the wall-clock cost approaches the slowest
+    # single digest rather than the sum of them.
+    def __init__(self, algorithms=DEFAULT_ALGORITHMS, chunk_size=CHUNK_SIZE,
+                 parallel_threshold=PARALLEL_THRESHOLD):
+        self.algorithms = tuple(algorithms)
+        self.byte_algorithms = [name for name in self.algorithms if name not in STRUCTURAL_ALGORITHMS]
+        self.structural_algorithms = [name for name in self.algorithms if name in STRUCTURAL_ALGORITHMS]
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+
+    def new_hashers(self):
+        return [hashlib.new(name) for name in self.byte_algorithms]
+
+    def results(self, hashers, data=None):
+        hashes = {name: hasher.hexdigest() for name, hasher in zip(self.byte_algorithms, hashers)}
+        if data is not None:
+            for name in self.structural_algorithms:
+                hashes[name] = STRUCTURAL_ALGORITHMS[name](data)
+        return {name: hashes[name] for name in self.algorithms if name in hashes}
+
+    def digest_buffer(self, data):
+        hashers = self.new_hashers()
+        if len(hashers) > 1 and len(data) >= self.parallel_threshold:
+            executor = hash_executor()
+            for future in [executor.submit(hasher.update, data) for hasher in hashers]:
+                future.result()
+        else:
+            for hasher in hashers:
+                hasher.update(data)
+        return self.results(hashers, data)
+
+    def digest_stream(self, f, data=None):
+        # Constant memory: two chunk buffers regardless of file size. The next
+        # chunk is read while the workers are still hashing the previous one.
+        # Structural digests need random access and are taken from data (e.g.
+        # the file's mapping), touching only the pages the structure lives in.
+        hashers = self.new_hashers()
+        executor = hash_executor()
+        buffers = (bytearray(self.chunk_size), bytearray(self.chunk_size))
+        pending = []
+        index = 0
+        while True:
+            buffer = buffers[index]
+            count = f.readinto(buffer)
+            for future in pending:
+                future.result()
+            if not count:
+                break
+            view = memoryview(buffer)[:count]
+            pending = [executor.submit(hasher.update, view) for hasher in hashers]
+            index ^= 1
+        return self.results(hashers, data)
+
+
+def compute_digests(data, algorithms=DEFAULT_ALGORITHMS):
+    return DigestEngine(algorithms).digest_buffer(data)
+
+
+def hash_stream(f, algorithms=DEFAULT_ALGORITHMS, data=None):
+    return DigestEngine(algorithms).digest_stream(f, data)
+
+
+def map_file(f, size):
+    if size <= INLINE_LIMIT:
+        return f.read()
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return f.read()
+
+
+def lookup(cache, path, algorithms):
+    # Returns (stat_result, key, entry, missing): the cached (data, hashes)
+    # pair, if any, and the requested algorithms it does not have yet.
+    stat_result = os.stat(path)
+    key = DigestCache.make_key(path, stat_result)
+    entry = cache.get(key)
+    metrics.cache_lookup('digest', entry is not None)
+    hashes = entry[1] if entry is not None else {}
+    return stat_result, key, entry, [name for name in algorithms if name not in hashes]
+
+
+def merge_hashes(entry, computed):
+    hashes = dict(entry[1]) if entry is not None else {}
+    hashes.update(computed)
+    return hashes
+
+
+def select(hashes, algorithms):
+    return {name: hashes[name] for name in algorithms}
+
+
+def file_hashes(path, cache=None, algorithms=WHITELIST_ALGORITHMS):
+    # Hashes only (whitelist checks): streamed, nothing kept in memory beyond
+    # small files. Large files are mapped only for structural digests.
+    cache = _default_cache if cache is None else cache
+    stat_result, key, entry, missing = lookup(cache, path, algorithms)
+    if not missing:
+        return select(entry[1], algorithms)
+
+    engine = DigestEngine(missing)
+    with open(path, 'rb') as f:
+        if stat_result.st_size <= INLINE_LIMIT:
+            data = entry[0] if entry is not None and entry[0] is not None else f.read()
+            computed = engine.digest_buffer(data)
+        else:
+            data = None
+            mapped = map_file(f, stat_result.st_size) if engine.structural_algorithms else None
+            try:
+                computed = engine.digest_stream(f, mapped)
+            finally:
+                if isinstance(mapped, mmap.mmap):
+                    mapped.close()
+    hashes = merge_hashes(entry, computed)
+    cache.put(key, (data, hashes))
+    return select(hashes, algorithms)
+
+
+def digest_file(path, cache=None, algorithms=ANALYSIS_ALGORITHMS):
+    # Returns (data, hashes); the same pair is shared by the whitelist check and
+    # LNKAnalyzer. data is bytes for small files and a read-only mmap for large
+    # ones. Unchanged files are served from cache (large ones are re-mapped);
+    # digests the cache lacks, e.g. after a SHA-256-only whitelist check, are
+    # computed on their own.
+    cache = _default_cache if cache is None else cache
+    stat_result, key, entry, missing = lookup(cache, path, algorithms)
+    if not missing and entry[0] is not None:
+        return (entry[0], select(entry[1], algorithms))
+
+    with open(path, 'rb') as f:
+        if entry is not None and entry[0] is not None:
+            data = entry[0]
+        else:
+            data = map_file(f, stat_result.st_size)
+        if not missing:
+            return (data, select(entry[1], algorithms))
+        engine = DigestEngine(missing)
+        if isinstance(data, bytes):
+            computed = engine.digest_buffer(data)
+        else:
+            # Hash by streaming reads rather than through the mapping, which
+            # would fault every page of an appended payload into memory.
+            computed = engine.digest_stream(f, data)
+
+    hashes = merge_hashes(entry, computed)
+    cache.put(key, (data if isinstance(data, bytes) else None, hashes))
+    return (data, select(hashes, algorithms))
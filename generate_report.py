@@ -1,341 +1,164 @@
 from datetime import datetime
 import os
-from jinja2 import Template
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+from hex_view import HexView
+from raw_sidecar import RawSidecar
 
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
 
-def generate_report(lnk_class):
-    html_template = """
-<!DOCTYPE html>
-<html>
-<head>
-    <title>LNK File Analysis Report</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        .container { max-width: 1200px; margin: auto; }
-        .header { background: #2c3e50; color: white; padding: 20px; margin-bottom: 20px; }
-        .section { background: white; padding: 20px; margin-bottom: 20px; border: 1px solid #ddd; }
-        .danger { color: #e74c3c; }
-        .warning { color: #f39c12; }
-        .success { color: #27ae60; }
-        .info { color: #2980b9; }
-        table { width: 100%; border-collapse: collapse; margin: 10px 0; }
-        th, td { padding: 8px; text-align: left; border: 1px solid #ddd; }
-        th { background: #f5f5f5; }
-        .risk-gauge { text-align: center; margin: 20px 0; }
-        .extra-block { margin: 10px 0; padding: 10px; background: #f9f9f9; }
-        .risk-level {
-            text-align: center;
-            font-size: 1.2em;
-            font-weight: bold;
-            margin: 20px 0;
-            padding: 10px;
-            border-radius: 4px;
-        }
-        .low-risk {
-            color: #27ae60;
-            background-color: #eafaf1;
-        }
-        .suspicious {
-            color: #f39c12;
-            background-color: #fef9e7;
-        }
-        .malicious {
-            color: #c0392b;
-            background-color: #fdedec;
-        .item-block {
-            margin: 10px 0;
-            padding: 10px;
-            background: #f8f9fa;
-            border-left: 3px solid #3498db;
-        }
-        }
-        .raw-data {
-            margin: 15px 0;
-        }
-        .hex-view {
-            margin: 10px 0;
-        }
-        .hex-data {
-            font-family: monospace;
-            font-size: 14px;
-            background: #f8f9fa;
-            padding: 10px;
-            border: 1px solid #ddd;
-            white-space: pre-wrap;
-            word-break: break-all;
-            max-width: 1000px;
-            max-height: 200px;
-            overflow-x: auto;
-            overflow-y: scroll;
-        }
-        .parsed-data {
-            background: #f8f9fa;
-            padding: 10px;
-            border: 1px solid #ddd;
-            white-space: pre-wrap;
-            word-break: break-all;
-            max-width: 1000px;
-            max-height: 200px;
-            overflow-x: auto;
-            overflow-y: scroll;
-        }
+# Raw bytes inlined as hex per report section; the rest goes to the sidecar file.
+DEFAULT_RAW_LIMITS = {
+    'LinkTargetIDList': 4096,
+    'LinkInfo': 4096,
+    'StringData': 4096,
+    'ExtraData': 4096,
+    'Indicators': 4096,
+}
+# Strings from the file share their section's budget (one character per byte)
+# but always show at least this many characters.
+MIN_TEXT_CHARS = 64
+# ItemIDs / extra blocks listed individually before the rest are summarized.
+MAX_LIST_ITEMS = 256
 
+# Built once per process. Templates are compiled on first use and the compiled
+# bytecode is kept on disk (per-user temp directory), so later processes skip
+# compilation too; auto_reload is off since templates only change on upgrade.
+# Reports render strings taken from the analyzed file, so HTML is autoescaped.
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    # Options such as autoescape are compiled into the bytecode: the cache file
+    # pattern is versioned so a change never reuses templates compiled without them.
+    bytecode_cache=FileSystemBytecodeCache(pattern='__lnk_report_v2_%s.cache'),
+    autoescape=select_autoescape(),
+    auto_reload=False
+)
 
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>LNK File Analysis Report</h1>
-            <p>Analysis Date: {{ datetime.now().strftime('%Y-%m-%d %H:%M:%S') }}, Made by TeamJowonReady</p>
-        </div>
 
-        <div class="section">
-            <h2>File Information</h2>
-            <table>
-                <tr><th>File Path</th><td>{{ lnk_path }}</td></tr>
-                <tr><th>File Size</th><td>{{ structure_info['ShellLinkInfo']['FileSize'] }} bytes</td></tr>
-                <tr><th>MD5</th><td>{{ file_hashes['md5'] }}</td></tr>
-                <tr><th>SHA1</th><td>{{ file_hashes['sha1'] }}</td></tr>
-                <tr><th>SHA256</th><td>{{ file_hashes['sha256'] }}</td></tr>
-            </table>
-        </div>
+# Keys whose values are raw byte ranges (HexViews, or hex text once a record
+# has been through JSON). Only these are read back as bytes; any other string,
+# however hex-like, is text taken from the file.
+RAW_FIELDS = frozenset(('Data', 'LinkCLSID', 'raw_hex', 'data_hex', 'signature_hex', 'Head',
+                        'color_table', 'known_folder_id'))
+
+
+def as_view(value):
+    # Records loaded back from JSON carry raw ranges as lowercase hex text;
+    # turn those into views so they are capped and paged like live ones.
+    # Callers only pass fields known to be raw (RAW_FIELDS, raw() in templates).
+    if isinstance(value, str) and value and len(value) % 2 == 0:
+        try:
+            data = bytes.fromhex(value)
+        except ValueError:
+            return value
+        if data.hex() == value:
+            return HexView(data, 0, len(data))
+    return value
+
+
+class RawDataPager:
+    # Spends each section's byte budget on its HexViews in render order. A view
+    # that does not fit is shown up to the budget and written whole to the sidecar.
+    def __init__(self, sidecar, limits):
+        self.sidecar = sidecar
+        self.remaining = dict(limits)
+        self.text_remaining = dict(limits)
+
+    def __call__(self, view, section):
+        view = as_view(view)
+        if not isinstance(view, HexView):
+            return {'text': view, 'truncated': False}
+
+        total = len(view)
+        shown = min(total, self.remaining.get(section, total))
+        if section in self.remaining:
+            self.remaining[section] -= shown
+        if shown == total:
+            return {'text': view.hex(total), 'truncated': False}
+        return {
+            'text': view.hex(shown),
+            'truncated': True,
+            'shown': shown,
+            'total': total,
+            'offset': self.sidecar.add(view)
+        }
+
+    def text(self, value, section):
+        # NAME/arguments strings, LinkInfo cstrings and block fields can be
+        # megabytes long; the rest is replaced by a marker with the full length.
+        if not isinstance(value, str) or section not in self.text_remaining:
+            return value
+        shown = min(len(value), max(self.text_remaining[section], MIN_TEXT_CHARS))
+        self.text_remaining[section] = max(0, self.text_remaining[section] - shown)
+        if shown == len(value):
+            return value
+        return f"{value[:shown]}... [truncated, {len(value)} chars]"
 
-        <div class="section">
-            <h2>Risk Assessment</h2>
-            <div class="risk-gauge">
-                <img src="data:image/png;base64,{{ risk_gauge }}" alt="Risk Gauge">
-            </div>
-            <div class="risk-level {% if risk_score <= 3 %}low-risk{% elif risk_score <= 7 %}suspicious{% else %}malicious{% endif %}">
-                Risk Level: 
-                {% if risk_score <= 3 %}
-                    <span class="low-risk">Low Risk ({{ risk_score }}/10)</span>
-                {% elif risk_score <= 7 %}
-                    <span class="suspicious">Suspicious ({{ risk_score }}/10)</span>
-                {% else %}
-                    <span class="malicious">Malicious ({{ risk_score }}/10)</span>
-                {% endif %}
-            </div>
+    def bounded(self, parsed, section, max_items=MAX_LIST_ITEMS, key=None):
+        # Walks nested parsed data (IDList items, property storages): lists are
+        # capped at max_items and every view draws on the same section budget.
+        if isinstance(parsed, dict):
+            return {name: self.bounded(value, section, max_items, name) for name, value in parsed.items()}
+        if isinstance(parsed, list):
+            items = [self.bounded(item, section, max_items, key) for item in parsed[:max_items]]
+            if len(parsed) > max_items:
+                items.append(f"... {len(parsed) - max_items} more items omitted")
+            return items
+        view = as_view(parsed) if key in RAW_FIELDS else parsed
+        if not isinstance(view, HexView):
+            return self.text(parsed, section)
+        raw = self(view, section)
+        value = raw['text']
+        if raw['truncated']:
+            value += f" ... [{raw['total']} bytes, sidecar offset {raw['offset']}]"
+        return value
 
-            {% if malicious %}
-            <div class="malicious">
-                <h3>Malicious Indicators</h3>
-                <ul>
-                {% for item in malicious %}
-                    <li class="danger">{{ item }}</li>
-                {% endfor %}
-                </ul>
-            </div>
-            {% endif %}
-            {% if suspicious %}
-            <div class="suspicious">
-                <h3>Suspicious Patterns</h3>
-                <ul>
-                {% for item in suspicious %}
-                    <li class="warning">{{ item }}</li>
-                {% endfor %}
-                </ul>
-            </div>
-            {% endif %}
-        </div>
 
-        <div class="section">
-            <h2>Shell Link Header</h2>
-            <div class="description">{{ structure_info['Header']['Description'] }}</div>
-            <div class="size">Size: {{ structure_info['Header']['Size'] }} bytes</div>
-            <table>
-            {% for key, value in structure_info['Header']['Data'].items() %}
-                <tr><th>{{ key }}</th><td>{{ value }}</td></tr>
-            {% endfor %}
-            </table>
-        </div>
+def report_context(lnk_class):
+    return {
+        'lnk_path': lnk_class.lnk_path,
+        'structure_info': lnk_class.structure_info,
+        'file_hashes': lnk_class.file_hashes,
+        'malicious': lnk_class.malicious,
+        'suspicious': lnk_class.suspicious,
+        'risk_gauge': lnk_class.generate_risk_gauge(),
+        'risk_score': lnk_class.risk_score,
+        'vt_results': lnk_class.vt_results
+    }
 
-        <div class="section">
-            <h2>Link Flags</h2>
-            <table>
-                <tr><th>Flag Name</th><th>Status</th><th>Description</th></tr>
-                {% for name, (value, desc) in structure_info['Header']['Flags'].items() %}
-                <tr>
-                    <td>{{ name }}</td>
-                    <td>{{ "Enabled" if value else "Disabled" }}</td>
-                    <td>{{ desc }}</td>
-                </tr>
-                {% endfor %}
-            </table>
-        </div>
 
-        <div class="section">
-            <h2>Link Target ID List</h2>
-            <div class="description">{{ structure_info['LinkTargetIDList']['Description'] }}</div>
-            <div class="size">Size: {{ structure_info['LinkTargetIDList']['Size'] }} bytes</div>
-            {% if structure_info['LinkTargetIDList']['ParsedData'] %}
-            <div class="extra-block">
-                <h3>Parsed ItemID List</h3>
-                {% for item in structure_info['LinkTargetIDList']['ParsedData']['ItemIDList'] %}
-                <div class="item-block">
-                    <table>
-                        <tr><th>Size</th><td>{{ item['Size'] }}</td></tr>
-                        <tr><th>Type</th><td>{{ item['Parsed'] }}</td></tr>
-                        <tr>
-                            <th>Raw Data</th>
-                            <td><pre class="hex-data">{{ item['Data'] }}</pre></td>
-                        </tr>
-                    </table>
-                </div>
-                {% endfor %}
-            </div>
-            {% endif %}
-            <div class="raw-data">
-                <h3>Raw Data</h3>
-                <pre class="hex-data">{{ structure_info['LinkTargetIDList']['Data'] }}</pre>
-            </div>
-        </div>
+def write_report(report_path, context, raw_limits=None, max_items=MAX_LIST_ITEMS, stylesheet=None):
+    # stylesheet: URL of a shared report.css to link instead of inlining the CSS
+    template = env.get_template("report.html")
+    sidecar = RawSidecar(f"{os.path.splitext(report_path)[0]}.bin")
+    pager = RawDataPager(sidecar, DEFAULT_RAW_LIMITS if raw_limits is None else raw_limits)
 
-        <div class="section">
-            <h2>Link Info</h2>
-            <div class="description">{{ structure_info['LinkInfo']['Description'] }}</div>
-            <div class="size">Size: {{ structure_info['LinkInfo']['Size'] }} bytes</div>
-            {% if structure_info['LinkInfo']['ParsedData'] %}
-            <div class="extra-block">
-                <h3>Parsed Link Info</h3>
-                <table>
-                    {% for key, value in structure_info['LinkInfo']['ParsedData'].items() %}
-                    <tr>
-                        <th>{{ key }}</th>
-                        <td>{{ value }}</td>
-                    </tr>
-                    {% endfor %}
-                </table>
-            </div>
-            {% endif %}
-            <div class="raw-data">
-                <h3>Raw Data</h3>
-                <pre class="hex-data">{{ structure_info['LinkInfo']['Data'] }}</pre>
-            </div>
-        </div>
+    def capped(items):
+        return items[:max_items] if isinstance(items, list) else items
 
-        <div class="section">
-            <h2>String Data</h2>
-            <div class="description">{{ structure_info['StringData']['Description'] }}</div>
-            <div class="size">Size: {{ structure_info['StringData']['Size'] }} bytes</div>
-            {% if structure_info['StringData']['Data'] %}
-            {% for string_type, data in structure_info['StringData']['Data'].items() %}
-            <div class="extra-block">
-                <h3>{{ string_type }}</h3>
-                <table>
-                    <tr>
-                        <th>Offset</th>
-                        <td>{{ data.offset }}</td>
-                    </tr>
-                    <tr>
-                        <th>Size Information</th>
-                        <td>{{ data.size_hex }}</td>
-                    </tr>
-                    <tr>
-                        <th>String Value</th>
-                        <td>
-                            <div class="hex-view">
-                                <div class="parsed-data">{{data.value}}</div>
-                            </div>
-                        </td>
-                    </tr>
-                    <tr>
-                        <th>Raw Hex</th>
-                        <td>
-                            <div class="hex-view">
-                                <div class="hex-data">{{ data.raw_hex }}</div>
-                            </div>
-                        </td>
-                    </tr>
-                </table>
-            </div>
-            {% endfor %}
-            {% else %}
-            <p>No String Data found</p>
-            {% endif %}
-        </div>
+    def omitted(items):
+        return max(0, len(items) - max_items) if isinstance(items, list) else 0
 
-        <div class="section">
-            <h2>Extra Data Blocks</h2>
-            <div class="description">{{ structure_info['ExtraData']['Description'] }}</div>
-            <div class="size">Size: {{ structure_info['ExtraData']['Size'] }} bytes</div>
-            {% if structure_info['ExtraData']['Data'] %}
-            {% for block in structure_info['ExtraData']['Data'] %}
-            <div class="extra-block">
-                <h3>{{ block['name'] }}</h3>
-                <table>
-                    <tr>
-                        <th>Offset</th>
-                        <td>{{ block['offset'] }}</td>
-                    </tr>
-                    <tr>
-                        <th>Size Information</th>
-                        <td>{{ block['size_hex'] }}</td>
-                    </tr>
-                    <tr>
-                        <th>Signature</th>
-                        <td>{{ block['signature'] }} ({{ block['signature_hex'] }})</td>
-                    </tr>
-                    {% if block['expected_size'] %}
-                    <tr>
-                        <th>Expected Size</th>
-                        <td>{{ block['expected_size'] }}</td>
-                    </tr>
-                    {% endif %}
-                    {% if block['parsed_data'] %}
-                    <tr>
-                        <th>Parsed Data</th>
-                        <td>
-                            <pre class="parsed-data">{{ block['parsed_data'] | pprint }}</pre>
-                        </td>
-                    </tr>
-                    {% endif %}
-                    <tr>
-                        <th>Raw Hex</th>
-                        <td>
-                            <div class="hex-view">
-                                <div class="hex-data">{{ block['data_hex'] }}</div>
-                            </div>
-                        </td>
-                    </tr>
-                </table>
-            </div>
-            {% endfor %}
-            {% else %}
-            <p>No Extra Data Blocks found</p>
-            {% endif %}
-        </div>
+    # Stream the rendered chunks to disk instead of building the page in memory.
+    try:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.writelines(template.generate(
+                context,
+                datetime=datetime,
+                raw=pager,
+                text=pager.text,
+                bounded=lambda parsed, section: pager.bounded(parsed, section, max_items),
+                capped=capped,
+                omitted=omitted,
+                stylesheet=stylesheet,
+                sidecar_name=os.path.basename(sidecar.path)
+            ))
+    finally:
+        sidecar.close()
+    return report_path
 
-        {% if vt_results and vt_results.get('found') %}
-        <div class="section">
-            <h2>VirusTotal Results</h2>
-            <table>
-                <tr><th>Detections</th><td>{{ vt_results['positives'] }}/{{ vt_results['total'] }}</td></tr>
-                <tr><th>Scan Date</th><td>{{ vt_results['scan_date'] }}</td></tr>
-                <tr><th>Report Link</th><td><a href="{{ vt_results['permalink'] }}" target="_blank">View Full Report</a></td></tr>
-            </table>
-        </div>
-        {% endif %}
-    </div>
-</body>
-</html>
-        """
-        
-    template = Template(html_template)
-    report_html = template.render(
-        datetime=datetime,
-        lnk_path=lnk_class.lnk_path,
-        structure_info=lnk_class.structure_info,
-        file_hashes=lnk_class.file_hashes,
-        malicious=lnk_class.malicious,
-        suspicious=lnk_class.suspicious,
-        risk_gauge=lnk_class.generate_risk_gauge(),
-        risk_score=lnk_class.risk_score,
-        vt_results=lnk_class.vt_results
-    )
 
+def generate_report(lnk_class, raw_limits=None, max_items=MAX_LIST_ITEMS):
     report_path = f"{os.path.splitext(lnk_class.lnk_path)[0]}_analysis_report.html"
-    with open(report_path, 'w', encoding='utf-8') as f:
-        f.write(report_html)
-        
-    print(f"Analysis report saved to: {report_path}")
\ No newline at end of file
+    write_report(report_path, report_context(lnk_class), raw_limits, max_items)
+    print(f"Analysis report saved to: {report_path}")
+    return report_path
@@ -0,0 +1,39 @@
+class HexView:
+    # A byte range of the analyzed buffer whose hex text is only produced when
+    # something (generate_report, an exporter) actually turns it into a string.
+    __slots__ = ('buffer', 'start', 'end', 'limit', 'fmt')
+
+    def __init__(self, buffer, start, end, limit=None, fmt=None):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.limit = limit
+        self.fmt = fmt
+
+    def __len__(self):
+        return len(memoryview(self.buffer)[self.start:self.end])
+
+    def tobytes(self):
+        return bytes(self.buffer[self.start:self.end])
+
+    def hex(self, limit=None):
+        limit = self.limit if limit is None else limit
+        end = self.end if limit is None else min(self.end, self.start + limit)
+        return memoryview(self.buffer)[self.start:end].hex()
+
+    def __str__(self):
+        text = self.hex()
+        return self.fmt.format(text) if self.fmt else text
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __eq__(self, other):
+        if isinstance(other, HexView):
+            return str(self) == str(other)
+        if isinstance(other, str):
+            return str(self) == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
@@ -0,0 +1,479 @@
+import struct
+import uuid
+from hex_view import HexView
+from lnk_model import ItemIDList, filetime_to_datetime
+
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+GUID_SIZE = 16
+
+# Format ID of property storages whose values are named by strings instead of integer IDs.
+FMTID_STRING_NAMED = '{D5CDD505-2E9C-101B-9397-08002B2CF9AE}'
+PROPERTY_STORAGE_VERSION = 0x53505331  # '1SPS'
+
+# (format ID, property ID) -> canonical name, for the properties shortcuts carry.
+PROPERTY_NAMES = {
+    ('{F29F85E0-4FF9-1068-AB91-08002B27B3D9}', 2): 'System.Title',
+    ('{F29F85E0-4FF9-1068-AB91-08002B27B3D9}', 3): 'System.Subject',
+    ('{F29F85E0-4FF9-1068-AB91-08002B27B3D9}', 4): 'System.Author',
+    ('{F29F85E0-4FF9-1068-AB91-08002B27B3D9}', 5): 'System.Keywords',
+    ('{F29F85E0-4FF9-1068-AB91-08002B27B3D9}', 6): 'System.Comment',
+    ('{B725F130-47EF-101A-A5F1-02608C9EEBAC}', 4): 'System.ItemTypeText',
+    ('{B725F130-47EF-101A-A5F1-02608C9EEBAC}', 10): 'System.ItemNameDisplay',
+    ('{B725F130-47EF-101A-A5F1-02608C9EEBAC}', 12): 'System.Size',
+    ('{B725F130-47EF-101A-A5F1-02608C9EEBAC}', 13): 'System.FileAttributes',
+    ('{B725F130-47EF-101A-A5F1-02608C9EEBAC}', 14): 'System.DateModified',
+    ('{B725F130-47EF-101A-A5F1-02608C9EEBAC}', 15): 'System.DateCreated',
+    ('{B725F130-47EF-101A-A5F1-02608C9EEBAC}', 16): 'System.DateAccessed',
+    ('{9F4C2855-9F79-4B39-A8D0-E1D42DE1D5F3}', 2): 'System.AppUserModel.RelaunchCommand',
+    ('{9F4C2855-9F79-4B39-A8D0-E1D42DE1D5F3}', 3): 'System.AppUserModel.RelaunchIconResource',
+    ('{9F4C2855-9F79-4B39-A8D0-E1D42DE1D5F3}', 4): 'System.AppUserModel.RelaunchDisplayNameResource',
+    ('{9F4C2855-9F79-4B39-A8D0-E1D42DE1D5F3}', 5): 'System.AppUserModel.ID',
+    ('{9F4C2855-9F79-4B39-A8D0-E1D42DE1D5F3}', 9): 'System.AppUserModel.PreventPinning',
+    ('{B9B4B3FC-2B51-4A42-B5D8-324146AFCF25}', 2): 'System.Link.TargetParsingPath',
+    ('{46588AE2-4CBC-4338-BBFC-139326986DCE}', 4): 'System.Link.TargetSFGAOFlags',
+    ('{DABD30ED-0043-4789-A7F8-D013A4736622}', 100): 'System.ItemFolderPathDisplayNarrow',
+    ('{28636AA6-953D-11D2-B5D6-00C04FD918D0}', 30): 'System.ParsingPath',
+}
+
+VT_VECTOR = 0x1000
+VT_NAMES = {
+    0x00: 'VT_EMPTY', 0x01: 'VT_NULL', 0x02: 'VT_I2', 0x03: 'VT_I4', 0x04: 'VT_R4', 0x05: 'VT_R8',
+    0x06: 'VT_CY', 0x07: 'VT_DATE', 0x08: 'VT_BSTR', 0x0A: 'VT_ERROR', 0x0B: 'VT_BOOL',
+    0x0C: 'VT_VARIANT', 0x10: 'VT_I1', 0x11: 'VT_UI1', 0x12: 'VT_UI2', 0x13: 'VT_UI4',
+    0x14: 'VT_I8', 0x15: 'VT_UI8', 0x16: 'VT_INT', 0x17: 'VT_UINT', 0x1E: 'VT_LPSTR',
+    0x1F: 'VT_LPWSTR', 0x40: 'VT_FILETIME', 0x41: 'VT_BLOB', 0x48: 'VT_CLSID',
+}
+# Fixed-size scalar property types and how to read them.
+VT_SCALARS = {
+    0x02: struct.Struct('<h'), 0x03: struct.Struct('<i'), 0x04: struct.Struct('<f'),
+    0x05: struct.Struct('<d'), 0x06: struct.Struct('<q'), 0x07: struct.Struct('<d'),
+    0x0A: struct.Struct('<I'), 0x10: struct.Struct('<b'), 0x11: struct.Struct('<B'),
+    0x12: struct.Struct('<H'), 0x13: struct.Struct('<I'), 0x14: struct.Struct('<q'),
+    0x15: struct.Struct('<Q'), 0x16: struct.Struct('<i'), 0x17: struct.Struct('<I'),
+    0x40: struct.Struct('<Q'),
+}
+
+
+def read_cstring(data, start, end, encoding):
+    # memoryview has no find(); search the exporting buffer, which shares the
+    # root view's offsets, then decode straight from the view without a copy.
+    buffer = data.obj if isinstance(data, memoryview) else data
+    nul = buffer.find(b'\x00', start, end)
+    if nul == -1:
+        return None
+    return str(data[start:nul], encoding, 'ignore')
+
+
+def read_fixed_string(data, start, end, encoding):
+    # Fixed-size, NUL-padded field (e.g. the 260-byte ANSI/520-byte Unicode targets).
+    return str(data[start:end], encoding, 'ignore').split('\x00')[0]
+
+
+class BlockTooShort(ValueError):
+    pass
+
+
+def unpack_within(layout, data, offset, end):
+    # Fields are read from the whole file buffer; a short or lying BlockSize
+    # must not turn the next block or the overlay into this block's fields.
+    if offset + layout.size > end:
+        raise BlockTooShort(f"Block too short: {layout.size}-byte field at {hex(offset)} "
+                            f"runs past the block end at {hex(end)}")
+    return layout.unpack_from(data, offset)
+
+
+def read_guid(data, offset, end=None):
+    if end is not None and offset + GUID_SIZE > end:
+        raise BlockTooShort(f"Block too short: GUID at {hex(offset)} runs past the block end at {hex(end)}")
+    return '{' + str(uuid.UUID(bytes_le=bytes(data[offset:offset + GUID_SIZE]))).upper() + '}'
+
+
+def describe_itemid(data, start, end):
+    # start..end is the item body (after its 2-byte size).
+    try:
+        if end - start < 2:
+            return None
+
+        item_type = data[start]
+        if item_type == 0x1F:
+            return "Drive or Folder"
+        elif item_type == 0x2E:
+            return "Directory"
+        elif item_type == 0x2F:
+            return "Root Directory"
+        elif item_type & 0x70 == 0x30:
+            # File entry: type, unknown byte, file size, DOS date/time, attributes, then the name.
+            try:
+                name = read_cstring(data, start + 12, end, 'utf-8')
+                if name is not None:
+                    return f"File/Folder: {name}"
+            except:
+                pass
+        return f"Unknown Item Type: {hex(item_type)}"
+    except Exception as e:
+        return f"Error parsing ItemID: {str(e)}"
+
+
+def walk_idlist(data, start, end):
+    # Items of an IDList laid out at start..end of the file buffer, up to the
+    # 2-byte terminal ID, recorded as offsets into the buffer.
+    items = ItemIDList(data, end)
+    current = start
+    while current + 2 <= end:
+        item_size = UINT16.unpack_from(data, current)[0]
+        if item_size == 0:
+            break
+        items.append(current + 2, item_size)
+        if item_size < 2:
+            break
+        current += item_size
+    return items
+
+
+def read_typed_value(data, value_type, offset, end):
+    # One TypedPropertyValue body (after type and padding). Returns the value
+    # and the offset just past it; strings and vector elements are 4-byte aligned.
+    if value_type in (0x00, 0x01):
+        return None, offset
+    if value_type & VT_VECTOR:
+        base_type = value_type & ~VT_VECTOR
+        count = unpack_within(UINT32, data, offset, end)[0]
+        offset += 4
+        values = []
+        while len(values) < count and offset < end:
+            previous = offset
+            if base_type == 0x0C:
+                element_type = unpack_within(UINT16, data, offset, end)[0]
+                value, offset = read_typed_value(data, element_type, offset + 4, end)
+            else:
+                value, offset = read_typed_value(data, base_type, offset, end)
+            if offset == previous:
+                break
+            values.append(value)
+        return values, offset
+    layout = VT_SCALARS.get(value_type)
+    if layout is not None:
+        value = unpack_within(layout, data, offset, end)[0]
+        if value_type == 0x40:
+            value = filetime_to_datetime(value)
+        return value, offset + layout.size
+    if value_type == 0x0B:
+        return unpack_within(UINT16, data, offset, end)[0] != 0, offset + 4
+    if value_type in (0x08, 0x1E):
+        size = unpack_within(UINT32, data, offset, end)[0]
+        start = offset + 4
+        return read_fixed_string(data, start, min(start + size, end), 'latin-1'), start + size + (-size % 4)
+    if value_type == 0x1F:
+        size = unpack_within(UINT32, data, offset, end)[0] * 2
+        start = offset + 4
+        return read_fixed_string(data, start, min(start + size, end), 'utf-16le'), start + size + (-size % 4)
+    if value_type == 0x41:
+        size = unpack_within(UINT32, data, offset, end)[0]
+        start = offset + 4
+        return HexView(data, start, min(start + size, end)), start + size + (-size % 4)
+    if value_type == 0x48:
+        return read_guid(data, offset, end), offset + GUID_SIZE
+    raise ValueError(f"unsupported property type {hex(value_type)}")
+
+
+def parse_property_value(data, start, end, string_named, format_id):
+    # One Serialized Property Value occupying start..end.
+    if string_named:
+        name_size = unpack_within(UINT32, data, start + 4, end)[0]
+        name_start = start + 9
+        name = read_fixed_string(data, name_start, min(name_start + name_size, end), 'utf-16le')
+        entry = {'name': name}
+        value_start = name_start + name_size
+    else:
+        property_id = unpack_within(UINT32, data, start + 4, end)[0]
+        entry = {'id': property_id}
+        known = PROPERTY_NAMES.get((format_id, property_id))
+        if known:
+            entry['property'] = known
+        value_start = start + 9
+
+    value_type = unpack_within(UINT16, data, value_start, end)[0]
+    entry['value_type'] = VT_NAMES.get(value_type & ~VT_VECTOR, hex(value_type & ~VT_VECTOR))
+    if value_type & VT_VECTOR:
+        entry['value_type'] += '|VT_VECTOR'
+    try:
+        entry['value'] = read_typed_value(data, value_type, value_start + 4, end)[0]
+    except (struct.error, ValueError, IndexError):
+        # Unknown or truncated type: keep the raw bytes, the size still bounds it.
+        entry['value'] = HexView(data, value_start + 4, end)
+    return entry
+
+
+def parse_property_storage(data, start, end):
+    # One Serialized Property Storage (MS-PROPSTORE) at start..end.
+    version = unpack_within(UINT32, data, start + 4, end)[0]
+    format_id = read_guid(data, start + 8, end)
+    string_named = format_id == FMTID_STRING_NAMED
+    storage = {
+        'format_id': format_id,
+        'version': hex(version),
+        'properties': []
+    }
+    current = start + 8 + GUID_SIZE
+    while current + 4 <= end:
+        value_size = UINT32.unpack_from(data, current)[0]
+        if value_size == 0:
+            break
+        value_end = min(current + value_size, end)
+        try:
+            storage['properties'].append(parse_property_value(data, current, value_end, string_named, format_id))
+        except BlockTooShort as e:
+            storage['error'] = str(e)
+            break
+        current += value_size
+    return storage
+
+
+class BlockDecoder:
+    # Decoder for one ExtraData block signature. decode() receives the whole
+    # file buffer and the absolute start..end of the block body (after size and
+    # signature), so nothing is copied and views share the buffer's offsets.
+    signature = None
+    name = 'Unknown'
+    # Exact BlockSize required by MS-SHLLINK; None for variable-size blocks.
+    expected_size = None
+    layout = None
+
+    def decode(self, data, start, end):
+        return {}
+
+    def parse(self, data, start, end):
+        try:
+            parsed = {'type': self.name}
+            parsed.update(self.decode(data, start, end))
+            return parsed
+        except BlockTooShort as e:
+            return {'type': 'Error', 'error': str(e)}
+        except Exception as e:
+            return {
+                'type': 'Error',
+                'error': f'Failed to parse block data: {str(e)}'
+            }
+
+
+class BlockRegistry:
+    # Signature -> decoder instance. Third-party decoders are added with
+    # register(), or the register_decoder class decorator for the default registry.
+    def __init__(self):
+        self.decoders = {}
+
+    def register(self, decoder, replace=False):
+        if decoder.signature in self.decoders and not replace:
+            raise ValueError(f"Decoder already registered for {hex(decoder.signature)}")
+        self.decoders[decoder.signature] = decoder
+        return decoder
+
+    def unregister(self, signature):
+        return self.decoders.pop(signature, None)
+
+    def get(self, signature):
+        return self.decoders.get(signature)
+
+    def __contains__(self, signature):
+        return signature in self.decoders
+
+    def parse(self, signature, data, start, end):
+        decoder = self.decoders.get(signature)
+        if decoder is None:
+            return {
+                'type': 'Unknown',
+                'note': f'Unknown signature: {hex(signature)}'
+            }
+        return decoder.parse(data, start, end)
+
+
+BLOCK_DECODERS = BlockRegistry()
+
+
+def register_decoder(decoder_class=None, replace=False):
+    # Usable as @register_decoder or @register_decoder(replace=True).
+    def register(cls):
+        BLOCK_DECODERS.register(cls(), replace=replace)
+        return cls
+    return register(decoder_class) if decoder_class is not None else register
+
+
+@register_decoder
+class ConsoleDataBlock(BlockDecoder):
+    signature = 0xA0000002
+    name = 'ConsoleDataBlock'
+    expected_size = 0xCC
+    layout = struct.Struct('<8H8xIII64xIIIIIIII')
+
+    def decode(self, data, start, end):
+        if start + 196 > end:
+            # The color table follows the fields the layout covers.
+            raise BlockTooShort(f"Block too short: ConsoleDataBlock body is {end - start} bytes, 196 needed")
+        (fill_attributes, popup_fill_attributes, screen_buffer_size_x, screen_buffer_size_y,
+         window_size_x, window_size_y, window_origin_x, window_origin_y, font_size, font_family,
+         font_weight, cursor_size, full_screen, quick_edit, insert_mode, auto_position,
+         history_buffer_size, number_of_history_buffers, history_no_dup) = unpack_within(self.layout, data, start, end)
+        return {
+            'fill_attributes': fill_attributes,
+            'popup_fill_attributes': popup_fill_attributes,
+            'screen_buffer_size_x': screen_buffer_size_x,
+            'screen_buffer_size_y': screen_buffer_size_y,
+            'window_size_x': window_size_x,
+            'window_size_y': window_size_y,
+            'window_origin_x': window_origin_x,
+            'window_origin_y': window_origin_y,
+            'font_size': font_size,
+            'font_family': font_family,
+            'font_weight': font_weight,
+            'face_name': read_fixed_string(data, start + 36, start + 100, 'utf-16le'),
+            'cursor_size': cursor_size,
+            'full_screen': full_screen,
+            'quick_edit': quick_edit,
+            'insert_mode': insert_mode,
+            'auto_position': auto_position,
+            'history_buffer_size': history_buffer_size,
+            'number_of_history_buffers': number_of_history_buffers,
+            'history_no_dup': history_no_dup,
+            'color_table': HexView(data, start + 132, start + 196)
+        }
+
+
+@register_decoder
+class ConsoleFEDataBlock(BlockDecoder):
+    signature = 0xA0000004
+    name = 'ConsoleFEDataBlock'
+    expected_size = 0x0C
+    layout = struct.Struct('<I')
+
+    def decode(self, data, start, end):
+        return {'code_page': unpack_within(self.layout, data, start, end)[0]}
+
+
+class TargetDataBlock(BlockDecoder):
+    # 260-byte ANSI target followed by a 520-byte Unicode target.
+    expected_size = 0x314
+
+    def decode(self, data, start, end):
+        return {
+            'target_ansi': read_fixed_string(data, start, min(start + 260, end), 'ascii'),
+            'target_unicode': read_fixed_string(data, start + 260, min(start + 780, end), 'utf-16le')
+        }
+
+
+@register_decoder
+class DarwinDataBlock(TargetDataBlock):
+    signature = 0xA0000006
+    name = 'DarwinDataBlock'
+
+    def decode(self, data, start, end):
+        targets = TargetDataBlock.decode(self, data, start, end)
+        return {
+            'darwin_data_ansi': targets['target_ansi'],
+            'darwin_data_unicode': targets['target_unicode']
+        }
+
+
+@register_decoder
+class EnvironmentVariableDataBlock(TargetDataBlock):
+    signature = 0xA0000001
+    name = 'EnvironmentVariableDataBlock'
+
+
+@register_decoder
+class IconEnvironmentDataBlock(TargetDataBlock):
+    signature = 0xA0000007
+    name = 'IconEnvironmentDataBlock'
+
+
+@register_decoder
+class KnownFolderDataBlock(BlockDecoder):
+    signature = 0xA000000B
+    name = 'KnownFolderDataBlock'
+    expected_size = 0x1C
+    layout = struct.Struct('<16xI')
+
+    def decode(self, data, start, end):
+        offset = unpack_within(self.layout, data, start, end)[0]
+        return {
+            'known_folder_id': HexView(data, start, start + GUID_SIZE),
+            'known_folder_guid': read_guid(data, start, end),
+            'offset': offset
+        }
+
+
+@register_decoder
+class PropertyStoreDataBlock(BlockDecoder):
+    signature = 0xA0000009
+    name = 'PropertyStoreDataBlock'
+
+    def decode(self, data, start, end):
+        storages = []
+        current = start
+        while current + 4 <= end:
+            storage_size = UINT32.unpack_from(data, current)[0]
+            if storage_size == 0:
+                break
+            storage_end = min(current + storage_size, end)
+            if storage_size < 8 + GUID_SIZE:
+                return {'storages': storages, 'error': f"Invalid property storage size: {storage_size}"}
+            if storage_end - current < 8 + GUID_SIZE:
+                return {'storages': storages, 'error': f"Block too short for property storage at {hex(current)}"}
+            if UINT32.unpack_from(data, current + 4)[0] != PROPERTY_STORAGE_VERSION:
+                return {'storages': storages, 'error': "Invalid property storage version"}
+            storages.append(parse_property_storage(data, current, storage_end))
+            current += storage_size
+        return {'storages': storages}
+
+
+@register_decoder
+class ShimDataBlock(BlockDecoder):
+    signature = 0xA0000008
+    name = 'ShimDataBlock'
+
+    def decode(self, data, start, end):
+        return {'layer_name': read_fixed_string(data, start, end, 'utf-16le')}
+
+
+@register_decoder
+class SpecialFolderDataBlock(BlockDecoder):
+    signature = 0xA0000005
+    name = 'SpecialFolderDataBlock'
+    expected_size = 0x10
+    layout = struct.Struct('<II')
+
+    def decode(self, data, start, end):
+        special_folder_id, offset = unpack_within(self.layout, data, start, end)
+        return {
+            'special_folder_id': special_folder_id,
+            'offset': offset
+        }
+
+
+@register_decoder
+class TrackerDataBlock(BlockDecoder):
+    signature = 0xA0000003
+    name = 'TrackerDataBlock'
+    expected_size = 0x60
+    layout = struct.Struct('<II')
+
+    def decode(self, data, start, end):
+        length, version = unpack_within(self.layout, data, start, end)
+        return {
+            'length': length,
+            'version': version,
+            'machine_id': read_fixed_string(data, start + 8, min(start + 24, end), 'ascii'),
+            'droid_volume_id': read_guid(data, start + 24, end),
+            'droid_file_id': read_guid(data, start + 40, end),
+            'birth_droid_volume_id': read_guid(data, start + 56, end),
+            'birth_droid_file_id': read_guid(data, start + 72, end),
+        }
+
+
+@register_decoder
+class VistaAndAboveIDListDataBlock(BlockDecoder):
+    signature = 0xA000000C
+    name = 'VistaAndAboveIDListDataBlock'
+
+    def decode(self, data, start, end):
+        return {'ItemIDList': walk_idlist(data, start, end)}
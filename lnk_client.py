@@ -0,0 +1,119 @@
+import os
+import sys
+import hmac
+import json
+import stat
+import socket
+import hashlib
+import secrets
+import tempfile
+
+SOCKET_NAME = 'daemon.sock'
+# Port and per-run token of a TCP daemon, readable only by its user.
+ENDPOINT_FILE = 'daemon.json'
+
+
+def runtime_dir():
+    # Per-user directory for the daemon endpoint.
+    if os.name == 'nt':
+        # %LOCALAPPDATA% is only accessible to its owner.
+        return os.path.join(os.environ.get('LOCALAPPDATA') or os.path.expanduser('~'), 'lnk_anti_mal')
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base:
+        return os.path.join(base, 'lnk_anti_mal')
+    return os.path.join(tempfile.gettempdir(), f"lnk_anti_mal-{os.getuid()}")
+
+
+def check_private_dir(path):
+    # Another account must not be able to create, replace or connect to what is
+    # inside: the directory has to be ours, not a symlink and mode 0700.
+    if os.name == 'nt':
+        return path
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"Daemon directory is not private to this user: {path}")
+    return path
+
+
+def ensure_private_dir(path):
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    return check_private_dir(path)
+
+
+def default_address():
+    if hasattr(socket, 'AF_UNIX') and os.name != 'nt':
+        return os.path.join(runtime_dir(), SOCKET_NAME)
+    return None
+
+
+def endpoint(address=None):
+    # (address, token). A Unix socket is protected by its private directory; a
+    # loopback port is not, so TCP requests and replies are signed with the
+    # token the daemon wrote to its endpoint file.
+    address = address or default_address()
+    if isinstance(address, str):
+        check_private_dir(os.path.dirname(os.path.abspath(address)))
+        return address, None
+    directory = check_private_dir(runtime_dir())
+    with open(os.path.join(directory, ENDPOINT_FILE), 'r', encoding='utf-8') as f:
+        info = json.load(f)
+    return address or ('127.0.0.1', info['port']), info['token']
+
+
+def sign(token, label, message):
+    body = json.dumps(message, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hmac.new(bytes.fromhex(token), label + b'\n' + body, hashlib.sha256).hexdigest()
+
+
+def send_request(request, address=None, timeout=30.0):
+    address, token = endpoint(address)
+    if token is not None:
+        request = dict(request, nonce=secrets.token_hex(16))
+        request['mac'] = sign(token, b'request', request)
+
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise ConnectionError("Daemon closed the connection without a reply")
+
+    response = json.loads(line)
+    if token is not None:
+        # Whoever holds the port must prove it knows the token for this nonce.
+        mac = response.pop('mac', '')
+        if response.get('nonce') != request['nonce'] or not hmac.compare_digest(
+                mac, sign(token, b'response', response)):
+            raise ConnectionError("Daemon reply failed authentication")
+        del response['nonce']
+    return response
+
+
+def request_verdict(lnk_path, address=None, timeout=30.0):
+    # Returns None when no daemon is listening so callers can analyze locally.
+    lnk_path = os.path.abspath(lnk_path)
+    try:
+        verdict = send_request({'op': 'verdict', 'path': lnk_path}, address, timeout)
+    except (OSError, ValueError, KeyError):
+        return None
+    if 'error' in verdict or verdict.get('path') != lnk_path:
+        return None
+    return verdict
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: lnk_client.py <path-to-lnk>", file=sys.stderr)
+        sys.exit(2)
+    verdict = request_verdict(sys.argv[1])
+    if verdict is None:
+        print("LNK analysis daemon is not available", file=sys.stderr)
+        sys.exit(3)
+    print(json.dumps(verdict, ensure_ascii=False))
+    sys.exit(1 if verdict['action'] == 'block' else 0)
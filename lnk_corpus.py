@@ -0,0 +1,411 @@
+import os
+import sys
+import json
+import random
+import struct
+import argparse
+
+# Synthetic MS-SHLLINK shortcuts for benchmarks and regression runs. Field
+# layouts follow [MS-SHLLINK] section 2; every builder returns raw bytes.
+
+LINK_CLSID = bytes.fromhex('0114020000000000c000000000000046')
+MY_COMPUTER_CLSID = bytes.fromhex('e04fd020ea3a6910a2d808002b30309d')
+FMTID_STRING_NAMED = bytes.fromhex('05d5cdd59c2e1b10939708002b2cf9ae')
+FMTID_SUMMARY = bytes.fromhex('e0859ff2f94f6810ab9108002b27b3d9')
+FILETIME = 132539328000000000  # 2021-01-01
+
+FLAG_BITS = {
+    'HasLinkTargetIDList': 0x1,
+    'HasLinkInfo': 0x2,
+    'HasName': 0x4,
+    'HasRelativePath': 0x8,
+    'HasWorkingDir': 0x10,
+    'HasArguments': 0x20,
+    'HasIconLocation': 0x40,
+    'IsUnicode': 0x80,
+    'ForceNoLinkInfo': 0x100,
+    'HasExpString': 0x200,
+    'RunInSeparateProcess': 0x400,
+    'HasDarwinID': 0x1000,
+    'RunAsUser': 0x2000,
+    'HasExpIcon': 0x4000,
+    'NoPidlAlias': 0x8000,
+    'RunWithShimLayer': 0x20000,
+    'ForceNoLinkTrack': 0x40000,
+    'EnableTargetMetadata': 0x80000,
+    'DisableLinkPathTracking': 0x100000,
+    'DisableKnownFolderTracking': 0x200000,
+    'DisableKnownFolderAlias': 0x400000,
+    'AllowLinkToLink': 0x800000,
+    'UnaliasOnSave': 0x1000000,
+    'PreferEnvironmentPath': 0x2000000,
+    'KeepLocalIDListForUNCTarget': 0x4000000,
+}
+# Flags that decide which structures follow the header.
+STRUCTURE_FLAGS = ('HasLinkTargetIDList', 'HasLinkInfo', 'HasName', 'HasRelativePath',
+                   'HasWorkingDir', 'HasArguments', 'HasIconLocation', 'IsUnicode')
+STRING_FLAGS = (
+    ('HasName', 'NAME'),
+    ('HasRelativePath', 'RELATIVE_PATH'),
+    ('HasWorkingDir', 'WORKING_DIR'),
+    ('HasArguments', 'COMMAND_LINE_ARGUMENTS'),
+    ('HasIconLocation', 'ICON_LOCATION'),
+)
+
+DEFAULT_STRINGS = {
+    'NAME': 'Notepad',
+    'RELATIVE_PATH': '..\\..\\Windows\\System32\\notepad.exe',
+    'WORKING_DIR': 'C:\\Windows\\System32',
+    'COMMAND_LINE_ARGUMENTS': '',
+    'ICON_LOCATION': 'C:\\Windows\\System32\\notepad.exe',
+}
+TARGET_PATH = 'C:\\Windows\\System32\\notepad.exe'
+
+MIXES = ('flags', 'strings', 'blocks', 'unknown', 'oversized', 'malformed')
+
+
+def fixed_ansi(text, size):
+    return text.encode('ascii', 'replace')[:size - 1].ljust(size, b'\x00')
+
+
+def fixed_unicode(text, size):
+    return text.encode('utf-16le')[:size - 2].ljust(size, b'\x00')
+
+
+def header(flags, file_attributes=0x20, file_size=0, icon_index=0, show_command=1, hot_key=0):
+    return struct.pack('<I16sIIQQQIiIHHII', 0x4C, LINK_CLSID, flags, file_attributes,
+                       FILETIME, FILETIME, FILETIME, file_size, icon_index, show_command,
+                       hot_key, 0, 0, 0)
+
+
+def item_id(body):
+    return struct.pack('<H', len(body) + 2) + body
+
+
+def id_list(path=TARGET_PATH):
+    # Root (My Computer) -> drive -> one file-entry item per path component.
+    items = [item_id(b'\x1f\x50' + MY_COMPUTER_CLSID)]
+    drive, _, rest = path.partition('\\')
+    items.append(item_id(b'\x2f' + fixed_ansi(drive + '\\', 23)))
+    parts = [part for part in rest.split('\\') if part]
+    for index, part in enumerate(parts):
+        item_type = 0x32 if index == len(parts) - 1 else 0x31
+        name = part.encode('ascii', 'replace') + b'\x00'
+        if len(name) % 2:
+            name += b'\x00'
+        items.append(item_id(struct.pack('<BBIHHH', item_type, 0, 0, 0, 0, 0x10) + name))
+    return b''.join(items) + b'\x00\x00'
+
+
+def link_target_id_list(path=TARGET_PATH):
+    body = id_list(path)
+    return struct.pack('<H', len(body)) + body
+
+
+def volume_id(label='SYSTEM', drive_type=3, serial=0x1234ABCD):
+    body = label.encode('ascii', 'replace') + b'\x00'
+    return struct.pack('<IIII', 16 + len(body), drive_type, serial, 16) + body
+
+
+def network_relative_link(net_name='\\\\server\\share', device_name='Z:'):
+    net = net_name.encode('ascii', 'replace') + b'\x00'
+    device = device_name.encode('ascii', 'replace') + b'\x00'
+    net_offset = 20
+    device_offset = net_offset + len(net)
+    size = device_offset + len(device)
+    return struct.pack('<IIIII', size, 0x3, net_offset, device_offset, 0x00020000) + net + device
+
+
+def link_info(local_base_path=TARGET_PATH, net_name=None, suffix=''):
+    header_size = 0x1C
+    flags = 0
+    parts = []
+    offset = header_size
+    volume_offset = local_offset = network_offset = 0
+    if local_base_path is not None:
+        flags |= 0x1
+        volume = volume_id()
+        volume_offset = offset
+        local_offset = offset + len(volume)
+        local = local_base_path.encode('ascii', 'replace') + b'\x00'
+        parts += [volume, local]
+        offset = local_offset + len(local)
+    if net_name is not None:
+        flags |= 0x2
+        network = network_relative_link(net_name)
+        network_offset = offset
+        parts.append(network)
+        offset += len(network)
+    suffix_offset = offset
+    parts.append(suffix.encode('ascii', 'replace') + b'\x00')
+    body = b''.join(parts)
+    return struct.pack('<IIIIIII', header_size + len(body), header_size, flags, volume_offset,
+                       local_offset, network_offset, suffix_offset) + body
+
+
+def string_data(text, unicode=True):
+    if unicode:
+        encoded = text.encode('utf-16le')
+        return struct.pack('<H', len(encoded) // 2) + encoded
+    encoded = text.encode('ascii', 'replace')
+    return struct.pack('<H', len(encoded)) + encoded
+
+
+def extra_block(signature, body):
+    return struct.pack('<II', len(body) + 8, signature) + body
+
+
+def console_block():
+    body = struct.pack('<HHHHHHHH', 0x07, 0xF5, 120, 9001, 120, 30, 0, 0)
+    body += struct.pack('<IIIII', 0, 0, 0x00100000, 0x36, 400)
+    body += fixed_unicode('Consolas', 64)
+    body += struct.pack('<IIIIIIII', 25, 0, 1, 1, 1, 50, 4, 0)
+    body += b''.join(struct.pack('<I', color) for color in range(16))
+    return extra_block(0xA0000002, body)
+
+
+def console_fe_block(code_page=949):
+    return extra_block(0xA0000004, struct.pack('<I', code_page))
+
+
+def darwin_block(descriptor='w_`!^Y3J+5&4v*.6#pSE>M5QZOG4%dg[B,Z4I4+Y'):
+    return extra_block(0xA0000006, fixed_ansi(descriptor, 260) + fixed_unicode(descriptor, 520))
+
+
+def environment_block(target='%windir%\\system32\\notepad.exe'):
+    return extra_block(0xA0000001, fixed_ansi(target, 260) + fixed_unicode(target, 520))
+
+
+def icon_environment_block(target='%SystemRoot%\\System32\\shell32.dll'):
+    return extra_block(0xA0000007, fixed_ansi(target, 260) + fixed_unicode(target, 520))
+
+
+def known_folder_block(folder_id=bytes.fromhex('d0c3f5d8dec1f04e8e6c0ff8d45d0d30'), offset=0):
+    return extra_block(0xA000000B, folder_id + struct.pack('<I', offset))
+
+
+def typed_value_lpwstr(text):
+    encoded = text.encode('utf-16le') + b'\x00\x00'
+    value = struct.pack('<HHI', 0x1F, 0, len(encoded) // 2) + encoded
+    return value + b'\x00' * (-len(value) % 4)
+
+
+def property_storage(values, string_named=False):
+    # values: {property id or name: str}; one serialized property storage.
+    entries = []
+    for key, text in values.items():
+        value = typed_value_lpwstr(text)
+        if string_named:
+            name = key.encode('utf-16le') + b'\x00\x00'
+            entries.append(struct.pack('<II', 9 + len(name) + len(value), len(name)) + b'\x00' + name + value)
+        else:
+            entries.append(struct.pack('<II', 9 + len(value), key) + b'\x00' + value)
+    body = b'1SPS' + (FMTID_STRING_NAMED if string_named else FMTID_SUMMARY) + b''.join(entries) + b'\x00' * 4
+    return struct.pack('<I', 4 + len(body)) + body
+
+
+def property_store_block(storages=None):
+    storages = storages or [
+        property_storage({2: 'Title', 4: 'Author'}),
+        property_storage({'Custom': 'value'}, string_named=True),
+    ]
+    return extra_block(0xA0000009, b''.join(storages) + b'\x00' * 4)
+
+
+def shim_block(layer='WINXPSP3'):
+    encoded = layer.encode('utf-16le') + b'\x00\x00'
+    return extra_block(0xA0000008, encoded.ljust(max(128, len(encoded) + (-len(encoded) % 4)), b'\x00'))
+
+
+def special_folder_block(folder_id=0x25, offset=0):
+    return extra_block(0xA0000005, struct.pack('<II', folder_id, offset))
+
+
+def tracker_block(machine_id='desktop-01'):
+    droid = bytes(range(16)) + bytes(range(16, 32))
+    body = struct.pack('<II', 0x58, 0) + fixed_ansi(machine_id, 16) + droid + droid
+    return extra_block(0xA0000003, body)
+
+
+def vista_id_list_block(path=TARGET_PATH):
+    return extra_block(0xA000000C, id_list(path))
+
+
+BLOCK_BUILDERS = {
+    'ConsoleDataBlock': console_block,
+    'ConsoleFEDataBlock': console_fe_block,
+    'DarwinDataBlock': darwin_block,
+    'EnvironmentVariableDataBlock': environment_block,
+    'IconEnvironmentDataBlock': icon_environment_block,
+    'KnownFolderDataBlock': known_folder_block,
+    'PropertyStoreDataBlock': property_store_block,
+    'ShimDataBlock': shim_block,
+    'SpecialFolderDataBlock': special_folder_block,
+    'TrackerDataBlock': tracker_block,
+    'VistaAndAboveIDListDataBlock': vista_id_list_block,
+}
+# LinkFlags that announce a block (set alongside it so the file stays consistent).
+BLOCK_FLAGS = {
+    'DarwinDataBlock': 'HasDarwinID',
+    'EnvironmentVariableDataBlock': 'HasExpString',
+    'IconEnvironmentDataBlock': 'HasExpIcon',
+    'ShimDataBlock': 'RunWithShimLayer',
+}
+
+
+def build_lnk(flag_names=('HasLinkTargetIDList', 'HasLinkInfo', 'HasRelativePath', 'HasWorkingDir',
+                          'HasIconLocation', 'IsUnicode'),
+              strings=None, blocks=(), show_command=1, icon_index=0, overlay=b''):
+    flags = 0
+    for name in flag_names:
+        flags |= FLAG_BITS[name]
+    for block in blocks:
+        if isinstance(block, str) and block in BLOCK_FLAGS:
+            flags |= FLAG_BITS[BLOCK_FLAGS[block]]
+
+    values = dict(DEFAULT_STRINGS)
+    values.update(strings or {})
+    unicode = bool(flags & FLAG_BITS['IsUnicode'])
+
+    parts = [header(flags, file_size=0x2C000, icon_index=icon_index, show_command=show_command)]
+    if flags & FLAG_BITS['HasLinkTargetIDList']:
+        parts.append(link_target_id_list())
+    if flags & FLAG_BITS['HasLinkInfo']:
+        parts.append(link_info())
+    for flag_name, string_type in STRING_FLAGS:
+        if flags & FLAG_BITS[flag_name]:
+            parts.append(string_data(values[string_type], unicode))
+    for block in blocks:
+        # Block names go through BLOCK_BUILDERS; raw bytes are appended as given.
+        parts.append(BLOCK_BUILDERS[block]() if isinstance(block, str) else block)
+    parts.append(b'\x00' * 4)
+    parts.append(overlay)
+    return b''.join(parts)
+
+
+def flag_cases():
+    # Every combination of the structure-selecting flags, then each remaining
+    # flag on its own over a typical shortcut.
+    for mask in range(1 << len(STRUCTURE_FLAGS)):
+        names = [name for bit, name in enumerate(STRUCTURE_FLAGS) if mask & (1 << bit)]
+        yield f"flags_{mask:03d}", build_lnk(names)
+    base = ('HasLinkTargetIDList', 'HasLinkInfo', 'HasRelativePath', 'IsUnicode')
+    for name in FLAG_BITS:
+        if name not in STRUCTURE_FLAGS:
+            yield f"flag_{name}", build_lnk(base + (name,))
+
+
+def string_cases():
+    texts = {
+        'ascii': 'C:\\Windows\\System32\\notepad.exe',
+        'latin': 'C:\\Users\\José\\Café\\résumé.txt',
+        'korean': 'C:\\Users\\사용자\\바탕 화면\\문서.txt',
+        'emoji': 'C:\\Temp\\\U0001F600.txt',
+        'empty': '',
+    }
+    all_strings = ('HasName', 'HasRelativePath', 'HasWorkingDir', 'HasArguments', 'HasIconLocation')
+    for label, text in texts.items():
+        strings = {string_type: text for _, string_type in STRING_FLAGS}
+        yield f"strings_unicode_{label}", build_lnk(all_strings + ('IsUnicode',), strings)
+        # ANSI string data cannot carry non-ASCII text; it is written with '?' replacements.
+        yield f"strings_ansi_{label}", build_lnk(all_strings, strings)
+    yield "strings_arguments_suspicious", build_lnk(
+        ('HasRelativePath', 'HasArguments', 'IsUnicode'),
+        {'RELATIVE_PATH': '..\\..\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe',
+         'COMMAND_LINE_ARGUMENTS': '-nop -w hidden -enc SQBFAFgAIAAoAE4AZQB3AC0ATwBiAGoAZQBjAHQAKQA='},
+        show_command=7)
+
+
+def block_cases():
+    for name in BLOCK_BUILDERS:
+        yield f"block_{name}", build_lnk(blocks=(name,))
+    yield "block_all", build_lnk(blocks=tuple(BLOCK_BUILDERS))
+
+
+def unknown_cases():
+    for signature in (0xA00000FF, 0xA000000D, 0xB0000001, 0x00000001):
+        yield f"unknown_{signature:08x}", build_lnk(blocks=(extra_block(signature, b'\x00' * 16),))
+    yield "unknown_between_known", build_lnk(
+        blocks=('TrackerDataBlock', extra_block(0xA0000042, b'\xcc' * 32), 'PropertyStoreDataBlock'))
+
+
+def oversized_cases():
+    yield "oversized_arguments", build_lnk(
+        ('HasRelativePath', 'HasArguments', 'IsUnicode'), {'COMMAND_LINE_ARGUMENTS': 'A' * 0xFFFF})
+    yield "oversized_all_strings", build_lnk(
+        ('HasName', 'HasRelativePath', 'HasWorkingDir', 'HasArguments', 'HasIconLocation', 'IsUnicode'),
+        {string_type: 'B' * 0x8000 for _, string_type in STRING_FLAGS})
+    yield "oversized_property_store", build_lnk(blocks=(property_store_block(
+        [property_storage({index: 'x' * 1024 for index in range(2, 258)})]),))
+    yield "oversized_vista_id_list", build_lnk(blocks=(vista_id_list_block('C:\\' + '\\'.join(['dir'] * 2000)),))
+    yield "oversized_overlay", build_lnk(overlay=b'\x90' * (4 * 1024 * 1024))
+
+
+def malformed_cases(rng):
+    base = build_lnk(('HasLinkTargetIDList', 'HasLinkInfo', 'HasRelativePath', 'HasArguments',
+                      'HasIconLocation', 'IsUnicode'),
+                     {'COMMAND_LINE_ARGUMENTS': '/c start calc.exe'},
+                     blocks=('EnvironmentVariableDataBlock', 'TrackerDataBlock', 'PropertyStoreDataBlock'))
+    for cut in (0, 4, 40, 75, 76, 80, 120, len(base) // 2, len(base) - 5):
+        yield f"malformed_truncated_{cut}", base[:cut]
+
+    # Size fields pointing past the end of the file.
+    yield "malformed_idlist_size", base[:76] + b'\xff\xff' + base[78:]
+    linkinfo_offset = 76 + 2 + struct.unpack_from('<H', base, 76)[0]
+    yield "malformed_linkinfo_size", (base[:linkinfo_offset] + struct.pack('<I', 0x7FFFFFFF)
+                                      + base[linkinfo_offset + 4:])
+    yield "malformed_block_size", build_lnk(blocks=(struct.pack('<II', 0x10000, 0xA0000003) + b'\x00' * 32,))
+    yield "malformed_bad_header_size", struct.pack('<I', 0x50) + base[4:]
+    yield "malformed_bad_clsid", base[:4] + b'\x00' * 16 + base[20:]
+    yield "malformed_no_terminal_block", base[:-4]
+
+    for index in range(16):
+        data = bytearray(base)
+        for _ in range(rng.randint(1, 8)):
+            data[rng.randrange(len(data))] = rng.randrange(256)
+        yield f"malformed_fuzz_{index:02d}", bytes(data)
+
+
+def generate(output_dir, mixes=MIXES, seed=0):
+    rng = random.Random(seed)
+    cases = {
+        'flags': flag_cases,
+        'strings': string_cases,
+        'blocks': block_cases,
+        'unknown': unknown_cases,
+        'oversized': oversized_cases,
+        'malformed': lambda: malformed_cases(rng),
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    for mix in mixes:
+        for name, data in cases[mix]():
+            path = os.path.join(output_dir, f"{name}.lnk")
+            with open(path, 'wb') as f:
+                f.write(data)
+            manifest.append({'file': os.path.basename(path), 'mix': mix, 'size': len(data)})
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'seed': seed, 'mixes': list(mixes), 'files': manifest}, f, indent=1)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic MS-SHLLINK test corpus')
+    parser.add_argument('output_dir', help='Directory to write the .lnk files and manifest.json to')
+    parser.add_argument('--mix', default=','.join(MIXES),
+                        help=f"Comma-separated case groups (default: all of {','.join(MIXES)})")
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the fuzzed malformed cases')
+    args = parser.parse_args(argv)
+
+    mixes = [mix.strip() for mix in args.mix.split(',') if mix.strip()]
+    unknown = [mix for mix in mixes if mix not in MIXES]
+    if unknown:
+        parser.error(f"Unknown mix: {', '.join(unknown)}")
+
+    manifest = generate(args.output_dir, mixes, args.seed)
+    print(f"Wrote {len(manifest)} files ({sum(item['size'] for item in manifest)} bytes) to {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import os
+import sys
+import hmac
+import json
+import signal
+import socket
+import secrets
+import argparse
+import threading
+import socketserver
+from main import WhitelistManager
+from file_digest import digest_file, file_hashes
+from command_rules import default_rules
+from analyze_lnk import LNKAnalyzer
+from lnk_client import (default_address, runtime_dir, ensure_private_dir, check_private_dir, sign,
+                        ENDPOINT_FILE)
+from verdict_cache import VerdictCache
+from analysis_metrics import metrics
+from lnk_watcher import ShortcutWatcher, default_watch_dirs, mounted_shares
+import generate_report  # loaded up front so the first flagged file does not pay for jinja2
+
+BLOCK_THRESHOLD = 4
+
+
+class LNKAnalysisService:
+    # Everything expensive to set up (whitelist store, rule automata, digest
+    # cache, analyzer and report modules) is created once and reused.
+    def __init__(self, vt_api_key=None, whitelist_file=None, verdict_cache_file=None):
+        self.vt_api_key = vt_api_key
+        self.whitelist_mgr = WhitelistManager(whitelist_file)
+        self.rules = default_rules()
+        self.verdict_cache = VerdictCache(verdict_cache_file, native=True)
+        self.verdict_cache.purge_stale()
+
+    def verdict(self, lnk_path, report=True):
+        # report: render the HTML report for a blocked shortcut. The click path
+        # shows it to the user; watcher pre-scans only warm the cache.
+        # SHA-256 alone answers the whitelist and verdict cache; the other
+        # digests are only computed when the file has to be analyzed.
+        sha256 = file_hashes(lnk_path)['sha256']
+        if self.whitelist_mgr.is_whitelisted(lnk_path):
+            return {
+                'path': lnk_path,
+                'sha256': sha256,
+                'whitelisted': True,
+                'risk_score': 0,
+                'suspicious': [],
+                'malicious': [],
+                'action': 'allow',
+            }
+
+        cached = self.verdict_cache.get(sha256, BLOCK_THRESHOLD if report else None)
+        if cached is None:
+            digest = digest_file(lnk_path)
+            analyzer = LNKAnalyzer(lnk_path, self.vt_api_key, native=True, digest=digest, rules=self.rules)
+            if analyzer.analyze(report=report) is None:
+                return {'path': lnk_path, 'error': 'Analysis failed'}
+            self.verdict_cache.put_analyzer(analyzer)
+            cached = {
+                'risk_score': analyzer.risk_score,
+                'suspicious': analyzer.suspicious,
+                'malicious': analyzer.malicious,
+                'report_path': analyzer.report_path,
+            }
+
+        return {
+            'path': lnk_path,
+            'sha256': sha256,
+            'whitelisted': False,
+            'risk_score': cached['risk_score'],
+            'suspicious': cached['suspicious'],
+            'malicious': cached['malicious'],
+            'report_path': cached['report_path'],
+            'action': 'block' if cached['risk_score'] > BLOCK_THRESHOLD else 'prompt',
+        }
+
+    def prescan(self, lnk_path):
+        return self.verdict(lnk_path, report=False)
+
+    def handle(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok': True}
+        if op == 'metrics':
+            return {'metrics': metrics.prometheus_text()}
+        if op == 'verdict':
+            return self.verdict(request['path'])
+        return {'error': f'Unknown op: {op}'}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        token = self.server.token
+        request = None
+        try:
+            request = json.loads(line)
+            if token is not None and not self.authenticated(request, token):
+                response = {'error': 'Unauthenticated request'}
+            else:
+                response = self.server.service.handle(request)
+        except Exception as e:
+            response = {'error': str(e)}
+        # Round-trip through JSON so the reply is signed exactly as the client decodes it.
+        response = json.loads(json.dumps(response, ensure_ascii=False, default=str))
+        if token is not None and isinstance(request, dict) and isinstance(request.get('nonce'), str):
+            response['nonce'] = request['nonce']
+            response['mac'] = sign(token, b'response', response)
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    @staticmethod
+    def authenticated(request, token):
+        if not isinstance(request, dict) or not isinstance(request.get('nonce'), str):
+            return False
+        message = dict(request)
+        mac = message.pop('mac', '')
+        return isinstance(mac, str) and hmac.compare_digest(mac, sign(token, b'request', message))
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class UnixAnalysisServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class TCPAnalysisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # Windows lets another process bind the same port unless it is claimed exclusively.
+        if hasattr(socket, 'SO_EXCLUSIVEADDRUSE'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        super().server_bind()
+
+
+def write_endpoint(port, token):
+    path = os.path.join(ensure_private_dir(runtime_dir()), ENDPOINT_FILE)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'port': port, 'token': token}, f)
+    os.replace(temp_path, path)
+    return path
+
+
+def create_server(service, address=None):
+    # A Unix socket lives in a 0700 per-user directory, so only this user can
+    # reach it. A loopback port is reachable by every local process: requests
+    # and replies are signed with a per-run token kept in the private endpoint file.
+    address = address or default_address()
+    if isinstance(address, str):
+        directory = os.path.dirname(os.path.abspath(address))
+        if address == default_address():
+            ensure_private_dir(directory)
+        check_private_dir(directory)
+        if os.path.exists(address):
+            os.remove(address)
+        # Bind with a restrictive umask so the socket is never briefly accessible.
+        umask = os.umask(0o177)
+        try:
+            server = UnixAnalysisServer(address, _RequestHandler)
+        finally:
+            os.umask(umask)
+        server.token = None
+        server.endpoint_file = None
+    else:
+        server = TCPAnalysisServer(address or ('127.0.0.1', 0), _RequestHandler)
+        server.token = secrets.token_hex(32)
+        server.endpoint_file = write_endpoint(server.server_address[1], server.token)
+    server.service = service
+    return server
+
+
+def start_metrics_writer(path, interval=15.0):
+    def run():
+        while not stop.wait(interval):
+            try:
+                metrics.write_prometheus(path)
+            except OSError as e:
+                print(f"Failed to write metrics file: {e}", file=sys.stderr)
+
+    stop = threading.Event()
+    threading.Thread(target=run, name='metrics-writer', daemon=True).start()
+    return stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resident LNK analysis service')
+    parser.add_argument('--socket', help='Unix socket path in a private directory (default: per-user runtime directory)')
+    parser.add_argument('--port', type=int, help='Listen on 127.0.0.1:PORT (0: any free port) with token '
+                                                 'authentication instead of a Unix socket')
+    parser.add_argument('--whitelist', help='Whitelist database path')
+    parser.add_argument('--vt-api-key', default=None, help='VirusTotal API key')
+    parser.add_argument('--metrics-file', help='Write Prometheus text-format metrics to this file periodically')
+    parser.add_argument('--watch', action='append', default=[], help='Pre-scan shortcuts dropped into this directory (repeatable)')
+    parser.add_argument('--watch-share', action='append', default=[], help='Pre-scan a network share by polling (repeatable)')
+    parser.add_argument('--watch-defaults', action='store_true', help='Watch desktops, downloads, startup folders and mounted shares')
+    parser.add_argument('--watch-recursive', action='store_true', help='Watch subdirectories of watched directories too')
+    args = parser.parse_args(argv)
+
+    address = ('127.0.0.1', args.port) if args.port is not None else args.socket
+    service = LNKAnalysisService(args.vt_api_key, args.whitelist)
+    server = create_server(service, address)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    metrics_writer = start_metrics_writer(args.metrics_file) if args.metrics_file else None
+
+    # Verdicts computed ahead of time land in the service's verdict cache, so a
+    # later click on the same file is answered by a lookup.
+    watch_dirs = args.watch + (default_watch_dirs() if args.watch_defaults else [])
+    watch_shares = args.watch_share + (mounted_shares() if args.watch_defaults else [])
+    watcher = None
+    if watch_dirs or watch_shares:
+        watcher = ShortcutWatcher(service.prescan, watch_dirs, watch_shares, recursive=args.watch_recursive).start()
+        print(f"Pre-scanning shortcuts in {len(watcher.directories)} directories")
+    print(f"LNK analysis daemon listening on {server.server_address}")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        if watcher is not None:
+            watcher.stop(wait=False)
+        if metrics_writer is not None:
+            metrics_writer.set()
+            metrics.write_prometheus(args.metrics_file)
+        if isinstance(server.server_address, str) and os.path.exists(server.server_address):
+            os.remove(server.server_address)
+        if server.endpoint_file and os.path.exists(server.endpoint_file):
+            os.remove(server.endpoint_file)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+import enum
+from array import array
+from datetime import datetime
+from hex_view import HexView
+
+
+class LinkFlags(enum.IntFlag):
+    HasLinkTargetIDList = 0x1
+    HasLinkInfo = 0x2
+    HasName = 0x4
+    HasRelativePath = 0x8
+    HasWorkingDir = 0x10
+    HasArguments = 0x20
+    HasIconLocation = 0x40
+    IsUnicode = 0x80
+    ForceNoLinkInfo = 0x100
+    HasExpString = 0x200
+    RunInSeparateProcess = 0x400
+    HasDarwinID = 0x1000
+    RunAsUser = 0x2000
+    HasExpIcon = 0x4000
+    NoPidlAlias = 0x8000
+    RunWithShimLayer = 0x20000
+    ForceNoLinkTrack = 0x40000
+    EnableTargetMetadata = 0x80000
+    DisableLinkPathTracking = 0x100000
+    DisableKnownFolderTracking = 0x200000
+    DisableKnownFolderAlias = 0x400000
+    AllowLinkToLink = 0x800000
+    UnaliasOnSave = 0x1000000
+    PreferEnvironmentPath = 0x2000000
+    KeepLocalIDListForUNCTarget = 0x4000000
+
+    def __getitem__(self, name):
+        # Legacy access: flags['HasName'] -> (masked value, description)
+        member = LinkFlags[name]
+        return (int(self) & member.value, LinkFlags.DESCRIPTIONS[member])
+
+    def describe(self):
+        # The per-file {name: (masked value, description)} dict reports show.
+        value = int(self)
+        return {member.name: (value & member.value, description)
+                for member, description in LinkFlags.DESCRIPTIONS.items()}
+
+
+# Shared by every result; a file only stores its flags as one int.
+LinkFlags.DESCRIPTIONS = {
+    LinkFlags.HasLinkTargetIDList: "Contains Link Target ID List",
+    LinkFlags.HasLinkInfo: "Contains Link Info Structure",
+    LinkFlags.HasName: "Contains String Data: NAME",
+    LinkFlags.HasRelativePath: "Contains String Data: RELATIVE_PATH",
+    LinkFlags.HasWorkingDir: "Contains String Data: WORKING_DIR",
+    LinkFlags.HasArguments: "Contains String Data: COMMAND_LINE_ARGUMENTS",
+    LinkFlags.HasIconLocation: "Contains String Data: ICON_LOCATION",
+    LinkFlags.IsUnicode: "String data is Unicode encoded",
+    LinkFlags.ForceNoLinkInfo: "Shell Link should not use Link Info",
+    LinkFlags.HasExpString: "Contains EnvironmentVariableDataBlock",
+    LinkFlags.RunInSeparateProcess: "Target should run in separate process",
+    LinkFlags.HasDarwinID: "Contains DarwinDataBlock",
+    LinkFlags.RunAsUser: "Target should run as user",
+    LinkFlags.HasExpIcon: "Contains IconEnvironmentDataBlock",
+    LinkFlags.NoPidlAlias: "Shell Link is saved without a PIDL",
+    LinkFlags.RunWithShimLayer: "Contains ShimDataBlock",
+    LinkFlags.ForceNoLinkTrack: "Should not be tracked",
+    LinkFlags.EnableTargetMetadata: "Shell Link can collect target properties",
+    LinkFlags.DisableLinkPathTracking: "Link path should not be tracked",
+    LinkFlags.DisableKnownFolderTracking: "Known folder should not be tracked",
+    LinkFlags.DisableKnownFolderAlias: "Should not use known folder alias",
+    LinkFlags.AllowLinkToLink: "Can link to another Shell Link",
+    LinkFlags.UnaliasOnSave: "Should be unaliased when saved",
+    LinkFlags.PreferEnvironmentPath: "Prefer system env path",
+    LinkFlags.KeepLocalIDListForUNCTarget: "Keep local ID list for UNC target",
+}
+
+STRING_FLAGS = (LinkFlags.HasName | LinkFlags.HasRelativePath | LinkFlags.HasWorkingDir |
+                LinkFlags.HasArguments | LinkFlags.HasIconLocation)
+
+
+def filetime_to_datetime(filetime):
+    if filetime == 0:
+        return "Not set"
+    try:
+        return datetime.fromtimestamp((filetime - 116444736000000000) // 10000000)
+    except (ValueError, OverflowError, OSError):
+        # Converted lazily when the record is displayed, so a malformed
+        # timestamp must not fail the export of an otherwise parsed file.
+        return "Invalid"
+
+
+def compat(value):
+    # Turns model objects inside parsed data back into the plain dicts/lists
+    # generate_report and the exporters expect.
+    if hasattr(value, 'as_dict'):
+        return value.as_dict()
+    if isinstance(value, ItemIDList):
+        return value.as_list()
+    if isinstance(value, dict):
+        return {key: compat(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [compat(item) for item in value]
+    return value
+
+
+def rebind(value, old, new):
+    # Points every model object and view inside value that reads old at new.
+    if isinstance(value, dict):
+        for item in value.values():
+            rebind(item, old, new)
+    elif isinstance(value, list):
+        for item in value:
+            rebind(item, old, new)
+    elif hasattr(value, '__slots__'):
+        for name in value.__slots__:
+            item = getattr(value, name, None)
+            if name == 'buffer':
+                if item is old:
+                    value.buffer = new
+            else:
+                rebind(item, old, new)
+
+
+class ShellLinkHeader:
+    __slots__ = ('buffer', 'header_size', 'link_flags', 'file_attributes', 'creation_time', 'access_time',
+                 'write_time', 'file_size', 'icon_index', 'show_command', 'hot_key', 'reserved1',
+                 'reserved2', 'reserved3')
+
+    def __init__(self, buffer, header_size, link_flags, file_attributes, creation_time, access_time,
+                 write_time, file_size, icon_index, show_command, hot_key, reserved1, reserved2, reserved3):
+        self.buffer = buffer
+        self.header_size = header_size
+        self.link_flags = LinkFlags(link_flags)
+        self.file_attributes = file_attributes
+        # FILETIMEs are kept raw and converted when the dict view is built.
+        self.creation_time = creation_time
+        self.access_time = access_time
+        self.write_time = write_time
+        self.file_size = file_size
+        self.icon_index = icon_index
+        self.show_command = show_command
+        self.hot_key = hot_key
+        self.reserved1 = reserved1
+        self.reserved2 = reserved2
+        self.reserved3 = reserved3
+
+    def as_dict(self):
+        return {
+            'HeaderSize': self.header_size,
+            'LinkCLSID': HexView(self.buffer, 4, 20),
+            'LinkFlags': int(self.link_flags),
+            'FileAttributes': self.file_attributes,
+            'CreationTime': filetime_to_datetime(self.creation_time),
+            'AccessTime': filetime_to_datetime(self.access_time),
+            'WriteTime': filetime_to_datetime(self.write_time),
+            'FileSize': self.file_size,
+            'IconIndex': self.icon_index,
+            'ShowCommand': self.show_command,
+            'HotKey': self.hot_key,
+            'Reserved1': self.reserved1,
+            'Reserved2': self.reserved2,
+            'Reserved3': self.reserved3,
+        }
+
+
+class ItemIDList:
+    # Items of an IDList as two parallel arrays (body offset, declared size)
+    # over the file buffer; item dicts, views and descriptions are only built
+    # when the list is read.
+    __slots__ = ('buffer', 'starts', 'sizes', 'end')
+
+    def __init__(self, buffer, end):
+        self.buffer = buffer
+        self.starts = array('Q')
+        self.sizes = array('H')
+        self.end = end
+
+    def append(self, start, size):
+        self.starts.append(start)
+        self.sizes.append(size)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, index):
+        from lnk_blocks import describe_itemid
+
+        start = self.starts[index]
+        size = self.sizes[index]
+        end = min(start - 2 + size, self.end)
+        return {
+            'Size': size,
+            'Data': HexView(self.buffer, start, end),
+            'Parsed': describe_itemid(self.buffer, start, end)
+        }
+
+    def __iter__(self):
+        for index in range(len(self.sizes)):
+            yield self[index]
+
+    def as_list(self):
+        return list(self)
+
+
+class Section:
+    # A variable-size structure (LinkTargetIDList, LinkInfo) at offset..offset+size.
+    __slots__ = ('buffer', 'offset', 'size', 'parsed')
+
+    def __init__(self, buffer, offset, size, parsed):
+        self.buffer = buffer
+        self.offset = offset
+        self.size = size
+        self.parsed = parsed
+
+    def as_dict(self, description):
+        return {
+            'Size': self.size,
+            'Hex': None,
+            'Data': HexView(self.buffer, self.offset, self.offset + self.size),
+            'Description': description,
+            'ParsedData': compat(self.parsed)
+        }
+
+
+class StringValue:
+    __slots__ = ('buffer', 'offset', 'count', 'size', 'value')
+
+    def __init__(self, buffer, offset, count, size, value):
+        self.buffer = buffer
+        self.offset = offset
+        # count: characters as stored in the size field; size: bytes of string data
+        self.count = count
+        self.size = size
+        self.value = value
+
+    def as_dict(self):
+        value_start = self.offset + 2
+        return {
+            'value': self.value,
+            'offset': hex(self.offset),
+            'size': self.size,
+            'size_hex': HexView(self.buffer, self.offset, value_start, fmt=f"Size: {{}} ({self.count})"),
+            'raw_hex': HexView(self.buffer, value_start, value_start + self.size),
+            'total_size': 2 + self.size
+        }
+
+
+class ExtraBlock:
+    __slots__ = ('buffer', 'offset', 'size', 'end', 'signature', 'name', 'expected_size', 'parsed')
+
+    def __init__(self, buffer, offset, size, end, signature, name, expected_size, parsed):
+        self.buffer = buffer
+        self.offset = offset
+        self.size = size
+        self.end = end
+        self.signature = signature
+        self.name = name
+        self.expected_size = expected_size
+        self.parsed = parsed
+
+    def as_dict(self):
+        return {
+            'offset': hex(self.offset),
+            'size': self.size,
+            'size_hex': HexView(self.buffer, self.offset, self.offset + 4, fmt=f"Size: {{}} ({self.size})"),
+            'signature': hex(self.signature),
+            'signature_hex': HexView(self.buffer, self.offset + 4, self.offset + 8),
+            'name': self.name,
+            'expected_size': self.expected_size,
+            'data_hex': HexView(self.buffer, self.offset + 8, self.end, limit=500),
+            'parsed_data': compat(self.parsed)
+        }
+
+
+class LNKResult:
+    # Everything analyze() parsed from one file. as_dict() is the structure_info
+    # dict generate_report, the exporters and batch records are built from.
+    __slots__ = ('buffer', 'header', 'id_list', 'link_info', 'strings', 'string_size',
+                 'extra_blocks', 'overlay_offset', 'overlay_size', 'overlay_head', 'shell_link_info')
+
+    def __init__(self, buffer, header):
+        self.buffer = buffer
+        self.header = header
+        self.id_list = None
+        self.link_info = None
+        self.strings = None
+        self.string_size = 0
+        self.extra_blocks = []
+        self.overlay_offset = None
+        self.overlay_size = 0
+        self.overlay_head = 0
+        self.shell_link_info = {}
+
+    @property
+    def flags(self):
+        return self.header.link_flags
+
+    def compact(self):
+        # Views only read the structure and the overlay head. Copy that range and
+        # point them at the copy, so a kept result does not hold on to the whole
+        # file or its mapping (an appended payload can be megabytes).
+        end = self.overlay_offset + self.overlay_head if self.overlay_size else len(self.buffer)
+        for section in (self.id_list, self.link_info):
+            if section is not None:
+                end = max(end, section.offset + section.size)
+        end = min(end, len(self.buffer))
+        if end == len(self.buffer) and isinstance(self.buffer.obj, bytes):
+            return
+        rebind(self, self.buffer, memoryview(bytes(self.buffer[:end])))
+
+    def as_dict(self):
+        empty = {'Size': 0, 'Hex': None, 'Data': None}
+        structure_info = {
+            'Header': {
+                'Size': self.header.header_size,
+                'Data': self.header.as_dict(),
+                'Description': 'Shell Link Header',
+                'Flags': self.flags.describe()
+            },
+            'LinkTargetIDList': (self.id_list.as_dict('Contains ID list of target') if self.id_list
+                                 else dict(empty, Description='Contains ID list of target')),
+            'LinkInfo': (self.link_info.as_dict('Contains information about linked file') if self.link_info
+                         else dict(empty, Description='Contains information about linked file')),
+            'StringData': {
+                'Size': self.string_size,
+                'Data': ({name: value.as_dict() for name, value in self.strings.items()}
+                         if self.strings is not None else None),
+                'Description': 'Contains various string properties'
+            },
+            'ExtraData': {
+                'Size': sum(block.size for block in self.extra_blocks),
+                'Data': [block.as_dict() for block in self.extra_blocks],
+                'Description': 'Contains additional data blocks'
+            },
+            'ShellLinkInfo': self.shell_link_info
+        }
+        if self.overlay_size > 0:
+            structure_info['Overlay'] = {
+                'Offset': self.overlay_offset,
+                'Size': self.overlay_size,
+                'Head': HexView(self.buffer, self.overlay_offset, self.overlay_offset + self.overlay_head),
+                'Description': 'Data appended after the terminal block'
+            }
+        return structure_info
@@ -0,0 +1,346 @@
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from analysis_metrics import metrics
+
+# Quiet time after the last event for a path before it is analyzed; a download
+# or copy produces a burst of create/modify/close events for the same file.
+DEBOUNCE_SECONDS = 0.5
+# Mounted shares do not deliver inotify events for changes made by other
+# machines, so they are rescanned on this interval instead.
+POLL_INTERVAL = 5.0
+# Mount types treated as network shares by mounted_shares().
+SHARE_FILESYSTEMS = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', '9p', 'fuse.sshfs', 'davfs')
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def is_shortcut(path):
+    return path.lower().endswith('.lnk')
+
+
+def default_watch_dirs():
+    # Where shortcuts usually arrive: desktops, downloads and startup folders
+    # (Windows paths from the environment, XDG autostart elsewhere).
+    home = os.path.expanduser('~')
+    candidates = [os.path.join(home, 'Desktop'), os.path.join(home, 'Downloads'),
+                  os.path.join(home, '.config', 'autostart')]
+    if os.environ.get('PUBLIC'):
+        candidates.append(os.path.join(os.environ['PUBLIC'], 'Desktop'))
+    if os.environ.get('APPDATA'):
+        candidates.append(os.path.join(os.environ['APPDATA'], 'Microsoft', 'Windows', 'Start Menu', 'Programs', 'Startup'))
+    if os.environ.get('PROGRAMDATA'):
+        candidates.append(os.path.join(os.environ['PROGRAMDATA'], 'Microsoft', 'Windows', 'Start Menu', 'Programs', 'StartUp'))
+    return [path for path in candidates if os.path.isdir(path)]
+
+
+def mounted_shares(mounts_file='/proc/mounts'):
+    shares = []
+    try:
+        with open(mounts_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 3 and fields[2] in SHARE_FILESYSTEMS:
+                    # /proc/mounts escapes spaces and tabs as octal.
+                    shares.append(fields[1].replace('\\040', ' ').replace('\\011', '\t'))
+    except OSError:
+        pass
+    return shares
+
+
+class WatchBackend:
+    # Source of filesystem change notifications. poll() waits at most timeout
+    # seconds and returns (path, kind) pairs, kind being 'file', 'dir' (a new
+    # subdirectory) or 'overflow' (events were lost; path is None).
+    def add(self, directory):
+        raise NotImplementedError
+
+    def poll(self, timeout):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InotifyBackend(WatchBackend):
+    # Linux inotify through libc via ctypes; one watch per directory.
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self.watches = {}
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux')
+
+    def add(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch failed: {os.strerror(errno)}", directory)
+        self.watches[wd] = directory
+
+    def poll(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], max(0, timeout))
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(buffer):
+            wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            name = buffer[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + name_length].rstrip(b'\x00')
+            offset += INOTIFY_EVENT.size + name_length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, 'overflow'))
+                continue
+            if mask & IN_IGNORED:
+                # The directory was removed or unmounted; the kernel dropped the watch.
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            events.append((path, 'dir' if mask & IN_ISDIR else 'file'))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingBackend(WatchBackend):
+    # Rescans directories every interval and reports shortcuts whose size or
+    # mtime changed. Used for network shares and where inotify is unavailable.
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.snapshots = {}
+        self.next_scan = 0.0
+
+    def add(self, directory):
+        self.snapshots[directory] = self.scan(directory)
+
+    @staticmethod
+    def scan(directory):
+        snapshot = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            snapshot[entry.path] = None
+                        elif is_shortcut(entry.name):
+                            stat_result = entry.stat()
+                            snapshot[entry.path] = (stat_result.st_size, stat_result.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return snapshot
+
+    def poll(self, timeout):
+        wait = self.next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(0, timeout))
+            return []
+        time.sleep(max(0, wait))
+        self.next_scan = time.monotonic() + self.interval
+
+        events = []
+        for directory, previous in list(self.snapshots.items()):
+            current = self.scan(directory)
+            for path, state in current.items():
+                if path not in previous or previous[path] != state:
+                    events.append((path, 'dir' if state is None else 'file'))
+            self.snapshots[directory] = current
+        return events
+
+
+class ShortcutWatcher:
+    # Pre-scans shortcuts as they appear so the click path finds a cached
+    # verdict. analyze is called with the path of every new or modified .lnk
+    # once it has been quiet for debounce seconds, e.g. LNKAnalysisService.prescan,
+    # which fills the verdict cache the click path looks up.
+    def __init__(self, analyze, directories=(), shares=(), debounce=DEBOUNCE_SECONDS,
+                 recursive=False, workers=1, initial_scan=True, backend=None, share_backend=None):
+        self.analyze = analyze
+        self.debounce = debounce
+        self.recursive = recursive
+        self.initial_scan = initial_scan
+        if backend is None:
+            backend = InotifyBackend() if InotifyBackend.available() else PollingBackend()
+        self.backend = backend
+        self.share_backend = share_backend if share_backend is not None else PollingBackend()
+        self.directories = []
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lnk-prescan')
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        for directory in directories:
+            self.watch(directory, self.backend)
+        for directory in shares:
+            self.watch(directory, self.share_backend)
+
+    def watch(self, directory, backend):
+        directory = os.path.abspath(directory)
+        try:
+            backend.add(directory)
+        except OSError as e:
+            print(f"Cannot watch {directory}: {e}", file=sys.stderr)
+            return
+        self.directories.append(directory)
+        if self.initial_scan:
+            self.schedule_existing(directory)
+        if self.recursive:
+            try:
+                subdirectories = [entry.path for entry in os.scandir(directory) if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                subdirectories = []
+            for subdirectory in subdirectories:
+                self.watch(subdirectory, backend)
+
+    def schedule_existing(self, directory):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if is_shortcut(entry.name) and entry.is_file():
+                        self.schedule(entry.path)
+        except OSError:
+            pass
+
+    def schedule(self, path):
+        # Every event pushes the deadline back, so a burst is analyzed once.
+        self.pending[path] = time.monotonic() + self.debounce
+
+    def handle_events(self, events, backend):
+        for path, kind in events:
+            metrics.count('lnk_watch_events_total', kind=kind)
+            if kind == 'overflow':
+                for directory in self.directories:
+                    self.schedule_existing(directory)
+            elif kind == 'dir':
+                if self.recursive and path not in self.directories:
+                    self.watch(path, backend)
+            elif is_shortcut(path):
+                self.schedule(path)
+
+    def dispatch_due(self):
+        now = time.monotonic()
+        due = [path for path, deadline in self.pending.items() if deadline <= now]
+        for path in due:
+            del self.pending[path]
+            self.executor.submit(self.prescan, path)
+
+    def prescan(self, path):
+        if not os.path.isfile(path):
+            return None
+        try:
+            verdict = self.analyze(path)
+        except Exception as e:
+            metrics.count('lnk_watch_errors_total')
+            print(f"Pre-scan failed for {path}: {e}", file=sys.stderr)
+            return None
+        metrics.count('lnk_watch_analyzed_total')
+        return verdict
+
+    def run(self):
+        while not self.stop_event.is_set():
+            timeout = 1.0
+            if self.pending:
+                timeout = max(0.0, min(self.pending.values()) - time.monotonic())
+            self.handle_events(self.backend.poll(min(timeout, 1.0)), self.backend)
+            if self.share_backend is not None:
+                self.handle_events(self.share_backend.poll(0), self.share_backend)
+            self.dispatch_due()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='lnk-watcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.executor.shutdown(wait=wait)
+        self.backend.close()
+        if self.share_backend is not None:
+            self.share_backend.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-scan shortcuts as they are dropped into watched folders')
+    parser.add_argument('directories', nargs='*', help='Directories to watch')
+    parser.add_argument('--defaults', action='store_true', help='Also watch desktops, downloads, startup folders and mounted shares')
+    parser.add_argument('--share', action='append', default=[], help='Network share to watch by polling (repeatable)')
+    parser.add_argument('--recursive', action='store_true', help='Watch subdirectories too')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS, help='Quiet seconds before a changed file is analyzed')
+    parser.add_argument('--whitelist', help='Whitelist database path')
+    parser.add_argument('--verdict-cache', help='Verdict cache database (default: the one main.py reads)')
+    parser.add_argument('--vt-api-key', default=None, help='VirusTotal API key')
+    args = parser.parse_args(argv)
+
+    from lnk_daemon import LNKAnalysisService
+
+    directories = list(args.directories)
+    shares = list(args.share)
+    if args.defaults:
+        directories += default_watch_dirs()
+        shares += mounted_shares()
+    if not directories and not shares:
+        parser.error('no directories to watch')
+
+    service = LNKAnalysisService(args.vt_api_key, args.whitelist, args.verdict_cache)
+
+    def analyze(path):
+        verdict = service.prescan(path)
+        print(f"{verdict.get('action', 'error')}\t{verdict.get('risk_score')}\t{path}", flush=True)
+        return verdict
+
+    watcher = ShortcutWatcher(analyze, directories, shares, debounce=args.debounce, recursive=args.recursive)
+    print(f"Watching {len(watcher.directories)} directories", flush=True)
+    watcher.start()
+    try:
+        while watcher.thread.is_alive():
+            watcher.thread.join(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop(wait=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
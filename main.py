@@ -1,58 +1,49 @@
 import os
 import sys
-import json
-import hashlib
 import datetime
 from time import sleep
-import winreg
-import win32com.client
-import win32gui
-import win32con
-import win32api
 import ctypes
-from pathlib import Path
-from analyze_lnk import LNKAnalyzer
+from file_digest import digest_file, file_hashes
+from whitelist_store import WhitelistStore, import_legacy_whitelist
+from lnk_client import request_verdict
+from verdict_cache import VerdictCache
+from analysis_metrics import metrics, run_profiled
 import shutil
-# pip install pywin32 requests jinja2 matplotlib numpy
+# pip install pywin32 requests jinja2
+# Only the stdlib is imported up front so a whitelisted double-click starts fast;
+# winreg/pywin32 and the analyzer (jinja2, requests) are imported where they are used.
 
 class WhitelistManager:
-    def __init__(self):
+    def __init__(self, whitelist_file=None):
         if getattr(sys, 'frozen', False):
             application_path = os.path.dirname(sys.executable)
         else:
             application_path = os.path.dirname(os.path.abspath(__file__))
             
-        self.whitelist_file = os.path.join(application_path, "whitelist.json")
+        self.whitelist_file = whitelist_file or os.path.join(application_path, "whitelist.db")
         print(f"화이트리스트 파일 경로: {self.whitelist_file}")
-        
-        if not os.path.exists(self.whitelist_file):
-            print(f"화이트리스트 파일이 없습니다. 새로 생성합니다: {self.whitelist_file}")
-            self.whitelist = {}
-            self.save_whitelist()
-        else:
-            self.whitelist = self.load_whitelist()
-
-    def load_whitelist(self):
         try:
-            if os.path.exists(self.whitelist_file):
-                with open(self.whitelist_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
+            self.whitelist = WhitelistStore(self.whitelist_file)
+            persistent = True
         except Exception as e:
-            print(f"화이트리스트 로딩 실패: {e}")
-            return {}
+            # Read-only app dir, locked or corrupt database: keep handling clicks
+            # with an empty whitelist instead of crashing before analysis.
+            print(f"화이트리스트 열기 실패, 빈 화이트리스트로 계속합니다: {e}")
+            self.whitelist = WhitelistStore(":memory:")
+            persistent = False
 
-    def save_whitelist(self):
-        try:
-            with open(self.whitelist_file, 'w', encoding='utf-8') as f:
-                json.dump(self.whitelist, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            print(f"화이트리스트 저장 실패: {e}")
+        legacy_file = os.path.join(os.path.dirname(self.whitelist_file), "whitelist.json")
+        # The legacy file is renamed after import, so only migrate into a store that persists.
+        if persistent and os.path.exists(legacy_file):
+            try:
+                count = import_legacy_whitelist(self.whitelist, legacy_file)
+                print(f"기존 화이트리스트 {count}개 항목을 가져왔습니다: {legacy_file}")
+            except Exception as e:
+                print(f"기존 화이트리스트 가져오기 실패: {e}")
 
     def calculate_hash(self, file_path):
         try:
-            with open(file_path, 'rb') as f:
-                return hashlib.sha256(f.read()).hexdigest()
+            return file_hashes(file_path)['sha256']
         except Exception as e:
             print(f"해시 계산 실패: {e}")
             return None
@@ -69,12 +60,7 @@ class WhitelistManager:
         try:
             file_hash = self.calculate_hash(file_path)
             if file_hash:
-                self.whitelist[file_hash] = {
-                    "path": file_path,
-                    "description": description,
-                    "added_date": str(datetime.datetime.now())
-                }
-                self.save_whitelist()
+                self.whitelist.add(file_hash, file_path, description, str(datetime.datetime.now()))
                 print(f"파일이 화이트리스트에 추가되었습니다: {file_path}")
                 return True
             return False
@@ -83,11 +69,22 @@ class WhitelistManager:
             return False
 
 class LNKHandler:
-    def __init__(self):
+    def __init__(self, use_daemon=True):
         self.whitelist_mgr = WhitelistManager()
-        self.shell = win32com.client.Dispatch("WScript.Shell")
+        self.shell = None
+        # use_daemon: ask a running lnk_daemon.py for the verdict before analyzing in-process
+        self.use_daemon = use_daemon
+
+    def get_shell(self):
+        if self.shell is None:
+            import win32com.client
+
+            self.shell = win32com.client.Dispatch("WScript.Shell")
+        return self.shell
 
     def setup_registry(self):
+        import winreg
+
         try:
             self.backup_registry()
             
@@ -123,6 +120,8 @@ class LNKHandler:
             return False
 
     def backup_registry(self):
+        import winreg
+
         try:
             with winreg.OpenKey(winreg.HKEY_CLASSES_ROOT, '.lnk', 0, winreg.KEY_READ) as key:
                 value = winreg.QueryValue(key, '')
@@ -132,6 +131,8 @@ class LNKHandler:
             print(f"레지스트리 백업 실패: {e}")
 
     def restore_registry_from_backup(self):
+        import winreg
+
         try:
             print("레지스트리 복원을 시도합니다.")
             if os.path.exists('registry_backup.txt'):
@@ -146,6 +147,8 @@ class LNKHandler:
             print(f"레지스트리 복원 실패: {e}")
 
     def restore_registry(self):
+        import winreg
+
         try:
             with winreg.CreateKey(winreg.HKEY_CLASSES_ROOT, '.lnk') as key:
                 winreg.SetValue(key, '', winreg.REG_SZ, 'lnkfile')
@@ -158,6 +161,8 @@ class LNKHandler:
             self.restore_registry_from_backup()
 
     def _delete_key_tree(self, key, key_name):
+        import winreg
+
         try:
             with winreg.OpenKey(key, key_name, 0, winreg.KEY_ALL_ACCESS) as opened_key:
                 while True:
@@ -189,7 +194,7 @@ class LNKHandler:
             except:
                 print(f"스크립트 디렉토리의 임시 LNKS 파일 실행 실패: {e}")
                 try:
-                    shortcut = self.shell.CreateShortCut(lnk_path)
+                    shortcut = self.get_shell().CreateShortCut(lnk_path)
                     target_path = shortcut.Targetpath
                     arguments = shortcut.Arguments
                     working_dir = shortcut.WorkingDirectory
@@ -221,13 +226,39 @@ class LNKHandler:
     def handle_lnk_file(self, lnk_path):
         try:
             print(f"LNK 파일 감지: {lnk_path}")
-            
-            if self.whitelist_mgr.is_whitelisted(lnk_path):
-                print("화이트리스트에 등록된 파일입니다.")
-                return self.execute_lnk(lnk_path)
-            
-            risk_score = LNKAnalyzer(lnk_path, " ").analyze()
+            verdict = request_verdict(lnk_path) if self.use_daemon else None
+
+            if verdict is not None:
+                if verdict['whitelisted']:
+                    print("화이트리스트에 등록된 파일입니다.")
+                    return self.execute_lnk(lnk_path)
+                risk_score = verdict['risk_score']
+                if verdict.get('report_path'):
+                    print(f"분석 보고서: {verdict['report_path']}")
+            else:
+                # Whitelist and verdict cache only need SHA-256; the other digests wait for analysis
+                if self.whitelist_mgr.is_whitelisted(lnk_path):
+                    print("화이트리스트에 등록된 파일입니다.")
+                    return self.execute_lnk(lnk_path)
+
+                verdict_cache = VerdictCache()
+                # A blocked verdict cached by a watcher pre-scan has no report; analyze again to render it.
+                cached = verdict_cache.get(file_hashes(lnk_path)['sha256'], report_above=4)
+                if cached is not None:
+                    print("캐시된 분석 결과를 사용합니다.")
+                    risk_score = cached['risk_score']
+                else:
+                    from analyze_lnk import LNKAnalyzer
+
+                    digest = digest_file(lnk_path)
+                    analyzer = LNKAnalyzer(lnk_path, " ", digest=digest)
+                    risk_score = analyzer.analyze()
+                    if risk_score is not None:
+                        verdict_cache.put_analyzer(analyzer)
             print(f"위험도 점수: {risk_score}")
+
+            import win32con
+            import win32gui
             
             if risk_score > 4:
                 win32gui.MessageBox(0, 
@@ -259,10 +290,26 @@ def is_admin():
         return False
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        lnk_path = sys.argv[1]
-        handler = LNKHandler()
-        handler.handle_lnk_file(lnk_path)
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('lnk_path', nargs='?')
+    parser.add_argument('--profile', help='cProfile 결과(pstats)를 저장할 파일 (데몬 없이 분석)')
+    parser.add_argument('--metrics-file', default=os.environ.get('LNK_METRICS_FILE'),
+                        help='Prometheus 텍스트 형식 지표를 저장할 파일')
+    args = parser.parse_args()
+
+    if args.lnk_path:
+        lnk_path = args.lnk_path
+        if args.profile:
+            handler = LNKHandler(use_daemon=False)
+            run_profiled(args.profile, handler.handle_lnk_file, lnk_path)
+            print(f"프로파일 저장: {args.profile}")
+        else:
+            handler = LNKHandler()
+            handler.handle_lnk_file(lnk_path)
+        if args.metrics_file:
+            metrics.write_prometheus(args.metrics_file)
     else:
         if not is_admin():
             print("관리자 권한이 필요합니다.")
@@ -0,0 +1,68 @@
+import os
+import sys
+import argparse
+
+PAGE_SIZE = 4096
+
+
+class RawSidecar:
+    # Binary file next to a report holding the full bytes of every raw section
+    # that was too large to inline. Each range is written once; the report refers
+    # to it by offset and length.
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.offsets = {}
+        # Buffers keyed by id() stay referenced while the sidecar is open, so a
+        # freed buffer's id can never be reused by a different one.
+        self.buffers = []
+        self.size = 0
+
+    def add(self, view):
+        key = (id(view.buffer), view.start, view.end)
+        offset = self.offsets.get(key)
+        if offset is None:
+            if self.file is None:
+                self.file = open(self.path, 'wb')
+            self.buffers.append(view.buffer)
+            offset = self.offsets[key] = self.size
+            self.size += self.file.write(memoryview(view.buffer)[view.start:view.end])
+        return offset
+
+    def close(self):
+        self.buffers = []
+        if self.file is not None:
+            self.file.close()
+        elif os.path.exists(self.path):
+            # Nothing overflowed this time; drop a sidecar left by an earlier report.
+            os.remove(self.path)
+
+
+def read_page(path, offset=0, length=PAGE_SIZE):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def format_page(data, offset=0, width=16):
+    lines = []
+    for start in range(0, len(data), width):
+        chunk = data[start:start + width]
+        text = ''.join(chr(b) if 32 <= b < 127 else '.' for b in chunk)
+        lines.append(f"{offset + start:08x}  {chunk.hex(' '):<{width * 3}} {text}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Page through raw data stored in a report sidecar file')
+    parser.add_argument('path', help='Sidecar .bin file written next to the report')
+    parser.add_argument('offset', nargs='?', type=lambda v: int(v, 0), default=0, help='Start offset (as shown in the report)')
+    parser.add_argument('length', nargs='?', type=lambda v: int(v, 0), default=PAGE_SIZE, help='Number of bytes to show')
+    args = parser.parse_args(argv)
+
+    print(format_page(read_page(args.path, args.offset, args.length), args.offset))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
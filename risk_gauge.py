@@ -0,0 +1,34 @@
+from functools import lru_cache
+
+# RdYlGn reversed: green for low risk through yellow to red for high risk.
+GRADIENT_STOPS = (
+    (0.0, '#006837'), (0.1, '#1a9850'), (0.2, '#66bd63'), (0.3, '#a6d96a'),
+    (0.4, '#d9ef8b'), (0.5, '#ffffbf'), (0.6, '#fee08b'), (0.7, '#fdae61'),
+    (0.8, '#f46d43'), (0.9, '#d73027'), (1.0, '#a50026'),
+)
+
+WIDTH = 600
+BAR_TOP = 30
+BAR_HEIGHT = 50
+
+
+def render_risk_gauge(risk_score):
+    return _render(round(min(max(float(risk_score), 0.0), 10.0), 1))
+
+
+@lru_cache(maxsize=None)
+def _render(score):
+    marker_x = score / 10 * WIDTH
+    anchor = 'start' if score < 1 else 'end' if score > 9 else 'middle'
+    stops = ''.join(f'<stop offset="{offset}" stop-color="{color}"/>' for offset, color in GRADIENT_STOPS)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{BAR_TOP + BAR_HEIGHT}" '
+        f'viewBox="0 0 {WIDTH} {BAR_TOP + BAR_HEIGHT}" role="img" aria-label="Risk Score: {score:g}/10">'
+        f'<defs><linearGradient id="risk-gradient">{stops}</linearGradient></defs>'
+        f'<rect x="0" y="{BAR_TOP}" width="{WIDTH}" height="{BAR_HEIGHT}" fill="url(#risk-gradient)"/>'
+        f'<line x1="{marker_x:.1f}" y1="{BAR_TOP}" x2="{marker_x:.1f}" y2="{BAR_TOP + BAR_HEIGHT}" '
+        f'stroke="black" stroke-width="2"/>'
+        f'<text x="{marker_x:.1f}" y="{BAR_TOP - 8}" text-anchor="{anchor}" '
+        f'font-family="Arial, sans-serif" font-size="14">Risk Score: {score:g}/10</text>'
+        f'</svg>'
+    )
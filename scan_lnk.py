@@ -0,0 +1,280 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from analyze_lnk import LNKAnalyzer
+from vt_lookup import get_client, vt_score
+from exporters import create_exporter, export_record, to_plain
+
+# Walked in --containers mode: shortcuts plus archive and disk image names.
+CONTAINER_EXTENSIONS = ('.lnk', '.zip', '.tar', '.tgz', '.gz', '.tbz2', '.bz2', '.txz', '.xz', '.iso', '.img')
+
+
+def iter_lnk_files(paths, containers=False):
+    # containers: also yield archives and disk images found while walking
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                            elif entry.is_file() and entry.name.lower().endswith(
+                                    CONTAINER_EXTENSIONS if containers else '.lnk'):
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"Skipping directory {directory}: {e}", file=sys.stderr)
+
+
+def _init_worker():
+    # LNKAnalyzer prints diagnostics to stdout, which may be the JSONL stream.
+    sys.stdout = sys.stderr
+
+
+def scan_file(path, include_structure=False, digest=None):
+    # VirusTotal is queried from the parent in batches, not per file here.
+    # digest: (data, hashes) of a buffer that is not a file on disk (container member)
+    analyzer = LNKAnalyzer(path, native=True, digest=digest)
+    risk_score = analyzer.analyze(report=False)
+    verdict = to_plain(export_record(analyzer, include_structure))
+    if risk_score is None:
+        verdict['risk_score'] = None
+        verdict['error'] = 'Analysis failed'
+    return verdict
+
+
+def error_verdict(path, message):
+    return {
+        'path': path,
+        'file_hashes': None,
+        'risk_score': None,
+        'suspicious': [],
+        'malicious': [],
+        'shell_link': {},
+        'vt_results': None,
+        'error': message
+    }
+
+
+def scan_path(path, include_structure=False, container_options=None):
+    # One input can hold many shortcuts: a container yields a verdict per member.
+    if container_options is not None:
+        from container_scan import ContainerScanner, MEMBER_READERS, sniff
+        kind = sniff(path)
+        if kind in MEMBER_READERS:
+            return ContainerScanner(include_structure=include_structure, **container_options).scan(path)
+        if kind is None and not path.lower().endswith('.lnk'):
+            # Walked in by its extension (.gz, .img) but not a container we read.
+            return []
+    return [scan_file(path, include_structure)]
+
+
+def drop_partial_line(output_path):
+    # An interrupted run can leave a half-written last verdict; cut it so the
+    # file is appended to on a line boundary and that file is rescanned.
+    with open(output_path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            chunk = f.read(step)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position != size:
+            f.truncate(position)
+
+
+def load_completed(output_path, fmt='jsonl'):
+    completed = set()
+    with open(output_path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            return {row['path'] for row in csv.DictReader(f) if row.get('path')}
+        for line in f:
+            try:
+                completed.add(json.loads(line)['path'])
+            except (ValueError, KeyError):
+                continue
+    return completed
+
+
+class ProgressMeter:
+    def __init__(self, enabled, interval=1.0):
+        self.enabled = enabled
+        self.interval = interval
+        self.count = 0
+        self.start = time.monotonic()
+        self.last = self.start
+
+    def update(self):
+        self.count += 1
+        if self.enabled and time.monotonic() - self.last >= self.interval:
+            self.report()
+
+    def report(self):
+        self.last = time.monotonic()
+        rate = self.count / max(self.last - self.start, 1e-9)
+        print(f"\r{self.count} files, {rate:.1f} files/sec", end='', file=sys.stderr, flush=True)
+
+    def finish(self):
+        if self.enabled:
+            self.report()
+            print(file=sys.stderr)
+
+
+def scan(paths, out, workers=None, ordered=False, completed=(), vt_api_key=None, progress=None,
+         exporter=None, include_structure=False, container_options=None):
+    # container_options: ContainerScanner limits; None leaves archives unscanned
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    progress = progress or ProgressMeter(False)
+    exporter = exporter or create_exporter('jsonl', out)
+
+    vt_client = get_client(vt_api_key) if vt_api_key else None
+    vt_pending = []
+
+    def write(verdict):
+        exporter.write(verdict)
+        progress.update()
+
+    def flush_vt():
+        hashes = [verdict['file_hashes']['sha256'] for verdict in vt_pending if verdict['file_hashes']]
+        results = vt_client.lookup_many(hashes) if hashes else {}
+        for verdict in vt_pending:
+            if verdict['file_hashes']:
+                verdict['vt_results'] = results[verdict['file_hashes']['sha256']]
+                if verdict['risk_score'] is not None:
+                    verdict['risk_score'] = min(10, verdict['risk_score'] + vt_score(verdict['vt_results']))
+            write(verdict)
+        vt_pending.clear()
+
+    def emit(verdicts):
+        for verdict in verdicts:
+            # Container members already written by a resumed run are dropped here.
+            if verdict['path'] in completed:
+                continue
+            if vt_client is None:
+                write(verdict)
+                continue
+            vt_pending.append(verdict)
+            if len(vt_pending) >= vt_client.batch_size:
+                flush_vt()
+
+    def collect(future):
+        # A file that crashes its worker (or a worker that dies) gets an error
+        # record instead of ending the scan.
+        path = submitted.pop(future)
+        try:
+            verdicts = future.result()
+        except Exception as e:
+            verdicts = [error_verdict(path, f"Worker failed: {e}")]
+        emit(verdicts)
+
+    containers = container_options is not None
+    files = (path for path in iter_lnk_files(paths, containers) if path not in completed)
+    submitted = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        in_flight = deque() if ordered else set()
+        for path in files:
+            future = executor.submit(scan_path, path, include_structure, container_options)
+            submitted[future] = path
+            if ordered:
+                in_flight.append(future)
+                while in_flight and (in_flight[0].done() or len(in_flight) >= max_in_flight):
+                    collect(in_flight.popleft())
+            else:
+                in_flight.add(future)
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for finished in done:
+                        collect(finished)
+
+        if ordered:
+            while in_flight:
+                collect(in_flight.popleft())
+        else:
+            for finished in wait(in_flight).done:
+                collect(finished)
+
+    if vt_client is not None:
+        flush_vt()
+    exporter.close()
+    progress.finish()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk LNK corpus scanner (one verdict per file)')
+    parser.add_argument('paths', nargs='+', help='Files or directory trees to scan')
+    parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    parser.add_argument('-f', '--format', choices=('jsonl', 'csv'), default='jsonl', help='Output format')
+    parser.add_argument('--structure', action='store_true', help='Include the parsed structure_info in JSONL verdicts')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--ordered', action='store_true', help='Emit verdicts in traversal order')
+    parser.add_argument('--resume', action='store_true', help='Skip files already present in the output file')
+    parser.add_argument('--progress', action='store_true', help='Show files/sec progress on stderr')
+    parser.add_argument('--vt-api-key', default=None, help='VirusTotal API key')
+    parser.add_argument('--containers', action='store_true',
+                        help='Also scan shortcuts inside ZIP, tar(.gz) and ISO9660 files, in memory')
+    parser.add_argument('--max-depth', type=int, default=3, help='Nested container depth limit (default: 3)')
+    parser.add_argument('--max-member-size', type=int, default=64 * 1024 * 1024,
+                        help='Largest container member read into memory, in bytes')
+    parser.add_argument('--max-container-size', type=int, default=1024 * 1024 * 1024,
+                        help='Bytes read from one container, nested ones included, before giving up')
+    args = parser.parse_args(argv)
+
+    completed = set()
+    if args.resume and args.output and os.path.exists(args.output):
+        drop_partial_line(args.output)
+        completed = load_completed(args.output, args.format)
+
+    if args.output:
+        out = open(args.output, 'a' if args.resume else 'w', encoding='utf-8', newline='')
+    else:
+        out = sys.stdout
+
+    if args.format == 'csv':
+        # A resumed file already starts with the header row.
+        exporter = create_exporter('csv', out, header=not (args.resume and out is not sys.stdout and out.tell()))
+    else:
+        exporter = create_exporter('jsonl', out)
+
+    container_options = None
+    if args.containers:
+        container_options = {
+            'max_depth': args.max_depth,
+            'max_member_size': args.max_member_size,
+            'max_total_size': args.max_container_size
+        }
+
+    try:
+        scan(args.paths, out, workers=args.workers, ordered=args.ordered, completed=completed,
+             vt_api_key=args.vt_api_key, progress=ProgressMeter(args.progress),
+             exporter=exporter, include_structure=args.structure,
+             container_options=container_options)
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with --resume to continue.", file=sys.stderr)
+        return 130
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that must not be loaded on the whitelisted click path.
+HEAVY_MODULES = ('analyze_lnk', 'generate_report', 'jinja2', 'requests', 'matplotlib', 'numpy',
+                 'win32com', 'win32gui', 'win32con')
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+import main
+hit = main.WhitelistManager({db!r}).is_whitelisted({path!r})
+elapsed = time.perf_counter() - start
+print("STARTUP_PROBE " + json.dumps({{
+    "hit": hit,
+    "elapsed_ms": elapsed * 1000,
+    "heavy_modules": sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def run_probe(lnk_path, db_path):
+    code = PROBE.format(root=ROOT, db=db_path, path=lnk_path, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True, encoding='utf-8')
+    wall_ms = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Probe failed: {proc.stderr.strip()}")
+
+    marker = next(line for line in proc.stdout.splitlines() if line.startswith('STARTUP_PROBE '))
+    result = json.loads(marker[len('STARTUP_PROBE '):])
+    result['wall_ms'] = wall_ms
+    result['imports'] = parse_importtime(proc.stderr)
+    return result
+
+
+def measure(lnk_path, runs=10):
+    with tempfile.TemporaryDirectory() as tmp:
+        sys.path.insert(0, ROOT)
+        import main
+
+        db_path = os.path.join(tmp, 'whitelist.db')
+        manager = main.WhitelistManager(db_path)
+        manager.add_to_whitelist(lnk_path, 'startup timing')
+        manager.whitelist.close()
+
+        results = [run_probe(lnk_path, db_path) for _ in range(runs)]
+
+    last = results[-1]
+    top_imports = sorted(last['imports'], key=lambda item: item[2], reverse=True)[:15]
+    return {
+        'runs': runs,
+        'whitelisted': all(result['hit'] for result in results),
+        'wall_ms_median': statistics.median(result['wall_ms'] for result in results),
+        'in_process_ms_median': statistics.median(result['elapsed_ms'] for result in results),
+        'import_ms_total': sum(item[1] for item in last['imports']) / 1000,
+        'heavy_modules': sorted({name for result in results for name in result['heavy_modules']}),
+        'top_imports': [{'module': name, 'cumulative_us': cumulative} for name, _, cumulative in top_imports],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cold-start timing of the whitelisted .lnk click path')
+    parser.add_argument('lnk_path', help='Shortcut to whitelist and probe')
+    parser.add_argument('-n', '--runs', type=int, default=10, help='Fresh interpreters to start')
+    parser.add_argument('-o', '--output', help='Append the summary as one JSON line to this file')
+    args = parser.parse_args(argv)
+
+    summary = measure(os.path.abspath(args.lnk_path), args.runs)
+    summary['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    print(f"Whitelisted: {summary['whitelisted']}")
+    print(f"Wall time (median of {summary['runs']}): {summary['wall_ms_median']:.1f} ms")
+    print(f"Import + lookup in process: {summary['in_process_ms_median']:.1f} ms")
+    print(f"Total import time: {summary['import_ms_total']:.1f} ms")
+    print(f"Heavy modules loaded: {', '.join(summary['heavy_modules']) or 'none'}")
+    for item in summary['top_imports']:
+        print(f"  {item['cumulative_us']:>8} us  {item['module']}")
+
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(summary) + '\n')
+    return 0 if not summary['heavy_modules'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+// Click a column header to sort the batch index by it; click again to reverse.
+document.querySelectorAll('table.sortable th').forEach(function (th, column) {
+    th.addEventListener('click', function () {
+        var table = th.closest('table');
+        var body = table.tBodies[0];
+        var numeric = th.dataset.type === 'number';
+        var descending = th.dataset.order !== 'desc';
+        table.querySelectorAll('th').forEach(function (other) { delete other.dataset.order; });
+        th.dataset.order = descending ? 'desc' : 'asc';
+
+        var rows = Array.prototype.slice.call(body.rows);
+        rows.sort(function (a, b) {
+            var x = a.cells[column].dataset.value || a.cells[column].textContent;
+            var y = b.cells[column].dataset.value || b.cells[column].textContent;
+            var result = numeric ? parseFloat(x) - parseFloat(y) : x.localeCompare(y);
+            return descending ? -result : result;
+        });
+        rows.forEach(function (row) { body.appendChild(row); });
+    });
+});
@@ -0,0 +1,119 @@
+import sqlite3
+import pytest
+import analyze_lnk
+from analyze_lnk import LNKAnalyzer
+from lnk_corpus import build_lnk
+
+SUSPICIOUS_ARGS = {'COMMAND_LINE_ARGUMENTS': 'powershell -enc AAAA'}
+ARGUMENT_FLAGS = ('HasArguments', 'IsUnicode')
+
+
+def shortcut(tmp_path, data, name='sample.lnk'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('where', ['client', 'lookup'])
+def test_virustotal_failure_keeps_local_analysis(tmp_path, monkeypatch, where):
+    def broken_client(api_key):
+        raise sqlite3.OperationalError('database is locked')
+
+    class BrokenClient:
+        def lookup(self, sha256):
+            raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(analyze_lnk, 'get_client', broken_client if where == 'client' else lambda key: BrokenClient())
+    path = shortcut(tmp_path, build_lnk(ARGUMENT_FLAGS, strings=SUSPICIOUS_ARGS))
+    analyzer = LNKAnalyzer(path, 'key', native=True)
+    assert analyzer.analyze(report=False) == 6
+    assert 'database is locked' in analyzer.vt_results['error']
+
+
+def test_out_of_range_filetime_is_exported_as_invalid(tmp_path):
+    from exporters import export_record, to_plain
+    data = bytearray(build_lnk())
+    # CreationTime far past what datetime can hold.
+    data[28:36] = b'\xff' * 8
+    analyzer = LNKAnalyzer(shortcut(tmp_path, bytes(data)), native=True)
+    assert analyzer.analyze(report=False) is not None
+    header = to_plain(export_record(analyzer))['structure_info']['Header']['Data']
+    assert header['CreationTime'] == 'Invalid'
+    assert header['WriteTime'].startswith('2021-01-01')
+
+
+def icon_findings(tmp_path, data):
+    analyzer = LNKAnalyzer(shortcut(tmp_path, data), native=True)
+    analyzer.analyze(report=False)
+    return [item for item in analyzer.suspicious if item.startswith('Icon mismatch')]
+
+
+@pytest.mark.parametrize('flag_names', [
+    # No target at all.
+    ('HasIconLocation', 'IsUnicode'),
+    # Only the relative path, ..\..\Windows\System32\notepad.exe.
+    ('HasRelativePath', 'HasIconLocation', 'IsUnicode'),
+])
+def test_icon_check_skips_targets_it_cannot_resolve(tmp_path, flag_names):
+    assert icon_findings(tmp_path, build_lnk(flag_names)) == []
+
+
+def test_icon_check_expands_environment_variables(tmp_path, monkeypatch):
+    data = build_lnk(('HasIconLocation', 'IsUnicode'), blocks=('EnvironmentVariableDataBlock',))
+    monkeypatch.delenv('windir', raising=False)
+    assert icon_findings(tmp_path, data) == []
+    # %windir%\system32\notepad.exe against C:\Windows\System32\notepad.exe
+    monkeypatch.setenv('windir', 'C:\\Windows')
+    assert icon_findings(tmp_path, data) == []
+
+
+def test_icon_check_compares_normalized_paths(tmp_path):
+    same = build_lnk(strings={'ICON_LOCATION': 'c:\\windows\\system32\\..\\System32\\NOTEPAD.EXE'})
+    assert icon_findings(tmp_path, same) == []
+    other = build_lnk(strings={'ICON_LOCATION': 'C:\\Windows\\System32\\shell32.dll'})
+    assert len(icon_findings(tmp_path, other)) == 1
+
+
+def test_kept_results_do_not_retain_the_file(tmp_path):
+    import tracemalloc
+    from file_digest import compute_digests, ANALYSIS_ALGORITHMS
+
+    def analyzed(name, data):
+        path = shortcut(tmp_path, data, name)
+        analyzer = LNKAnalyzer(path, native=True, digest=(data, compute_digests(data, ANALYSIS_ALGORITHMS)))
+        analyzer.analyze(report=False)
+        return analyzer
+
+    overlay = b'\x00' * (512 * 1024)
+    analyzed('warmup.lnk', build_lnk(overlay=overlay))
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        kept = [analyzed(f'{index}.lnk', build_lnk(overlay=overlay + bytes([index]))) for index in range(4)]
+        retained = (tracemalloc.get_traced_memory()[0] - start) / len(kept)
+    finally:
+        tracemalloc.stop()
+    # The 512 KB overlay is dropped; the structure and the overlay head remain.
+    assert retained < 32 * 1024
+    assert len(kept[0].result.buffer) < 2048
+    assert str(kept[0].structure_info['Overlay']['Head']) == '00' * 256
+
+
+@pytest.mark.parametrize('overlay_size', [64, 2 * 1024 * 1024])
+def test_overlay_is_flagged_and_mapping_closed(tmp_path, overlay_size):
+    from file_digest import DigestCache, INLINE_LIMIT, digest_file
+
+    plain = LNKAnalyzer(shortcut(tmp_path, build_lnk(), 'plain.lnk'), native=True)
+    base_score = plain.analyze(report=False)
+
+    path = shortcut(tmp_path, build_lnk(overlay=b'MZ' + b'\x90' * (overlay_size - 2)))
+    digest = digest_file(path, cache=DigestCache())
+    analyzer = LNKAnalyzer(path, native=True, digest=digest)
+    assert analyzer.analyze(report=False) == base_score + 2
+    assert f"Overlay detected: {overlay_size} bytes appended after the terminal block" in analyzer.suspicious
+    overlay = analyzer.structure_info['Overlay']
+    assert overlay['Size'] == overlay_size
+    assert str(overlay['Head']).startswith('4d5a90')
+    if overlay_size > INLINE_LIMIT:
+        # Large files are mapped, and the mapping is closed once the result is built.
+        assert digest[0].closed
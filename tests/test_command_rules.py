@@ -0,0 +1,50 @@
+import re
+import random
+from command_rules import CommandRuleMatcher, load_rules, RULES_FILE
+
+# The regexes check_suspicious_commands used before the automaton.
+LEGACY_PATTERNS = {
+    'powershell.*-enc': r'powershell.*-enc.*',
+    'powershell': r'powershell.*',
+    'cmd.*/c': r'cmd.*/c.*',
+    'rundll32.*,': r'rundll32.*,',
+    '%.*%.*%': r'%.*%.*%',
+    '\\\\.*\\.*$': r'\\\\.*\\.*\$',
+    'certutil.*-decode': r'certutil.*-decode',
+    'mshta.*http': r'mshta.*http',
+}
+
+
+def legacy_match(rules, text):
+    return [rule for rule in rules if re.search(LEGACY_PATTERNS[rule['pattern']], text, re.IGNORECASE)]
+
+
+def rule_list():
+    return load_rules(RULES_FILE).rules
+
+
+def test_tokens_match_in_order():
+    matcher = CommandRuleMatcher(rule_list())
+    descriptions = [rule['description'] for rule in matcher.match('PowerShell -NoP -Enc SQBFAFgA')]
+    assert descriptions == ['Encoded PowerShell command', 'PowerShell command']
+    assert matcher.match('-enc then powershell') == [rule_list()[1]]
+
+
+def test_rule_does_not_cross_newline():
+    matcher = CommandRuleMatcher(rule_list())
+    assert matcher.match('cmd\n/c whoami') == []
+    assert matcher.match('mshta\nhttp://x') == []
+    assert [rule['description'] for rule in matcher.match('x\ncmd /c whoami')] == ['Command prompt execution']
+    # A rule completed on an earlier line stays matched.
+    assert [rule['description'] for rule in matcher.match('cmd /c x\n')] == ['Command prompt execution']
+
+
+def test_matches_legacy_regexes():
+    rules = rule_list()
+    matcher = CommandRuleMatcher(rules)
+    alphabet = ['cmd', '/c', 'powershell', '-enc', 'rundll32', ',', '%', '\\', '$', 'certutil',
+                '-decode', 'mshta', 'http', ' ', 'a', '\n', 'CMD', 'PowerShell']
+    generator = random.Random(7)
+    for _ in range(5000):
+        text = ''.join(generator.choice(alphabet) for _ in range(generator.randint(0, 12)))
+        assert matcher.match(text) == legacy_match(rules, text), repr(text)
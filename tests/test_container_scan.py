@@ -0,0 +1,50 @@
+import io
+import gzip
+import tarfile
+import pytest
+import container_scan
+from container_scan import ContainerScanner, container_type, sniff
+from lnk_corpus import build_lnk
+
+
+def tarball(members, mode='w:gz'):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def scan(tmp_path, data, name='sample.tar.gz', **limits):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return ContainerScanner(**limits).scan(str(path))
+
+
+@pytest.mark.parametrize('mode', ['w', 'w:gz', 'w:bz2', 'w:xz'])
+def test_tarballs_are_recognized(tmp_path, mode):
+    verdicts = scan(tmp_path, tarball([('a.lnk', build_lnk())], mode))
+    assert [verdict['container_chain'][1:] for verdict in verdicts] == [['a.lnk']]
+    assert verdicts[0]['risk_score'] is not None
+
+
+def test_compressed_file_that_is_not_a_tarball(tmp_path):
+    data = gzip.compress(b'log line\n' * 1000)
+    assert container_type(data) is None
+    path = tmp_path / 'app.log.gz'
+    path.write_bytes(data)
+    assert sniff(str(path)) is None
+    assert scan(tmp_path, data, 'app.log.gz')[0]['error'] == 'Not a ZIP, tar or ISO9660 container'
+
+
+@pytest.mark.parametrize('skipped', ['not_a_shortcut.bin', 'oversized.lnk'])
+def test_skipped_tar_members_count_toward_the_total(tmp_path, skipped):
+    # Zeros compress to almost nothing but are still decompressed to get past them.
+    data = tarball([(skipped, b'\x00' * (4 * 1024 * 1024)), ('a.lnk', build_lnk())])
+    assert len(data) < 64 * 1024
+    verdicts = scan(tmp_path, data, max_member_size=1024 * 1024, max_total_size=2 * 1024 * 1024)
+    assert [verdict['path'] for verdict in verdicts if verdict['risk_score'] is not None] == []
+    assert any('total size limit' in (verdict.get('error') or '') for verdict in verdicts)
+
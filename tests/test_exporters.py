@@ -0,0 +1,71 @@
+import io
+import csv
+import json
+from datetime import datetime, date
+import pytest
+import exporters
+from exporters import create_exporter, dumps, encode_value, export_record, to_plain
+from hex_view import HexView
+from analyze_lnk import LNKAnalyzer
+from lnk_corpus import build_lnk
+
+BACKENDS = ['json', pytest.param('orjson', marks=pytest.mark.skipif(exporters.orjson is None,
+                                                                     reason='orjson not installed'))]
+
+
+def test_value_encodings():
+    data = bytes(range(16))
+    assert encode_value(HexView(data, 0, 4)) == '00010203'
+    # limit only shortens the report text; exports carry the full range
+    assert encode_value(HexView(data, 0, 16, limit=2)) == data.hex()
+    assert encode_value(HexView(data, 2, 4, fmt='Size: {} (34)')) == 'Size: 0203 (34)'
+    assert encode_value(b'\xde\xad') == 'dead'
+    assert encode_value(memoryview(b'\xbe\xef')) == 'beef'
+    assert encode_value(datetime(2021, 1, 1, 9, 30)) == '2021-01-01T09:30:00'
+    assert encode_value(date(2021, 1, 1)) == '2021-01-01'
+    assert to_plain({'flags': (1, 'Enabled'), 1: [HexView(data, 0, 1)]}) == {'flags': [1, 'Enabled'], '1': ['00']}
+
+
+@pytest.fixture
+def record(tmp_path):
+    path = tmp_path / 'sample.lnk'
+    path.write_bytes(build_lnk(('HasLinkInfo', 'HasArguments', 'IsUnicode'),
+                               strings={'COMMAND_LINE_ARGUMENTS': 'powershell -enc AAAA'}))
+    analyzer = LNKAnalyzer(str(path), native=True)
+    analyzer.analyze(report=False)
+    return export_record(analyzer)
+
+
+def test_exported_size_hex_matches_the_report(record):
+    plain = to_plain(record)
+    arguments = plain['structure_info']['StringData']['Data']['COMMAND_LINE_ARGUMENTS']
+    assert arguments['size_hex'] == 'Size: 1400 (20)'
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_agree(record, backend):
+    assert json.loads(dumps(record, backend)) == json.loads(dumps(record, 'json'))
+    assert json.loads(dumps(record, backend)) == to_plain(record)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_formats_carry_the_same_records(record, backend):
+    outputs = {}
+    for fmt in ('json', 'jsonl', 'csv'):
+        stream = io.StringIO()
+        exporter = create_exporter(fmt, stream, backend=backend)
+        exporter.write(record)
+        exporter.write(dict(record, path='second.lnk'))
+        exporter.close()
+        outputs[fmt] = stream.getvalue()
+
+    documents = json.loads(outputs['json'])
+    assert documents == [json.loads(line) for line in outputs['jsonl'].splitlines()]
+    assert documents[0] == to_plain(record)
+
+    rows = list(csv.DictReader(io.StringIO(outputs['csv'])))
+    assert [row['path'] for row in rows] == [record['path'], 'second.lnk']
+    assert rows[0]['arguments'] == 'powershell -enc AAAA'
+    assert rows[0]['risk_score'] == str(record['risk_score'])
+    assert rows[0]['sha256'] == record['file_hashes']['sha256']
+    assert rows[0]['suspicious'] == ' | '.join(record['suspicious'])
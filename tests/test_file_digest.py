@@ -0,0 +1,135 @@
+import io
+import os
+import hashlib
+import pytest
+from lnk_corpus import build_lnk
+from file_digest import (ANALYSIS_ALGORITHMS, CHUNK_SIZE, DEFAULT_ALGORITHMS, INLINE_LIMIT,
+                         PARALLEL_THRESHOLD, DigestCache, DigestEngine, digest_file, file_hashes,
+                         structure_hash)
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def shortcut(tmp_path):
+    path = tmp_path / 'sample.lnk'
+    path.write_bytes(b'A' * 4096)
+    return str(path)
+
+
+def rewrite(path, data, mtime_ns=None):
+    with open(path, 'r+b') as f:
+        f.write(data)
+        f.truncate()
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_unchanged_file_is_served_from_cache(shortcut):
+    cache = DigestCache()
+    data, hashes = digest_file(shortcut, cache)
+    again, cached = digest_file(shortcut, cache)
+    assert again is data
+    assert cached == hashes
+    assert len(cache.entries) == 1
+
+
+@pytest.mark.parametrize('lookup', [digest_file, file_hashes])
+def test_modified_content_invalidates_entry(shortcut, lookup):
+    cache = DigestCache()
+    lookup(shortcut, cache)
+    mtime_ns = os.stat(shortcut).st_mtime_ns
+    # Same size, only the modification time tells the versions apart.
+    rewrite(shortcut, b'B' * 4096, mtime_ns + 1_000_000_000)
+    result = lookup(shortcut, cache)
+    hashes = result[1] if isinstance(result, tuple) else result
+    assert hashes['sha256'] == sha256(b'B' * 4096)
+
+
+@pytest.mark.parametrize('lookup', [digest_file, file_hashes])
+def test_resized_file_invalidates_entry(shortcut, lookup):
+    cache = DigestCache()
+    lookup(shortcut, cache)
+    mtime_ns = os.stat(shortcut).st_mtime_ns
+    # Even with the old modification time restored, the size differs.
+    rewrite(shortcut, b'A' * 4097, mtime_ns)
+    result = lookup(shortcut, cache)
+    hashes = result[1] if isinstance(result, tuple) else result
+    assert hashes['sha256'] == sha256(b'A' * 4097)
+
+
+@pytest.mark.parametrize('lookup', [digest_file, file_hashes])
+def test_replaced_file_invalidates_entry(tmp_path, shortcut, lookup):
+    cache = DigestCache()
+    lookup(shortcut, cache)
+    before = os.stat(shortcut)
+    # Atomic replace with the same size and modification time: only the
+    # inode is different.
+    replacement = tmp_path / 'replacement.lnk'
+    replacement.write_bytes(b'C' * 4096)
+    os.utime(replacement, ns=(before.st_atime_ns, before.st_mtime_ns))
+    os.replace(replacement, shortcut)
+    after = os.stat(shortcut)
+    assert (after.st_size, after.st_mtime_ns) == (before.st_size, before.st_mtime_ns)
+    assert after.st_ino != before.st_ino
+
+    result = lookup(shortcut, cache)
+    hashes = result[1] if isinstance(result, tuple) else result
+    assert hashes['sha256'] == sha256(b'C' * 4096)
+
+
+SIZES = sorted({size + delta
+                for size in (PARALLEL_THRESHOLD, CHUNK_SIZE, INLINE_LIMIT, 2 * CHUNK_SIZE)
+                for delta in (-1, 0, 1)} | {0, 1})
+
+
+def payload(size):
+    return bytes(range(256)) * (size // 256) + bytes(size % 256)
+
+
+def expected(data, algorithms=DEFAULT_ALGORITHMS):
+    return {name: hashlib.new(name, data).hexdigest() for name in algorithms}
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_digest_buffer_matches_hashlib(size):
+    data = payload(size)
+    assert DigestEngine().digest_buffer(data) == expected(data)
+    assert DigestEngine().digest_buffer(memoryview(data)) == expected(data)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_digest_stream_matches_hashlib(size):
+    data = payload(size)
+    assert DigestEngine().digest_stream(io.BytesIO(data)) == expected(data)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_digest_stream_with_small_chunks(chunk_size):
+    # Many buffer swaps: each chunk is read while the previous one is hashed.
+    data = payload(3 * 4096 + 5)
+    engine = DigestEngine(chunk_size=chunk_size)
+    assert engine.digest_stream(io.BytesIO(data)) == expected(data)
+
+
+@pytest.mark.parametrize('size', [INLINE_LIMIT, INLINE_LIMIT + 1, 2 * CHUNK_SIZE + 1])
+def test_digest_file_matches_hashlib_across_the_mmap_limit(tmp_path, size):
+    path = tmp_path / 'sample.lnk'
+    data = payload(size)
+    path.write_bytes(data)
+    mapped, hashes = digest_file(str(path), DigestCache(), DEFAULT_ALGORITHMS)
+    assert isinstance(mapped, bytes) == (size <= INLINE_LIMIT)
+    assert hashes == expected(data)
+    assert file_hashes(str(path), DigestCache(), DEFAULT_ALGORITHMS) == expected(data)
+    if not isinstance(mapped, bytes):
+        mapped.close()
+
+
+def test_structural_digest_is_the_same_streamed_or_buffered():
+    data = build_lnk(blocks=('EnvironmentVariableDataBlock',), overlay=payload(CHUNK_SIZE + 1))
+    engine = DigestEngine(ANALYSIS_ALGORITHMS)
+    buffered = engine.digest_buffer(data)
+    assert engine.digest_stream(io.BytesIO(data), data) == buffered
+    assert buffered['lnkhash'] == structure_hash(data)
@@ -0,0 +1,91 @@
+from analyze_lnk import LNKAnalyzer
+from exporters import export_record, to_plain
+from generate_report import write_report, report_context
+from batch_report import BatchReport, render_detail
+from lnk_corpus import build_lnk
+
+PAYLOAD = '<script>alert(1)</script>'
+FLAGGED = {'COMMAND_LINE_ARGUMENTS': 'powershell -enc AAAA'}
+STRING_FLAGS = ('HasName', 'HasArguments', 'IsUnicode')
+
+
+def analyzed(tmp_path, name='sample.lnk', **kwargs):
+    path = tmp_path / name
+    path.write_bytes(build_lnk(**kwargs))
+    analyzer = LNKAnalyzer(str(path), native=True)
+    analyzer.analyze(report=False)
+    return analyzer
+
+
+def test_report_escapes_shortcut_strings(tmp_path):
+    analyzer = analyzed(tmp_path, flag_names=STRING_FLAGS, strings=dict(FLAGGED, NAME=PAYLOAD))
+    report_path = write_report(str(tmp_path / 'report.html'), report_context(analyzer))
+    html = open(report_path, encoding='utf-8').read()
+    assert PAYLOAD not in html
+    assert '&lt;script&gt;alert(1)&lt;/script&gt;' in html
+    # The generated gauge is still inline SVG.
+    assert '<svg xmlns="http://www.w3.org/2000/svg"' in html
+
+
+def test_batch_detail_page_escapes_shortcut_strings(tmp_path):
+    analyzer = analyzed(tmp_path, flag_names=STRING_FLAGS, strings=dict(FLAGGED, NAME=PAYLOAD))
+    output_dir = tmp_path / 'batch'
+    report = BatchReport(str(output_dir))
+    report.write(to_plain(export_record(analyzer)))
+    index = open(report.close(), encoding='utf-8').read()
+    detail = open(render_detail(str(output_dir), analyzer.file_hashes['sha256']), encoding='utf-8').read()
+    assert PAYLOAD not in index
+    assert PAYLOAD not in detail
+
+
+def test_oversized_strings_are_truncated(tmp_path):
+    from lnk_corpus import shim_block
+
+    # StringData lengths are 16-bit; the ShimDataBlock layer name is only bounded by BlockSize.
+    analyzer = analyzed(tmp_path, flag_names=STRING_FLAGS + ('RunWithShimLayer',),
+                        strings=dict(FLAGGED, NAME='N' * 60000), blocks=(shim_block('L' * 2000000),))
+    report_path = write_report(str(tmp_path / 'report.html'), report_context(analyzer))
+    html = open(report_path, encoding='utf-8').read()
+    assert len(html) < 200000
+    assert html.count('[truncated, 60000 chars]') == 1
+    assert html.count('[truncated, 2000000 chars]') == 1
+
+
+def test_sidecar_keeps_distinct_json_ranges(tmp_path):
+    from raw_sidecar import RawSidecar, read_page
+    from generate_report import RawDataPager
+
+    sidecar = RawSidecar(str(tmp_path / 'report.bin'))
+    pager = RawDataPager(sidecar, {'ExtraData': 16})
+    first = pager((b'\x01' * 6000).hex(), 'ExtraData')
+    second = pager((b'\x02' * 6000).hex(), 'ExtraData')
+    sidecar.close()
+    assert (first['offset'], second['offset']) == (0, 6000)
+    assert read_page(sidecar.path, second['offset'], 6000) == b'\x02' * 6000
+
+
+def test_only_raw_fields_are_read_as_hex(tmp_path):
+    from raw_sidecar import RawSidecar
+    from generate_report import RawDataPager
+
+    pager = RawDataPager(RawSidecar(str(tmp_path / 'report.bin')), {'ExtraData': 4096})
+    parsed = {'layer_name': 'deadbeef', 'known_folder_id': 'deadbeef'}
+    assert pager.bounded(parsed, 'ExtraData') == {'layer_name': 'deadbeef', 'known_folder_id': 'deadbeef'}
+    # A hex-looking string outside a raw field is text and is capped as text.
+    capped = pager.bounded({'layer_name': 'ab' * 5000}, 'ExtraData')['layer_name']
+    assert capped.endswith('... [truncated, 10000 chars]')
+    raw = pager.bounded({'known_folder_id': 'ab' * 5000}, 'ExtraData')['known_folder_id']
+    assert 'sidecar offset' in raw
+
+
+def test_batch_report_lists_only_alerting_files(tmp_path):
+    output_dir = tmp_path / 'batch'
+    report = BatchReport(str(output_dir))
+    clean = analyzed(tmp_path, 'clean.lnk')
+    flagged = analyzed(tmp_path, 'flagged.lnk', flag_names=STRING_FLAGS, strings=FLAGGED)
+    for analyzer in (clean, flagged):
+        report.write(to_plain(export_record(analyzer)))
+    report.close()
+    assert [entry['path'] for entry in report.entries] == [flagged.lnk_path]
+    assert report.unlisted == 1
+    assert render_detail(str(output_dir), clean.file_hashes['sha256']) is None
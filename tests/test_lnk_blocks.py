@@ -0,0 +1,48 @@
+import struct
+from lnk_blocks import BLOCK_DECODERS
+from lnk_corpus import tracker_block, console_block, known_folder_block, property_store_block, shim_block
+
+TRACKER = 0xA0000003
+CONSOLE = 0xA0000002
+KNOWN_FOLDER = 0xA000000B
+PROPERTY_STORE = 0xA0000009
+
+
+def parse(block, size=None, trailer=b''):
+    # Decode block with its BlockSize optionally rewritten, followed by more file data.
+    size = len(block) if size is None else size
+    data = struct.pack('<I', size) + block[4:] + trailer
+    return BLOCK_DECODERS.parse(struct.unpack_from('<I', block, 4)[0], data, 8, min(size, len(data)))
+
+
+def test_complete_block_decodes():
+    parsed = parse(tracker_block())
+    assert parsed['type'] == 'TrackerDataBlock'
+    assert parsed['machine_id'] == 'desktop-01'
+    assert parsed['birth_droid_file_id'] == '{13121110-1514-1716-1819-1A1B1C1D1E1F}'
+
+
+def test_lying_block_size_does_not_read_the_next_block():
+    next_block = shim_block()
+    for block in (tracker_block(), console_block(), known_folder_block()):
+        parsed = parse(block, size=len(block) - 8, trailer=next_block)
+        assert parsed['type'] == 'Error'
+        assert parsed['error'].startswith('Block too short')
+
+
+def test_truncated_property_value_stays_inside_the_block():
+    block = property_store_block()
+    parsed = parse(block, size=len(block) - 30, trailer=b'\xff' * 64)
+    assert parsed['type'] == 'PropertyStoreDataBlock'
+    first, second = parsed['storages']
+    assert [prop['value'] for prop in first['properties']] == ['Title', 'Author']
+    # The cut-off value is reported, not filled in from the bytes after the block.
+    assert second['properties'] == []
+    assert second['error'].startswith('Block too short')
+
+
+def test_property_storage_header_past_block_end():
+    block = property_store_block()
+    parsed = parse(block, size=8 + 12, trailer=block[8:])
+    assert parsed['storages'] == []
+    assert parsed['error'].startswith('Block too short')
@@ -0,0 +1,133 @@
+import os
+import json
+import socket
+import threading
+import pytest
+import lnk_client
+import lnk_daemon
+from lnk_corpus import build_lnk
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='Unix sockets required')
+
+
+@pytest.fixture
+def service(tmp_path):
+    return lnk_daemon.LNKAnalysisService(whitelist_file=str(tmp_path / 'whitelist.db'),
+                                         verdict_cache_file=str(tmp_path / 'verdicts.db'))
+
+
+@pytest.fixture
+def private_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'run'
+    directory.mkdir(mode=0o700)
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+    return directory
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def shutdown(server, thread):
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def shortcut(tmp_path, name='sample.lnk', **kwargs):
+    path = tmp_path / name
+    path.write_bytes(build_lnk(**kwargs))
+    return str(path)
+
+
+def test_unix_socket_round_trip(tmp_path, service, private_dir):
+    address = str(private_dir / 'daemon.sock')
+    server = lnk_daemon.create_server(service, address)
+    thread = serve(server)
+    try:
+        assert os.stat(address).st_mode & 0o777 == 0o600
+        assert lnk_client.send_request({'op': 'ping'}, address) == {'ok': True}
+
+        clean = shortcut(tmp_path)
+        verdict = lnk_client.request_verdict(clean, address)
+        assert verdict['path'] == clean
+        assert verdict['whitelisted'] is False
+        assert verdict['action'] == 'prompt'
+
+        flagged = shortcut(tmp_path, 'flagged.lnk', flag_names=('HasArguments', 'IsUnicode'),
+                           strings={'COMMAND_LINE_ARGUMENTS': 'powershell -enc AAAA'})
+        verdict = lnk_client.request_verdict(flagged, address)
+        assert verdict['risk_score'] > lnk_daemon.BLOCK_THRESHOLD
+        assert verdict['action'] == 'block'
+        # Served from the verdict cache the second time.
+        assert lnk_client.request_verdict(flagged, address)['risk_score'] == verdict['risk_score']
+
+        # Whitelisting is not part of the wire protocol.
+        assert 'error' in lnk_client.send_request({'op': 'whitelist_add', 'path': clean}, address)
+    finally:
+        shutdown(server, thread)
+
+
+def test_socket_outside_private_dir_is_refused(tmp_path, service):
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o777)
+    os.chmod(shared, 0o777)
+    with pytest.raises(PermissionError):
+        lnk_daemon.create_server(service, str(shared / 'daemon.sock'))
+    assert lnk_client.request_verdict(shortcut(tmp_path), str(shared / 'daemon.sock')) is None
+
+
+def test_tcp_requests_and_replies_are_signed(tmp_path, service, private_dir):
+    server = lnk_daemon.create_server(service, ('127.0.0.1', 0))
+    thread = serve(server)
+    address = server.server_address
+    try:
+        assert lnk_client.send_request({'op': 'ping'}, address) == {'ok': True}
+
+        # A caller without the token is turned away.
+        with socket.create_connection(address) as sock:
+            sock.sendall(json.dumps({'op': 'verdict', 'path': shortcut(tmp_path)}).encode() + b'\n')
+            reply = json.loads(sock.makefile('rb').readline())
+        assert reply == {'error': 'Unauthenticated request'}
+    finally:
+        shutdown(server, thread)
+
+
+def test_spoofed_tcp_reply_is_rejected(tmp_path, private_dir):
+    # A process squatting on the port cannot forge a whitelisted verdict.
+    lnk_daemon.write_endpoint(0, 'ab' * 32)
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def answer():
+        conn, _ = listener.accept()
+        with conn:
+            request = json.loads(conn.makefile('rb').readline())
+            conn.sendall(json.dumps({'path': request['path'], 'whitelisted': True, 'nonce': request['nonce'],
+                                     'mac': '0' * 64}).encode() + b'\n')
+
+    thread = threading.Thread(target=answer, daemon=True)
+    thread.start()
+    try:
+        assert lnk_client.request_verdict(shortcut(tmp_path), listener.getsockname()) is None
+    finally:
+        thread.join()
+        listener.close()
+
+
+def test_click_verdict_renders_the_report_a_prescan_skipped(tmp_path, service):
+    flagged = shortcut(tmp_path, 'flagged.lnk', flag_names=('HasArguments', 'IsUnicode'),
+                       strings={'COMMAND_LINE_ARGUMENTS': 'powershell -enc AAAA'})
+    prescan = service.prescan(flagged)
+    assert prescan['action'] == 'block'
+    assert prescan['report_path'] is None
+    assert not (tmp_path / 'flagged_analysis_report.html').exists()
+
+    # The cached pre-scan verdict has no report, so the click analyzes again and renders one.
+    verdict = service.verdict(flagged)
+    assert verdict['report_path'] == str(tmp_path / 'flagged_analysis_report.html')
+    assert os.path.exists(verdict['report_path'])
+    assert service.verdict(flagged)['report_path'] == verdict['report_path']
@@ -0,0 +1,105 @@
+import os
+import time
+import pytest
+from lnk_watcher import ShortcutWatcher, PollingBackend, InotifyBackend
+
+DEBOUNCE = 0.1
+
+BACKENDS = [
+    pytest.param(lambda: PollingBackend(interval=0), id='polling'),
+    pytest.param(InotifyBackend, id='inotify',
+                 marks=pytest.mark.skipif(not InotifyBackend.available(), reason='Linux inotify required')),
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, path):
+        self.calls.append(os.path.basename(path))
+        return {'path': path}
+
+
+@pytest.fixture(params=BACKENDS)
+def make_watcher(request, tmp_path):
+    watchers = []
+
+    def make(**kwargs):
+        recorder = Recorder()
+        kwargs.setdefault('backend', request.param())
+        watcher = ShortcutWatcher(recorder, [str(tmp_path)], debounce=DEBOUNCE,
+                                  share_backend=PollingBackend(interval=0), **kwargs)
+        watchers.append(watcher)
+        return watcher, recorder
+
+    yield make
+    for watcher in watchers:
+        watcher.stop()
+
+
+def pump(watcher, seconds=DEBOUNCE * 3, drain=True):
+    # Runs the watcher loop in this thread, by default until every pending
+    # path has been dispatched and analyzed.
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline or (drain and watcher.pending):
+        watcher.handle_events(watcher.backend.poll(0.02), watcher.backend)
+        watcher.dispatch_due()
+    watcher.executor.submit(lambda: None).result()
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_existing_shortcuts_are_scanned_once(tmp_path, make_watcher):
+    write(tmp_path / 'a.lnk', b'L' * 10)
+    write(tmp_path / 'notes.txt', b'x')
+    watcher, recorder = make_watcher()
+    pump(watcher)
+    assert recorder.calls == ['a.lnk']
+
+
+def test_burst_of_writes_is_analyzed_once(tmp_path, make_watcher):
+    watcher, recorder = make_watcher(initial_scan=False)
+    path = tmp_path / 'a.lnk'
+    with open(path, 'wb') as f:
+        for _ in range(3):
+            f.write(b'L' * 100)
+            f.flush()
+            pump(watcher, DEBOUNCE / 4, drain=False)
+    pump(watcher)
+    assert recorder.calls == ['a.lnk']
+
+
+def test_each_change_gets_one_callback(tmp_path, make_watcher):
+    watcher, recorder = make_watcher(initial_scan=False)
+    write(tmp_path / 'a.lnk', b'L' * 10)
+    pump(watcher)
+    write(tmp_path / 'a.lnk', b'L' * 20)
+    pump(watcher)
+    # A finished download renamed into place.
+    write(tmp_path / 'b.lnk.part', b'L' * 10)
+    os.rename(tmp_path / 'b.lnk.part', tmp_path / 'b.lnk')
+    pump(watcher)
+    assert recorder.calls == ['a.lnk', 'a.lnk', 'b.lnk']
+
+
+def test_new_subdirectory_is_watched_when_recursive(tmp_path, make_watcher):
+    watcher, recorder = make_watcher(initial_scan=False, recursive=True)
+    (tmp_path / 'sub').mkdir()
+    pump(watcher)
+    assert str(tmp_path / 'sub') in watcher.directories
+    write(tmp_path / 'sub' / 'c.lnk', b'L' * 10)
+    pump(watcher)
+    assert recorder.calls == ['c.lnk']
+
+
+def test_overflow_rescans_every_directory(tmp_path, make_watcher):
+    watcher, recorder = make_watcher(initial_scan=False)
+    write(tmp_path / 'a.lnk', b'L' * 10)
+    pump(watcher)
+    watcher.handle_events([(None, 'overflow')], watcher.backend)
+    pump(watcher)
+    assert recorder.calls == ['a.lnk', 'a.lnk']
@@ -0,0 +1,32 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import scan_lnk
+from lnk_corpus import build_lnk
+
+
+@pytest.mark.parametrize('ordered', [False, True])
+def test_failed_worker_becomes_an_error_record(tmp_path, monkeypatch, ordered):
+    paths = []
+    for name in ('a.lnk', 'b.lnk', 'c.lnk'):
+        (tmp_path / name).write_bytes(build_lnk())
+        paths.append(str(tmp_path / name))
+    scan_path = scan_lnk.scan_path
+
+    def flaky(path, *args):
+        if path.endswith('b.lnk'):
+            raise MemoryError('worker ran out of memory')
+        return scan_path(path, *args)
+
+    # Threads share the patched scan_path; worker processes would not.
+    monkeypatch.setattr(scan_lnk, 'ProcessPoolExecutor', lambda max_workers, initializer: ThreadPoolExecutor(max_workers))
+    monkeypatch.setattr(scan_lnk, 'scan_path', flaky)
+    out = io.StringIO()
+    scan_lnk.scan(paths, out, workers=2, ordered=ordered)
+
+    verdicts = {verdict['path']: verdict for verdict in map(json.loads, out.getvalue().splitlines())}
+    assert sorted(verdicts) == paths
+    assert verdicts[paths[1]]['risk_score'] is None
+    assert verdicts[paths[1]]['error'] == 'Worker failed: worker ran out of memory'
+    assert verdicts[paths[0]]['risk_score'] is not None
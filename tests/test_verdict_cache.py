@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+import pytest
+from verdict_cache import VerdictCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = VerdictCache(str(tmp_path / 'verdicts.db'))
+    yield cache
+    cache.close()
+
+
+def analyzer(vt_results, vt_api_key='key', sha256='a' * 64):
+    return SimpleNamespace(file_hashes={'sha256': sha256}, risk_score=6, suspicious=['x'], malicious=[],
+                           report_path=None, vt_results=vt_results, vt_api_key=vt_api_key)
+
+
+@pytest.mark.parametrize('vt_results', [
+    {'pending': True, 'message': 'VirusTotal lookup exceeded the 2.0s deadline'},
+    {'error': 'API request failed with status code 204'},
+    {'error': 'VirusTotal lookup failed: database is locked'},
+])
+def test_unfinished_virustotal_lookups_are_not_cached(cache, vt_results):
+    assert cache.put_analyzer(analyzer(vt_results)) is False
+    assert cache.get('a' * 64) is None
+
+
+@pytest.mark.parametrize('vt_results, vt_api_key', [
+    ({'found': False, 'message': 'File not found in VirusTotal'}, 'key'),
+    ({'error': 'No VirusTotal API key provided'}, None),
+])
+def test_finished_verdicts_are_cached(cache, vt_results, vt_api_key):
+    assert cache.put_analyzer(analyzer(vt_results, vt_api_key)) is True
+    assert cache.get('a' * 64)['risk_score'] == 6
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Distinct last_access values without sleeping.
+    ticks = iter(range(1, 1000000))
+    monkeypatch.setattr('verdict_cache.time.time', lambda: next(ticks))
+
+
+def count(cache):
+    return cache.conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+
+def test_least_recently_used_verdicts_are_evicted(tmp_path, clock):
+    cache = VerdictCache(str(tmp_path / 'verdicts.db'), max_entries=3, evict_interval=1)
+    for sha256 in 'abc':
+        cache.put(sha256, 1, [], [])
+    assert cache.get('a') is not None
+    cache.put('d', 1, [], [])
+    assert count(cache) == 3
+    assert cache.get('b') is None
+    assert [cache.get(sha256) is not None for sha256 in 'acd'] == [True, True, True]
+    cache.close()
+
+
+def test_eviction_runs_every_interval(tmp_path, clock):
+    cache = VerdictCache(str(tmp_path / 'verdicts.db'), max_entries=2, evict_interval=4)
+    for sha256 in 'abc':
+        cache.put(sha256, 1, [], [])
+    assert count(cache) == 3
+    cache.put('d', 1, [], [])
+    assert count(cache) == 2
+    assert cache.get('c') is not None and cache.get('d') is not None
+    cache.close()
+
+
+def test_verdicts_from_another_ruleset_are_not_served(tmp_path):
+    path = str(tmp_path / 'verdicts.db')
+    old = VerdictCache(path, version='3:rules-a')
+    old.put('a', 6, ['x'], [])
+    old.put('b', 6, ['x'], [])
+    old.close()
+
+    cache = VerdictCache(path, version='3:rules-b')
+    assert cache.get('a') is None
+    assert cache.purge_stale() == 1
+    assert count(cache) == 0
+    cache.close()
+
+
+def test_native_and_com_verdicts_are_kept_apart(tmp_path):
+    path = str(tmp_path / 'verdicts.db')
+    com = VerdictCache(path)
+    com.put('a', 2, ['Icon mismatch detected'], [])
+    native = VerdictCache(path, native=True)
+    assert native.version != com.version
+    assert native.get('a') is None
+    com.close()
+    native.close()
@@ -0,0 +1,137 @@
+import json
+import time
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import pytest
+from vt_lookup import VirusTotalClient, VTCache, TokenBucket, SharedTokenBucket, vt_score
+
+
+class StubVirusTotal(BaseHTTPRequestHandler):
+    # /vtapi/v2/file/report stand-in: hashes starting with 'bad' are detected,
+    # 'slow' ones stall past the client timeout, the rest are unknown.
+    def do_GET(self):
+        resources = parse_qs(urlparse(self.path).query)['resource'][0].split(',')
+        self.server.requests.append(resources)
+        if any(resource.startswith('slow') for resource in resources):
+            time.sleep(1.0)
+        items = []
+        for resource in resources:
+            if resource.startswith('bad'):
+                items.append({'resource': resource, 'response_code': 1, 'positives': 6, 'total': 70})
+            else:
+                items.append({'resource': resource, 'response_code': 0})
+        body = json.dumps(items if len(items) > 1 else items[0]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubVirusTotal)
+    server.daemon_threads = True
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def client_for(stub, tmp_path, **kwargs):
+    url = f"http://127.0.0.1:{stub.server_address[1]}/vtapi/v2/file/report"
+    kwargs.setdefault('requests_per_minute', None)
+    return VirusTotalClient('key', cache_path=str(tmp_path / 'vt.db'), base_url=url, **kwargs)
+
+
+def test_lookups_are_batched_and_cached(stub, tmp_path):
+    client = client_for(stub, tmp_path)
+    hashes = [f"bad{index}" for index in range(3)] + [f"clean{index}" for index in range(7)]
+    results = client.lookup_many(hashes)
+
+    assert [len(batch) for batch in stub.requests] == [4, 4, 2]
+    assert results['bad1'] == {'found': True, 'positives': 6, 'total': 70, 'scan_date': '', 'permalink': ''}
+    assert vt_score(results['bad1']) == 3
+    assert results['clean5'] == {'found': False, 'message': 'File not found in VirusTotal'}
+
+    # Repeats are answered from the cache without another request.
+    assert client.lookup('bad2') == results['bad2']
+    assert client.lookup_many(hashes) == results
+    assert len(stub.requests) == 3
+
+
+def test_requests_are_rate_limited(stub, tmp_path):
+    client = client_for(stub, tmp_path, batch_size=1)
+    client.limiter = TokenBucket(rate=10, capacity=1)
+    started = time.monotonic()
+    client.lookup_many(['clean0', 'clean1', 'clean2'])
+    # One request in the burst, then one every 100 ms.
+    assert time.monotonic() - started >= 0.18
+    assert len(stub.requests) == 3
+
+
+def test_token_bucket_allows_bursts():
+    bucket = TokenBucket(rate=1, capacity=3)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.1
+
+
+def drain_bucket(db_path, count):
+    cache = VTCache(db_path)
+    bucket = SharedTokenBucket(cache, 'quota', rate=0.01, capacity=count)
+    for _ in range(count):
+        bucket.acquire()
+    cache.close()
+
+
+def test_token_bucket_is_shared_between_processes(tmp_path):
+    db_path = str(tmp_path / 'vt.db')
+    process = multiprocessing.get_context('spawn').Process(target=drain_bucket, args=(db_path, 2))
+    process.start()
+    process.join(60)
+    assert process.exitcode == 0
+
+    # A new process does not start with a full bucket of its own: the next
+    # token is about 100 s away.
+    cache = VTCache(db_path)
+    assert cache.take_token('quota', 0.01, 2) > 90
+    cache.close()
+
+
+def test_shared_bucket_waits_for_the_refill(tmp_path):
+    cache = VTCache(str(tmp_path / 'vt.db'))
+    bucket = SharedTokenBucket(cache, 'quota', rate=10, capacity=1)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.18
+    cache.close()
+
+
+def test_clients_with_one_key_share_the_quota(stub, tmp_path):
+    first = client_for(stub, tmp_path, requests_per_minute=2, batch_size=1)
+    first.lookup_many(['clean0', 'clean1'])
+    second = client_for(stub, tmp_path, requests_per_minute=2)
+    assert isinstance(second.limiter, SharedTokenBucket)
+    assert second.cache.take_token(second.limiter.name, second.limiter.rate, 2) > 25
+    # Other keys have their own quota.
+    other = VirusTotalClient('other', cache_path=str(tmp_path / 'vt.db'), requests_per_minute=2)
+    assert other.cache.take_token(other.limiter.name, other.limiter.rate, 2) == 0
+
+
+def test_timeout_is_an_uncached_error(stub, tmp_path):
+    client = client_for(stub, tmp_path, timeout=0.2)
+    result = client.lookup('slow0')
+    assert result['error'].startswith('API request failed')
+    assert client.cache.get('slow0') is None
+    assert vt_score(result) == 0
@@ -0,0 +1,90 @@
+import json
+import multiprocessing
+import os
+import pytest
+from whitelist_store import WhitelistStore, import_legacy_whitelist
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'whitelist.db')
+
+
+def add_entries(db_path, worker, count):
+    store = WhitelistStore(db_path)
+    for index in range(count):
+        store.add(f"{worker:02d}{index:062d}", f"C:\\w{worker}\\{index}.lnk", "approved")
+    store.close()
+
+
+def test_concurrent_processes_lose_no_writes(db_path):
+    WhitelistStore(db_path).close()
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=add_entries, args=(db_path, worker, 50)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    store = WhitelistStore(db_path)
+    assert len(store) == 200
+    assert store.conn.execute("SELECT value FROM meta WHERE key = 'writes'").fetchone()[0] == 200
+    store.close()
+
+
+def test_compact_runs_every_interval(db_path, monkeypatch):
+    store = WhitelistStore(db_path, compact_interval=3)
+    calls = []
+    monkeypatch.setattr(store, 'compact', lambda: calls.append(len(store)))
+    for index in range(7):
+        store.add(f"{index:064d}", f"{index}.lnk")
+    assert calls == [3, 6]
+    store.close()
+
+
+def test_compact_vacuums_freed_pages(db_path):
+    store = WhitelistStore(db_path, compact_interval=0)
+    for index in range(300):
+        store.add(f"{index:064d}", f"{index}.lnk", 'x' * 2000)
+    for index in range(300):
+        store.remove(f"{index:064d}")
+    assert store.conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+
+    # The next add is write number 601 and triggers compaction.
+    store.compact_interval = 601
+    store.add('f' * 64, 'kept.lnk')
+    assert store.conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert 'f' * 64 in store
+    store.close()
+
+
+def legacy_file(tmp_path, entries):
+    path = tmp_path / 'whitelist.json'
+    path.write_text(json.dumps(entries), encoding='utf-8')
+    return str(path)
+
+
+def test_import_json_keeps_existing_entries(tmp_path, db_path):
+    store = WhitelistStore(db_path)
+    store.add('a' * 64, 'C:\\new.lnk', 'added after the legacy file')
+    path = legacy_file(tmp_path, {
+        'a' * 64: {'path': 'C:\\old.lnk', 'description': 'legacy', 'added_date': '2020-01-01'},
+        'b' * 64: {'path': 'C:\\b.lnk', 'description': 'legacy', 'added_date': '2020-01-02'},
+    })
+    assert store.import_json(path) == 2
+    assert store.get('a' * 64)['path'] == 'C:\\new.lnk'
+    assert store.get('b' * 64) == {'path': 'C:\\b.lnk', 'description': 'legacy', 'added_date': '2020-01-02'}
+    store.close()
+
+
+def test_legacy_whitelist_is_imported_once(tmp_path, db_path):
+    store = WhitelistStore(db_path)
+    path = legacy_file(tmp_path, {'c' * 64: {'path': 'C:\\c.lnk'}})
+    assert import_legacy_whitelist(store, path) == 1
+    assert not os.path.exists(path)
+    assert os.path.exists(path + '.imported')
+    assert 'c' * 64 in store
+    # Already migrated (or migrated by another process first).
+    assert import_legacy_whitelist(store, path) == 0
+    store.close()
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from command_rules import rules_version
+from analysis_metrics import metrics
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "verdict_cache.db")
+# The daemon's native parser and main.py's COM path score the icon check
+# differently, so each mode keeps its own verdicts.
+NATIVE_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "verdict_cache_native.db")
+
+# Bump whenever scoring in analyze_lnk changes so verdicts cached by an older
+# analyzer are not served; rule file edits are picked up from their hash.
+ANALYZER_VERSION = "4"
+
+
+def ruleset_version(native=False):
+    return f"{ANALYZER_VERSION}:{'native' if native else 'com'}:{rules_version()}"
+
+
+class VerdictCache:
+    def __init__(self, db_path=None, max_entries=10000, version=None, evict_interval=100, native=False):
+        db_path = db_path or (NATIVE_CACHE_FILE if native else DEFAULT_CACHE_FILE)
+        self.max_entries = max_entries
+        # The table is trimmed back to max_entries every evict_interval writes
+        # (counted in meta like the whitelist store does), not counted per insert.
+        self.evict_interval = evict_interval
+        self.version = version or ruleset_version(native)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " sha256 TEXT PRIMARY KEY,"
+            " ruleset_version TEXT,"
+            " risk_score REAL,"
+            " suspicious TEXT,"
+            " malicious TEXT,"
+            " report_path TEXT,"
+            " last_access REAL"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_access ON verdicts (last_access)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+
+    def get(self, sha256, report_above=None):
+        # report_above: a verdict scoring above it only counts as a hit when its
+        # report still exists (pre-scans cache verdicts without rendering one).
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT ruleset_version, risk_score, suspicious, malicious, report_path FROM verdicts WHERE sha256 = ?",
+                (sha256,)).fetchone()
+            if row is None:
+                metrics.cache_lookup('verdict', False)
+                return None
+            if row[0] != self.version:
+                # Cached under different rules or analyzer: drop it and re-analyze.
+                self.conn.execute("DELETE FROM verdicts WHERE sha256 = ?", (sha256,))
+                metrics.cache_lookup('verdict', False)
+                return None
+            if report_above is not None and row[1] > report_above and not (row[4] and os.path.exists(row[4])):
+                metrics.cache_lookup('verdict', False)
+                return None
+            metrics.cache_lookup('verdict', True)
+            self.conn.execute("UPDATE verdicts SET last_access = ? WHERE sha256 = ?", (time.time(), sha256))
+        return {
+            'sha256': sha256,
+            'risk_score': row[1],
+            'suspicious': json.loads(row[2]),
+            'malicious': json.loads(row[3]),
+            'report_path': row[4],
+        }
+
+    def put(self, sha256, risk_score, suspicious, malicious, report_path=None):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO verdicts "
+                    "(sha256, ruleset_version, risk_score, suspicious, malicious, report_path, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (sha256, self.version, risk_score, json.dumps(suspicious, ensure_ascii=False),
+                     json.dumps(malicious, ensure_ascii=False), report_path, time.time()))
+                self.conn.execute("INSERT INTO meta (key, value) VALUES ('writes', 1) "
+                                  "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+                writes = self.conn.execute("SELECT value FROM meta WHERE key = 'writes'").fetchone()[0]
+                if writes % self.evict_interval == 0:
+                    self.evict()
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def evict(self):
+        # Least recently used first; runs inside put()'s transaction.
+        excess = self.conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM verdicts WHERE sha256 IN "
+                "(SELECT sha256 FROM verdicts ORDER BY last_access LIMIT ?)", (excess,))
+
+    def put_analyzer(self, analyzer):
+        # Verdicts whose VirusTotal lookup missed the deadline or failed are not
+        # cached, otherwise the reputation result would never be folded in (like
+        # VTCache, which does not keep request errors either).
+        vt_results = analyzer.vt_results or {}
+        if vt_results.get('pending') or (analyzer.vt_api_key and 'error' in vt_results):
+            return False
+        self.put(analyzer.file_hashes['sha256'], analyzer.risk_score, analyzer.suspicious,
+                 analyzer.malicious, analyzer.report_path)
+        return True
+
+    def purge_stale(self):
+        with self.lock:
+            return self.conn.execute("DELETE FROM verdicts WHERE ruleset_version != ?", (self.version,)).rowcount
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from analysis_metrics import metrics
+
+API_URL = "https://www.virustotal.com/vtapi/v2/file/report"
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vt_cache.db")
+
+
+class TokenBucket:
+    # rate tokens per second, bursts of up to capacity requests.
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                time.sleep((1 - self.tokens) / self.rate)
+
+
+class SharedTokenBucket:
+    # Same bucket, with its state kept in the VT cache database so main.py
+    # launches, the daemon and the scanner draw on one quota per API key.
+    def __init__(self, cache, name, rate, capacity):
+        self.cache = cache
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+
+    def acquire(self):
+        while True:
+            wait = self.cache.take_token(self.name, self.rate, self.capacity)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class VTCache:
+    def __init__(self, db_path, positive_ttl=7 * 24 * 3600, negative_ttl=24 * 3600):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS vt_results ("
+            " sha256 TEXT PRIMARY KEY,"
+            " found INTEGER,"
+            " result TEXT,"
+            " fetched_at REAL"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " name TEXT PRIMARY KEY,"
+            " tokens REAL,"
+            " updated REAL"
+            ") WITHOUT ROWID"
+        )
+
+    def get(self, sha256):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT found, result, fetched_at FROM vt_results WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        found, result, fetched_at = row
+        ttl = self.positive_ttl if found else self.negative_ttl
+        if time.time() - fetched_at > ttl:
+            return None
+        return json.loads(result)
+
+    def put(self, sha256, result):
+        # Only definite answers are cached; request errors are retried next time.
+        if 'error' in result:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO vt_results (sha256, found, result, fetched_at) VALUES (?, ?, ?, ?)",
+                (sha256, 1 if result.get('found') else 0, json.dumps(result), time.time()))
+
+    def take_token(self, name, rate, capacity):
+        # Returns 0 when a token was taken, otherwise the seconds until one is
+        # due. Wall-clock time, since monotonic clocks are not shared between
+        # processes; a clock stepping back only delays the refill.
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self.conn.execute("SELECT tokens, updated FROM rate_limits WHERE name = ?", (name,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+                wait = 0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                self.conn.execute("INSERT OR REPLACE INTO rate_limits (name, tokens, updated) VALUES (?, ?, ?)",
+                                  (name, tokens, now))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def close(self):
+        self.conn.close()
+
+
+class VirusTotalClient:
+    def __init__(self, api_key, cache_path=DEFAULT_CACHE_FILE, base_url=API_URL, timeout=10.0,
+                 positive_ttl=7 * 24 * 3600, negative_ttl=24 * 3600,
+                 requests_per_minute=4, batch_size=4, session=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        # The public v2 API accepts up to 4 comma-separated resources per request.
+        self.batch_size = batch_size
+        self.cache = VTCache(cache_path, positive_ttl, negative_ttl) if cache_path else None
+        self.limiter = None
+        if requests_per_minute:
+            rate = requests_per_minute / 60.0
+            if self.cache:
+                # The API quota is per key, not per process: share the bucket
+                # through the cache database (keyed by a hash, not the key).
+                name = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+                self.limiter = SharedTokenBucket(self.cache, name, rate, requests_per_minute)
+            else:
+                self.limiter = TokenBucket(rate, requests_per_minute)
+        self.session = session
+
+    def get_session(self):
+        if self.session is None:
+            import requests
+
+            self.session = requests.Session()
+        return self.session
+
+    def lookup(self, sha256):
+        return self.lookup_many([sha256])[sha256]
+
+    def lookup_many(self, hashes):
+        results = {}
+        pending = []
+        for sha256 in dict.fromkeys(hashes):
+            cached = self.cache.get(sha256) if self.cache else None
+            if self.cache:
+                metrics.cache_lookup('virustotal', cached is not None)
+            if cached is not None:
+                results[sha256] = cached
+            else:
+                pending.append(sha256)
+
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            for sha256, result in self._query(batch).items():
+                if self.cache:
+                    self.cache.put(sha256, result)
+                results[sha256] = result
+        return results
+
+    def _query(self, batch):
+        if self.limiter:
+            self.limiter.acquire()
+
+        params = {
+            'apikey': self.api_key,
+            'resource': ','.join(batch)
+        }
+        try:
+            with metrics.timer('lnk_vt_request_seconds'):
+                response = self.get_session().get(self.base_url, params=params, timeout=self.timeout)
+            if response.status_code != 200:
+                error = {'error': f'API request failed with status code {response.status_code}'}
+                return {sha256: error for sha256 in batch}
+
+            items = response.json()
+            if isinstance(items, dict):
+                items = [items]
+            results = {sha256: {'found': False, 'message': 'File not found in VirusTotal'} for sha256 in batch}
+            for item in items:
+                resource = (item.get('resource') or '').lower()
+                key = resource if resource in results else (batch[0] if len(batch) == 1 else None)
+                if key is not None:
+                    results[key] = self._parse(item)
+            return results
+        except Exception as e:
+            error = {'error': f'API request failed: {str(e)}'}
+            return {sha256: error for sha256 in batch}
+
+    @staticmethod
+    def _parse(item):
+        if item.get('response_code') == 1:
+            return {
+                'found': True,
+                'positives': item.get('positives', 0),
+                'total': item.get('total', 0),
+                'scan_date': item.get('scan_date', ''),
+                'permalink': item.get('permalink', '')
+            }
+        return {'found': False, 'message': 'File not found in VirusTotal'}
+
+
+def vt_score(result):
+    if result.get('found') and result.get('positives', 0) > 0:
+        return min(5, result['positives'] / 2)
+    return 0
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, **kwargs):
+    # One client (and so one HTTP session and cache connection) per API key
+    # and process; the rate limiter state is shared through the cache.
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = VirusTotalClient(api_key, **kwargs)
+        return client
@@ -0,0 +1,122 @@
+import os
+import json
+import sqlite3
+import datetime
+import threading
+
+
+class WhitelistStore:
+    def __init__(self, db_path, compact_interval=1000, timeout=10.0):
+        self.db_path = db_path
+        self.compact_interval = compact_interval
+        self.lock = threading.Lock()
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        # so concurrent handler processes serialize their writes instead of losing them.
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS whitelist ("
+            " hash TEXT PRIMARY KEY,"
+            " path TEXT,"
+            " description TEXT,"
+            " added_date TEXT"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+
+    def close(self):
+        self.conn.close()
+
+    def __contains__(self, file_hash):
+        return self.conn.execute("SELECT 1 FROM whitelist WHERE hash = ?", (file_hash,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM whitelist").fetchone()[0]
+
+    def get(self, file_hash):
+        row = self.conn.execute(
+            "SELECT path, description, added_date FROM whitelist WHERE hash = ?", (file_hash,)).fetchone()
+        if row is None:
+            return None
+        return {"path": row[0], "description": row[1], "added_date": row[2]}
+
+    def add(self, file_hash, path, description="", added_date=None):
+        added_date = added_date or str(datetime.datetime.now())
+        with self._write() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO whitelist (hash, path, description, added_date) VALUES (?, ?, ?, ?)",
+                (file_hash, path, description, added_date))
+            writes = self._bump_writes(conn)
+        if self.compact_interval and writes % self.compact_interval == 0:
+            self.compact()
+
+    def remove(self, file_hash):
+        with self._write() as conn:
+            removed = conn.execute("DELETE FROM whitelist WHERE hash = ?", (file_hash,)).rowcount
+            self._bump_writes(conn)
+        return removed > 0
+
+    def compact(self):
+        try:
+            freelist = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            if pages and freelist * 4 > pages:
+                self.conn.execute("VACUUM")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.OperationalError as e:
+            # Another process holds the database; compaction is retried at the next interval.
+            print(f"Whitelist compaction skipped: {e}")
+
+    def import_json(self, json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+
+        rows = [(file_hash, entry.get("path"), entry.get("description", ""), entry.get("added_date"))
+                for file_hash, entry in entries.items()]
+        with self._write() as conn:
+            # Entries already in the store are newer than the legacy file and win.
+            conn.executemany(
+                "INSERT OR IGNORE INTO whitelist (hash, path, description, added_date) VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def _bump_writes(self, conn):
+        conn.execute("INSERT INTO meta (key, value) VALUES ('writes', 1) "
+                     "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        return conn.execute("SELECT value FROM meta WHERE key = 'writes'").fetchone()[0]
+
+    def _write(self):
+        return _Transaction(self.conn, self.lock)
+
+
+class _Transaction:
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self.lock.release()
+        return False
+
+
+def import_legacy_whitelist(store, json_path):
+    # One-shot migration: the JSON file is renamed afterwards so it is never re-read.
+    try:
+        count = store.import_json(json_path)
+        os.replace(json_path, json_path + ".imported")
+    except FileNotFoundError:
+        # Missing, or another handler process migrated it first.
+        return 0
+    return count